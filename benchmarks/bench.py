@@ -0,0 +1,242 @@
+"""
+Benchmarks for q2zugferd.
+
+    python -m benchmarks.bench
+    python -m benchmarks.bench --lines 1 100 10000 1000000 --pages 1 100 2000
+    python -m benchmarks.bench --stages pdf rewrite --kinds shared unique --json out.json
+    python -m benchmarks.bench --stages pdf --kinds scan --pages 1000 --large --check-rss
+
+Every case runs in a fresh process, so the reported peak RSS belongs to that case.
+Stages:
+    xml         q2zugferd_xml, lines/s
+    xml_stream  q2zugferd_xml_stream from a line generator, lines/s
+    rewrite     DeviceRGB rewrite of all pages, pages/s
+    pdf         full q2zugferd_pdf to memory (to a file with --large), pages/s
+    split       q2zugferd_split into invoices of --split-pages pages, in-process, pages/s
+
+With --check-rss every pdf case of --large must stay below rss_ceiling().
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from .corpus import PDF_KINDS, make_invoice, make_pdf
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("xml", "xml_stream", "rewrite", "pdf", "split")
+# Cases above this many lines only run through the streaming writer
+MAX_TREE_LINES = 100_000
+# Documented peak RSS of q2zugferd_pdf(large=True): interpreter and libraries
+# plus the object graph per page; stream data is never held in memory
+RSS_BASE = 64 * 2**20
+RSS_PER_PAGE = 12 * 1024
+
+
+class _CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, None if unknown."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def rss_ceiling(pages, verify=None):
+    """Peak RSS allowed for a large=True run, verify="after" opens the output a second time."""
+    return RSS_BASE + RSS_PER_PAGE * pages * (2 if verify == "after" else 1)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _setup_icc(icc):
+    from q2zugferd.q2zugferd_pdf import get_icc_profile, set_icc_profile
+
+    set_icc_profile(icc)
+    try:
+        get_icc_profile()
+    except OSError:
+        # Timing does not depend on the profile content
+        set_icc_profile(b"\x00" * 3144)
+
+
+def _once(stage, case):
+    """Run one stage once, return the output size in bytes."""
+    if stage == "xml":
+        from q2zugferd import q2zugferd_xml
+
+        return len(q2zugferd_xml(case["invoice"]).encode("utf-8"))
+    if stage == "xml_stream":
+        from q2zugferd import q2zugferd_xml_stream
+
+        sink = _CountingSink()
+        invoice = make_invoice(case["n"], materialize=False)
+        q2zugferd_xml_stream(invoice, sink)
+        return sink.size
+    if stage == "rewrite":
+        import pikepdf
+
+        from q2zugferd.q2zugferd_pdf import make_icc_stream, replace_device_rgb_recursive
+
+        with pikepdf.open(case["pdf"]) as pdf:
+            icc_ref = make_icc_stream(pdf)
+            visited = set()
+            for page in pdf.pages:
+                replace_device_rgb_recursive(pdf, page.get("/Resources"), icc_ref, visited)
+        return 0
+    if stage == "pdf":
+        from q2zugferd import q2zugferd_pdf
+
+        output = case["output"] if case["large"] else io.BytesIO()
+        report = q2zugferd_pdf(
+            case["pdf"],
+            case["xml"],
+            output,
+            verify=case["verify"],
+            save_profile=case["save_profile"],
+            large=case["large"],
+        )
+        return report["size"]
+    if stage == "split":
+        from q2zugferd import q2zugferd_split
+
+        size = 0
+        for result in q2zugferd_split(
+            case["pdf"],
+            case["jobs"],
+            verify=case["verify"],
+            save_profile=case["save_profile"],
+        ):
+            if not result.ok:
+                raise RuntimeError(result.error)
+            size += result.result["size"]
+        return size
+    raise ValueError(f"Unknown stage: {stage!r}")
+
+
+def run_case(stage, case, repeat, icc=None):
+    """Executed in a fresh process: warm up once, then time repeat runs."""
+    _setup_icc(icc)
+    if stage == "xml":
+        case["invoice"] = make_invoice(case["n"])
+    if stage in ("pdf", "split"):
+        from q2zugferd import q2zugferd_xml
+
+        case["xml"] = q2zugferd_xml(make_invoice(10))
+    if stage == "split":
+        step = case["split_pages"]
+        case["jobs"] = [
+            (range(first, min(first + step, case["n"])), case["xml"], None)
+            for first in range(0, case["n"], step)
+        ]
+    size = _once(stage, case)
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _once(stage, case)
+        latencies.append(time.perf_counter() - start)
+    return {"latencies": latencies, "size": size, "peak_rss": peak_rss()}
+
+
+def _cases(args, workdir, context):
+    for stage in args.stages:
+        if stage in ("xml", "xml_stream"):
+            for n in args.lines:
+                if stage == "xml" and n > MAX_TREE_LINES:
+                    continue
+                yield stage, f"{n} lines", {"n": n}
+        else:
+            for kind in args.kinds:
+                for n in args.pages:
+                    path = os.path.join(workdir, f"{kind}-{n}.pdf")
+                    if not os.path.exists(path):
+                        # Not in this process: the peak RSS is inherited by the case processes
+                        with context.Pool(1) as pool:
+                            pool.apply(make_pdf, (path, n, kind))
+                    case = {
+                        "n": n,
+                        "pdf": path,
+                        "verify": args.verify,
+                        "save_profile": args.save_profile,
+                        "large": args.large,
+                        "output": os.path.join(workdir, "output.pdf"),
+                        "split_pages": args.split_pages,
+                    }
+                    yield stage, f"{kind} {n} pages", case
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--lines", nargs="+", type=int, default=[1, 100, 10_000])
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 100])
+    parser.add_argument("--kinds", nargs="+", choices=PDF_KINDS, default=list(PDF_KINDS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--verify", choices=("before", "after"), default=None)
+    parser.add_argument("--save-profile", default="fast")
+    parser.add_argument("--large", action="store_true", help="pdf stage with large=True")
+    parser.add_argument("--split-pages", type=int, default=5, help="pages per split invoice")
+    parser.add_argument(
+        "--check-rss", action="store_true", help="fail if a --large case exceeds rss_ceiling()"
+    )
+    parser.add_argument("--icc", help="ICC profile, defaults to the bundled one")
+    parser.add_argument("--json", help="write raw results to this file")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    over = []
+    header = f"{'stage':<11} {'case':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'items/s':>11} {'RSS MB':>8} {'out KB':>9}"
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage, name, case in _cases(args, workdir, context):
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (stage, case, args.repeat, args.icc))
+            latencies = result["latencies"]
+            p50 = percentile(latencies, 50)
+            rss = result["peak_rss"]
+            result.update(stage=stage, case=name, n=case["n"], throughput=case["n"] / p50)
+            if stage == "pdf" and args.large and rss is not None:
+                result["rss_ceiling"] = rss_ceiling(case["n"], args.verify)
+                if args.check_rss and rss > result["rss_ceiling"]:
+                    ceiling = result["rss_ceiling"]
+                    over.append(f"{name}: {rss / 2**20:.1f} MB > {ceiling / 2**20:.1f} MB")
+            results.append(result)
+            print(
+                f"{stage:<11} {name:<22} {p50 * 1000:>9.2f} "
+                f"{percentile(latencies, 95) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f} "
+                f"{result['throughput']:>11.0f} "
+                f"{'-' if rss is None else f'{rss / 2**20:.1f}':>8} {result['size'] / 1024:>9.1f}"
+            )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if over:
+        raise SystemExit("Peak RSS above the ceiling: " + "; ".join(over))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Synthetic PDFs and invoices for the benchmarks."""
+
+import copy
+import random
+import zlib
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name
+
+PDF_KINDS = ("shared", "unique", "nested", "patterns", "scan")
+# Side of the incompressible per page image of the "scan" kind, about 190 KB per page
+SCAN_SIZE = 256
+
+INVOICE = {
+    "invoice_header": {
+        "invoice_number": "BENCH-0001",
+        "invoice_date": "2025-11-27",
+        "payment_terms_days": "14",
+        "due_date": "2025-12-10",
+        "net_amount": "0.00",
+        "delivery_date": "2025-12-01",
+        "skonto_rate": "0",
+    },
+    "seller": {
+        "vat_id": "DE279247134",
+        "name": "Webware Internet Solutions GmbH",
+        "postal_code": "12345",
+        "city": "Bremen",
+        "country_code": "DE",
+        "street": "Einbahn Straße 19",
+    },
+    "buyer": {
+        "part_id": "2",
+        "name": "Agoratech",
+        "postal_code": "34130",
+        "city": "Kassel",
+        "country_code": "DE",
+        "street": "Teichstr. 14-16",
+    },
+    "currency": {"iso_code": "EUR"},
+    "seller_bank_account": {"iban": "DE02120300000000202051", "bic_swift": "BYLADEM1001"},
+    "invoice_lines": [],
+    "vat_breakdown": [],
+}
+
+
+def iter_lines(count):
+    """Generator of count line dicts, for the streaming writer."""
+    for i in range(count):
+        yield {
+            "line_number": str(i + 1),
+            "name": f"Article {i % 997}",
+            "description": "Synthetic benchmark line",
+            "quantity": str(1 + i % 17),
+            "unit_code": "PCE",
+            "net_price": "12.5000",
+            "vat_rate": "19.00",
+            "net_total": "{:.2f}".format((1 + i % 17) * 12.5),
+        }
+
+
+def make_invoice(lines, materialize=True):
+    """
+    zugferd_data with lines invoice lines. With materialize=False invoice_lines
+    stays a generator, so very large invoices never exist as a list.
+    """
+    data = copy.deepcopy(INVOICE)
+    data["invoice_lines"] = list(iter_lines(lines)) if materialize else iter_lines(lines)
+    net = sum((1 + i % 17) * 12.5 for i in range(lines))
+    data["invoice_header"]["net_amount"] = "{:.2f}".format(net)
+    data["vat_breakdown"] = [
+        {
+            "vat_rate": "19.00",
+            "tax_base_amount": "{:.2f}".format(net),
+            "tax_amount": "{:.2f}".format(net * 0.19),
+        }
+    ]
+    return data
+
+
+def _image(pdf, seed, size=32, noise=False):
+    if noise:
+        data = random.Random(seed).randbytes(size * size * 3)
+    else:
+        data = bytes((seed + i) % 256 for i in range(size * size * 3))
+    image = pikepdf.Stream(
+        pdf,
+        zlib.compress(data),
+        Type=Name.XObject,
+        Subtype=Name.Image,
+        Width=size,
+        Height=size,
+        ColorSpace=Name.DeviceRGB,
+        BitsPerComponent=8,
+        Filter=Name.FlateDecode,
+    )
+    return pdf.make_indirect(image)
+
+
+def _form(pdf, resources, group=False):
+    form = pikepdf.Stream(
+        pdf,
+        b"q 0.2 0.4 0.6 rg 0 0 100 100 re f /Im0 Do Q",
+        Type=Name.XObject,
+        Subtype=Name.Form,
+        BBox=[0, 0, 100, 100],
+        Resources=resources,
+    )
+    if group:
+        form.Group = Dictionary(S=Name.Transparency, CS=Name.DeviceRGB)
+    return pdf.make_indirect(form)
+
+
+def _pattern(pdf):
+    shading = Dictionary(
+        ShadingType=2,
+        ColorSpace=Name.DeviceRGB,
+        Coords=[0, 0, 100, 0],
+        Function=Dictionary(FunctionType=2, Domain=[0, 1], C0=[1, 0, 0], C1=[0, 0, 1], N=1),
+    )
+    return pdf.make_indirect(
+        Dictionary(Type=Name.Pattern, PatternType=2, Shading=pdf.make_indirect(shading))
+    )
+
+
+def make_pdf(path, pages, kind="shared", nesting=3):
+    """
+    Write a synthetic PDF with pages pages.
+    kind - "shared": one image and form used by all pages,
+           "unique": a different image on every page,
+           "nested": shared forms nested nesting levels deep,
+           "patterns": shading patterns, Indexed color spaces and transparency groups,
+           "scan": a large incompressible image on every page, like a scanned statement.
+    """
+    if kind not in PDF_KINDS:
+        raise ValueError(f"Unknown PDF kind: {kind!r}")
+    pdf = pikepdf.new()
+    pdf.docinfo["/CreationDate"] = "D:20251127120000+01'00'"
+    pdf.docinfo["/Producer"] = "q2zugferd benchmarks"
+
+    shared_image = _image(pdf, 0)
+    shared_form = _form(pdf, Dictionary(XObject=Dictionary(Im0=shared_image)))
+    if kind == "nested":
+        for _ in range(nesting):
+            shared_form = _form(
+                pdf, Dictionary(XObject=Dictionary(Im0=shared_image, Fm0=shared_form))
+            )
+    pattern = _pattern(pdf) if kind == "patterns" else None
+
+    for number in range(pages):
+        pdf.add_blank_page(page_size=(595, 842))
+        page = pdf.pages[-1]
+        if kind == "unique":
+            image = _image(pdf, number)
+        elif kind == "scan":
+            image = _image(pdf, number, SCAN_SIZE, noise=True)
+        else:
+            image = shared_image
+        resources = Dictionary(
+            ColorSpace=Dictionary(CS0=Name.DeviceRGB),
+            XObject=Dictionary(Im0=image, Fm0=shared_form),
+        )
+        content = b"/CS0 cs 1 0 0 sc q 100 0 0 100 50 50 cm /Im0 Do Q /Fm0 Do"
+        if kind == "patterns":
+            resources.Pattern = Dictionary(P0=pattern)
+            resources.ColorSpace.CS1 = Array(
+                [Name.Indexed, Name.DeviceRGB, 1, b"\x00\x00\x00\xff\xff\xff"]
+            )
+            resources.XObject.Fm1 = _form(
+                pdf, Dictionary(XObject=Dictionary(Im0=image)), group=True
+            )
+            page.Group = Dictionary(S=Name.Transparency, CS=Name.DeviceRGB)
+            content += b" /Pattern cs /P0 scn 0 0 595 842 re f /Fm1 Do"
+        page.Resources = resources
+        page.Contents = pdf.make_stream(content)
+    pdf.save(path)
+    return path
@@ -0,0 +1,87 @@
+"""
+Cold start cost of importing q2zugferd.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 20 --json imports.json
+
+Every import runs in a fresh interpreter (python -X importtime is the tool
+for a per module breakdown). Reports the median wall time of the import
+statement and whether it loaded pikepdf, which XML-only imports must not.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SCENARIOS = {
+    "package": "import q2zugferd",
+    "xml": "from q2zugferd import q2zugferd_xml",
+    "model": "from q2zugferd import Invoice",
+    "parse": "from q2zugferd import q2zugferd_parse",
+    "validate": "from q2zugferd import validate",
+    "async": "from q2zugferd import AsyncZugferd",
+    "pdf": "from q2zugferd import q2zugferd_pdf",
+    "cli": "import q2zugferd.q2zugferd_cli",
+}
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, "pikepdf" in sys.modules, len(sys.modules))
+"""
+
+
+def measure(statement, repeat=10):
+    """(median seconds, pikepdf loaded, modules loaded) of statement in fresh interpreters."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = [root, os.environ.get("PYTHONPATH")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, path)))
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(statement=statement)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout.split()
+        times.append(float(output[0]))
+    times.sort()
+    return times[len(times) // 2], output[1] == "True", int(output[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="write raw results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    header = f"{'scenario':<10} {'p50 ms':>9} {'modules':>8}  pikepdf"
+    print(header)
+    print("-" * len(header))
+    for name in args.scenarios:
+        elapsed, pikepdf_loaded, modules = measure(SCENARIOS[name], args.repeat)
+        results.append(
+            {
+                "scenario": name,
+                "statement": SCENARIOS[name],
+                "p50": elapsed,
+                "modules": modules,
+                "pikepdf": pikepdf_loaded,
+            }
+        )
+        print(f"{name:<10} {elapsed * 1000:>9.2f} {modules:>8}  {'yes' if pikepdf_loaded else 'no'}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,77 @@
-from .q2zugferd_pdf import q2zugferd_pdf
-from .q2zugferd_xml import q2zugferd_xml
+"""
+ZUGFeRD / Factur-X PDF and XML generator.
+
+Submodules are imported on first use of one of their names, so
+"from q2zugferd import q2zugferd_xml" does not load pikepdf.
+"""
+
+import importlib
+import sys
+import types
+
+# public name -> submodule
+_EXPORTS = {
+    "q2zugferd_pdf": "q2zugferd_pdf",
+    "set_icc_profile": "q2zugferd_pdf",
+    "q2zugferd_xml": "q2zugferd_xml",
+    "q2zugferd_xml_stream": "q2zugferd_xml",
+    "ZugferdTemplate": "q2zugferd_xml",
+    "q2zugferd_pdf_batch": "q2zugferd_batch",
+    "q2zugferd_xml_pdf_batch": "q2zugferd_batch",
+    "AsyncZugferd": "q2zugferd_async",
+    "q2zugferd_xml_async": "q2zugferd_async",
+    "q2zugferd_pdf_async": "q2zugferd_async",
+    "add_stage_hook": "q2zugferd_stats",
+    "remove_stage_hook": "q2zugferd_stats",
+    "stage_hook": "q2zugferd_stats",
+    "StageCollector": "q2zugferd_stats",
+    "q2zugferd_extract": "q2zugferd_extract",
+    "q2zugferd_extract_batch": "q2zugferd_extract",
+    "q2zugferd_extract_dir": "q2zugferd_extract",
+    "q2zugferd_parse": "q2zugferd_parse",
+    "iter_invoice_lines": "q2zugferd_parse",
+    "validate": "q2zugferd_validate",
+    "validate_batch": "q2zugferd_validate",
+    "set_schemas": "q2zugferd_validate",
+    "TotalsAccumulator": "q2zugferd_totals",
+    "TotalsError": "q2zugferd_totals",
+    "compute_totals": "q2zugferd_totals",
+    "check_totals": "q2zugferd_totals",
+    "Invoice": "q2zugferd_model",
+    "Party": "q2zugferd_model",
+    "BankAccount": "q2zugferd_model",
+    "Line": "q2zugferd_model",
+    "VatItem": "q2zugferd_model",
+    "Profile": "q2zugferd_profile",
+    "get_profile": "q2zugferd_profile",
+    "register_profile": "q2zugferd_profile",
+    "ResultCache": "q2zugferd_cache",
+    "q2zugferd_split": "q2zugferd_split",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # The import system binds every imported submodule as a package attribute;
+        # keep the function of the same name instead (q2zugferd.q2zugferd_pdf etc.)
+        if _EXPORTS.get(name) == name and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,5 @@
+import sys
+
+from .q2zugferd_cli import main
+
+sys.exit(main())
@@ -0,0 +1,199 @@
+import asyncio
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .q2zugferd_xml import q2zugferd_xml
+
+# The PDF modules (and pikepdf) are imported on first use,
+# so XML-only users of the async API never load them.
+
+
+def _pdf_job(xml, input_pdf, output_pdf, kwargs):
+    from .q2zugferd_pdf import q2zugferd_pdf
+
+    return q2zugferd_pdf(input_pdf, xml, output_pdf, **kwargs)
+
+
+def _extract_job(input_pdf):
+    from .q2zugferd_extract import q2zugferd_extract
+
+    return q2zugferd_extract(input_pdf)
+
+
+def _xml_pdf_job(zugferd_data, input_pdf, output_pdf, kwargs):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True, **kwargs.pop("xml_options", {}))
+    return _pdf_job(xml, input_pdf, output_pdf, kwargs)
+
+
+def _warm_up_job(delay):
+    from .q2zugferd_extract import q2zugferd_extract  # noqa: F401
+    from .q2zugferd_pdf import get_icc_profile
+
+    try:
+        get_icc_profile()
+    except OSError:
+        pass
+    # Keeps this worker busy, so the other warm-up jobs go to the other workers
+    time.sleep(delay)
+
+
+def _call(func, args, kwargs):
+    return func(*args, **kwargs)
+
+
+async def _read_source(source):
+    """Bytes from an awaitable, an async iterable of chunks or an object with async read()."""
+    if inspect.isawaitable(source):
+        source = await source
+    if hasattr(source, "__aiter__"):
+        return b"".join([chunk async for chunk in source])
+    read = getattr(source, "read", None)
+    if read is not None and inspect.iscoroutinefunction(read):
+        return await read()
+    return source
+
+
+def _is_async_sink(sink):
+    return callable(sink) or hasattr(sink, "write")
+
+
+async def _write_sink(sink, data):
+    result = sink(data) if callable(sink) else sink.write(data)
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncZugferd:
+    """
+    asyncio front end for q2zugferd_xml / q2zugferd_pdf.
+
+    Work runs in a bounded thread pool (or process pool with processes=True),
+    at most max_concurrency calls are in flight, further calls wait.
+    Every call accepts a timeout; on timeout or cancellation a job that has
+    not started yet is dropped, a running one finishes in the background
+    but keeps its concurrency slot until it ends.
+    """
+
+    def __init__(
+        self, max_workers=None, max_concurrency=None, processes=False, icc_profile=None
+    ):
+        max_workers = max_workers or os.cpu_count() or 1
+        self.max_workers = max_workers
+        if processes:
+            from .q2zugferd_batch import _init_worker
+
+            self._executor = ProcessPoolExecutor(
+                max_workers, initializer=_init_worker, initargs=(icc_profile,)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers)
+        self.max_concurrency = max_concurrency or max_workers * 2
+        self._semaphore = None
+        self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self, delay=0.05):
+        """
+        Start every worker and load the PDF modules and the ICC profile in it,
+        so the first requests do not pay for that. Blocks until all are done.
+        """
+        futures = [
+            self._executor.submit(_warm_up_job, delay) for _ in range(self.max_workers)
+        ]
+        for future in futures:
+            future.result()
+
+    async def _run(self, timeout, func, *args):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives belong to one event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                # event loop is already closed
+                pass
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            future.cancel()
+            raise
+
+    async def xml(self, zugferd_data, timeout=None, **kwargs):
+        """q2zugferd_xml, kwargs are its options (as_bytes, totals, profile, cache)."""
+        return await self._run(timeout, _call, q2zugferd_xml, (zugferd_data,), kwargs)
+
+    async def extract(self, input_pdf, timeout=None):
+        """q2zugferd_extract of a path or of the bytes read from an async source."""
+        input_pdf = await _read_source(input_pdf)
+        return await self._run(timeout, _extract_job, input_pdf)
+
+    async def _pdf(self, func, first, input_pdf, output_pdf, timeout, kwargs):
+        input_pdf = await _read_source(input_pdf)
+        sink = None
+        if output_pdf is not None and _is_async_sink(output_pdf):
+            sink, output_pdf = output_pdf, None
+        report = await self._run(timeout, func, first, input_pdf, output_pdf, kwargs)
+        if sink is not None:
+            await _write_sink(sink, report.pop("pdf"))
+        return report
+
+    async def pdf(self, input_pdf, xml, output_pdf=None, timeout=None, **kwargs):
+        """
+        Embed xml into input_pdf, see q2zugferd_pdf.
+        input_pdf - path, bytes, awaitable or async iterable of bytes.
+        xml - str/bytes or an awaitable source of them.
+        output_pdf - path, sync/async callable or object with (async) write(),
+                     None returns the PDF bytes in report["pdf"].
+        """
+        xml = await _read_source(xml)
+        return await self._pdf(_pdf_job, xml, input_pdf, output_pdf, timeout, kwargs)
+
+    async def xml_pdf(self, zugferd_data, input_pdf, output_pdf=None, timeout=None, **kwargs):
+        """
+        Generate the XML and embed it in one executor call,
+        kwargs["xml_options"] are passed to q2zugferd_xml.
+        """
+        return await self._pdf(
+            _xml_pdf_job, zugferd_data, input_pdf, output_pdf, timeout, kwargs
+        )
+
+
+_default = None
+
+
+def _default_runner():
+    global _default
+    if _default is None:
+        _default = AsyncZugferd()
+    return _default
+
+
+async def q2zugferd_xml_async(zugferd_data, timeout=None, **kwargs):
+    return await _default_runner().xml(zugferd_data, timeout, **kwargs)
+
+
+async def q2zugferd_pdf_async(input_pdf, xml, output_pdf=None, timeout=None, **kwargs):
+    return await _default_runner().pdf(input_pdf, xml, output_pdf, timeout, **kwargs)
@@ -0,0 +1,113 @@
+import os
+import time
+import traceback
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .q2zugferd_pdf import get_icc_profile, q2zugferd_pdf, set_icc_profile
+from .q2zugferd_xml import q2zugferd_xml
+
+BatchResult = namedtuple("BatchResult", "index output_pdf ok error elapsed result")
+
+
+def _init_worker(icc_profile):
+    # Load and compress the ICC profile once, it stays cached in the worker process
+    set_icc_profile(icc_profile)
+    try:
+        get_icc_profile()
+    except OSError:
+        # Reported by every job instead of breaking the pool
+        pass
+
+
+def _split_job(job, names):
+    """Job is either a tuple of positional arguments or a dict of keyword arguments."""
+    if isinstance(job, dict):
+        kwargs = dict(job)
+        args = [kwargs.pop(name) for name in names]
+    else:
+        args = list(job[: len(names)])
+        kwargs = {}
+        if len(job) > len(names):
+            kwargs = dict(job[len(names)])
+    return args, kwargs
+
+
+def _run_job(index, job, names, xml_first):
+    start = time.perf_counter()
+    output_pdf = None
+    try:
+        args, kwargs = _split_job(job, names)
+        output_pdf = args[-1]
+        if xml_first:
+            zugferd_data, input_pdf, output_pdf = args
+            xml = q2zugferd_xml(zugferd_data, as_bytes=True, **kwargs.pop("xml_options", {}))
+            args = [input_pdf, xml, output_pdf]
+        result = q2zugferd_pdf(*args, **kwargs)
+    except Exception:
+        return BatchResult(
+            index, output_pdf, False, traceback.format_exc(), time.perf_counter() - start, None
+        )
+    return BatchResult(index, output_pdf, True, None, time.perf_counter() - start, result)
+
+
+def _pdf_job(index, job):
+    return _run_job(index, job, ("input_pdf", "xml_path", "output_pdf"), False)
+
+
+def _xml_pdf_job(index, job):
+    return _run_job(index, job, ("zugferd_data", "input_pdf", "output_pdf"), True)
+
+
+def _run_batch(worker, jobs, max_workers, ordered, initializer=None, initargs=()):
+    max_workers = max_workers or os.cpu_count() or 1
+    # Keep only a window of jobs in flight, so huge job lists are not pickled up front
+    window = max_workers * 4
+    with ProcessPoolExecutor(
+        max_workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        if ordered:
+            pending = deque()
+            for index, job in enumerate(jobs):
+                pending.append(executor.submit(worker, index, job))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for index, job in enumerate(jobs):
+                pending.add(executor.submit(worker, index, job))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def q2zugferd_pdf_batch(jobs, max_workers=None, ordered=True, icc_profile=None):
+    """
+    Embed many XML invoices into PDFs using a process pool.
+
+    jobs - iterable of (input_pdf, xml_path, output_pdf[, kwargs]) tuples
+           or dicts with the q2zugferd_pdf keyword arguments.
+    ordered - yield results in job order, otherwise as they complete.
+    icc_profile - path or bytes of the ICC profile, loaded once per worker.
+
+    Yields BatchResult(index, output_pdf, ok, error, elapsed, result);
+    a failed job does not stop the batch.
+    """
+    return _run_batch(_pdf_job, jobs, max_workers, ordered, _init_worker, (icc_profile,))
+
+
+def q2zugferd_xml_pdf_batch(jobs, max_workers=None, ordered=True, icc_profile=None):
+    """
+    Same as q2zugferd_pdf_batch, but every job carries zugferd_data:
+    (zugferd_data, input_pdf, output_pdf[, kwargs]) tuples or dicts.
+    The XML is generated inside the worker process, kwargs["xml_options"]
+    are passed to q2zugferd_xml (e.g. {"totals": "compute"}).
+    """
+    return _run_batch(_xml_pdf_job, jobs, max_workers, ordered, _init_worker, (icc_profile,))
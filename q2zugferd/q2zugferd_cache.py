@@ -0,0 +1,209 @@
+"""
+Content-addressed on-disk cache of generated XML and PDF.
+
+    cache = ResultCache("/var/cache/q2zugferd", max_size=2 * 2**30)
+    q2zugferd_pdf(input_pdf, xml, output_pdf, deterministic=True, cache=cache)
+    q2zugferd_xml(zugferd_data, as_bytes=True, cache=cache)
+
+Entries are keyed by a SHA-256 of everything the result depends on (input
+PDF content, XML or invoice data, options and the q2zugferd version), so a
+repeated call returns the stored bytes. The least recently used entries are
+removed once the cache grows beyond max_size. Several processes may share
+one directory: files are written under a temporary name and renamed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from decimal import Decimal
+
+from .version import __version__
+
+CacheHit = namedtuple("CacheHit", "path meta")
+
+_CHUNK = 1 << 20
+
+
+def _json_default(value):
+    if hasattr(value, "to_dict"):
+        # q2zugferd_model objects
+        return value.to_dict()
+    if isinstance(value, (Decimal, bytes)):
+        return str(value)
+    raise TypeError(f"Cannot be part of a cache key: {type(value).__name__}")
+
+
+class _Digest:
+    """Incremental hash of the parts of a key, every part length-prefixed."""
+
+    def __init__(self, kind):
+        self._hash = hashlib.sha256()
+        self.add(kind)
+        self.add(__version__)
+
+    def add(self, part):
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, (bytes, bytearray, memoryview)):
+            part = json.dumps(part, sort_keys=True, default=_json_default).encode("utf-8")
+        self._hash.update(len(part).to_bytes(8, "big"))
+        self._hash.update(part)
+        return self
+
+    def add_file(self, path):
+        self._hash.update(os.path.getsize(path).to_bytes(8, "big"))
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                self._hash.update(chunk)
+        return self
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def cache_key(kind, *parts):
+    """Key of parts (bytes, str or JSON serialisable data, e.g. zugferd_data)."""
+    digest = _Digest(kind)
+    for part in parts:
+        digest.add(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Directory of results with size-based LRU eviction.
+
+    directory - created if missing.
+    max_size - bytes kept on disk; results larger than that are not stored.
+    The cache object is picklable, so it can be passed to process pool workers.
+    """
+
+    def __init__(self, directory, max_size=1 << 30):
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getstate__(self):
+        return {"directory": self.directory, "max_size": self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"], state["max_size"])
+
+    def _path(self, key, suffix=".bin"):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key):
+        """CacheHit(path, meta) for a stored result, None on a miss."""
+        path = self._path(key)
+        try:
+            # The access time of the entry for LRU eviction
+            os.utime(path)
+            meta = None
+            if os.path.exists(self._path(key, ".json")):
+                with open(self._path(key, ".json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+        except (OSError, ValueError):
+            # Missing, or removed by another process in the meantime
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CacheHit(path, meta)
+
+    def read(self, key):
+        """Stored bytes, None on a miss."""
+        hit = self.get(key)
+        if hit is None:
+            return None
+        try:
+            with open(hit.path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, path, source):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, part = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    f.write(source)
+                else:
+                    with open(source, "rb") as src:
+                        shutil.copyfileobj(src, f, _CHUNK)
+            os.replace(part, path)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+
+    def put(self, key, source, meta=None):
+        """
+        Store bytes, or the content of the file source, with optional
+        JSON serialisable meta data. Returns False if the result is too large.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            size = len(source)
+        else:
+            size = os.path.getsize(source)
+        if size > self.max_size:
+            return False
+        if meta is not None:
+            self._write(self._path(key, ".json"), json.dumps(meta).encode("utf-8"))
+        self._write(self._path(key), source)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            if self._size > self.max_size:
+                self._evict()
+        return True
+
+    def _entries(self):
+        """(access time, size, path) of the stored results."""
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".bin"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Rescanned, other processes sharing the directory add and remove entries too
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_size:
+                break
+            for victim in (path, path[: -len(".bin")] + ".json"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            self._size -= size
+
+    @property
+    def size(self):
+        """Bytes of the stored results."""
+        return self._scan_size()
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = 0
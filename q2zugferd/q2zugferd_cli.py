@@ -0,0 +1,209 @@
+"""
+Command line interface.
+
+    q2zugferd batch invoices.jsonl --pdf template.pdf --output-dir out --jobs 8
+    q2zugferd batch json_dir/ --pdf-dir pdfs/ --output-dir out
+    q2zugferd serve --port 8765 --workers 4
+
+Every JSONL line (or JSON file of a directory) is a zugferd_data record,
+or {"zugferd_data": {...}, "input_pdf": ..., "output_pdf": ...}.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pikepdf
+
+from .q2zugferd_batch import BatchResult, _init_worker, _run_batch, _xml_pdf_job
+from .q2zugferd_cache import ResultCache
+from .q2zugferd_extract import find_zugferd_xml
+from .q2zugferd_profile import get_profile
+
+# Suffix of outputs while they are written, renamed when complete
+PART_SUFFIX = ".part"
+
+
+def _read_records(source):
+    """(name, record) pairs from a JSONL file or a directory of JSON files, read lazily."""
+    if os.path.isdir(source):
+        for entry in sorted(os.scandir(source), key=lambda entry: entry.name):
+            if entry.is_file() and entry.name.lower().endswith(".json"):
+                with open(entry.path, encoding="utf-8") as f:
+                    yield os.path.splitext(entry.name)[0], json.load(f)
+    else:
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield None, json.loads(line)
+
+
+def _safe_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))
+
+
+def _jobs(args, options):
+    for name, record in _read_records(args.source):
+        if "invoice_header" in record:
+            record = {"zugferd_data": record}
+        zugferd_data = record["zugferd_data"]
+        name = _safe_name(name or zugferd_data["invoice_header"]["invoice_number"])
+        input_pdf = record.get("input_pdf") or args.pdf
+        if input_pdf is None and args.pdf_dir is not None:
+            input_pdf = os.path.join(args.pdf_dir, name + ".pdf")
+        output_pdf = record.get("output_pdf") or os.path.join(args.output_dir, name + ".pdf")
+        yield zugferd_data, input_pdf, output_pdf, options, not args.force
+
+
+def is_complete(output_pdf):
+    """True if output_pdf exists, opens and carries an embedded invoice."""
+    if not os.path.isfile(output_pdf):
+        return False
+    try:
+        with pikepdf.open(output_pdf) as pdf:
+            return find_zugferd_xml(pdf) is not None
+    except Exception:
+        return False
+
+
+def _cli_job(index, job):
+    zugferd_data, input_pdf, output_pdf, options, resume = job
+    if resume and is_complete(output_pdf):
+        return BatchResult(index, output_pdf, True, None, 0.0, None)
+    if input_pdf is None:
+        return BatchResult(
+            index, output_pdf, False, "No input PDF: use --pdf, --pdf-dir or input_pdf", 0.0, None
+        )
+    part = output_pdf + PART_SUFFIX
+    result = _xml_pdf_job(index, (zugferd_data, input_pdf, part, options))
+    if result.ok:
+        os.replace(part, output_pdf)
+    elif os.path.exists(part):
+        os.remove(part)
+    return result._replace(output_pdf=output_pdf)
+
+
+def run_batch(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    verify = None if args.verify == "none" else args.verify
+    options = {
+        "save_profile": args.save_profile,
+        "verify": verify,
+        "large": args.large,
+        "deterministic": args.deterministic,
+    }
+    xml_options = {}
+    if args.totals or args.profile:
+        # zugferd_data is rendered inside the workers,
+        # q2zugferd_pdf picks the XMP metadata of the profile from the XML
+        xml_options.update(totals=args.totals, profile=args.profile)
+    if args.cache:
+        cache = ResultCache(args.cache, args.cache_size * 2**20)
+        options["cache"] = xml_options["cache"] = cache
+    if xml_options:
+        options["xml_options"] = xml_options
+
+    start = time.perf_counter()
+    done = skipped = failed = size = 0
+    for result in _run_batch(
+        _cli_job, _jobs(args, options), args.jobs, False, _init_worker, (args.icc,)
+    ):
+        if not result.ok:
+            failed += 1
+            error = result.error.strip().splitlines()[-1]
+            print(f"FAILED {result.output_pdf}: {error}", file=sys.stderr)
+        elif result.result is None:
+            skipped += 1
+        else:
+            done += 1
+            size += result.result["size"]
+        total = done + skipped + failed
+        if not args.quiet and args.progress and total % args.progress == 0:
+            print(f"{total} invoices, {failed} failed", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{done} written, {skipped} skipped, {failed} failed in {elapsed:.1f}s: "
+        f"{done / elapsed if elapsed else 0:.1f} invoices/s, "
+        f"{size / 2**20 / elapsed if elapsed else 0:.1f} MB/s"
+    )
+    return 1 if failed else 0
+
+
+def run_serve(args):
+    from .q2zugferd_server import run_server
+
+    run_server(
+        args.host,
+        args.port,
+        args.unix,
+        args.workers,
+        args.processes,
+        args.max_queue,
+        args.timeout,
+        args.icc,
+    )
+    return 0
+
+
+def _not_negative(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more: {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="q2zugferd", description="ZUGFeRD / Factur-X tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="generate and embed many invoices")
+    batch.add_argument("source", help="JSONL file or directory of JSON files with zugferd_data")
+    pdfs = batch.add_mutually_exclusive_group()
+    pdfs.add_argument("--pdf", help="input PDF for all records without input_pdf")
+    pdfs.add_argument("--pdf-dir", help="directory with <name>.pdf for every record")
+    batch.add_argument("--output-dir", required=True)
+    batch.add_argument("--jobs", "-j", type=int, default=None, help="worker processes")
+    batch.add_argument("--force", action="store_true", help="rewrite existing outputs")
+    batch.add_argument("--save-profile", default="fast", choices=("fast", "compact", "web"))
+    batch.add_argument("--verify", choices=("after", "before", "none"), default="after")
+    batch.add_argument(
+        "--large", action="store_true", help="bounded memory mode for very large PDFs"
+    )
+    batch.add_argument("--totals", choices=("compute", "check"), default=None)
+    batch.add_argument(
+        "--profile", type=get_profile, help="conformance profile, defaults to EN16931"
+    )
+    batch.add_argument(
+        "--deterministic", action="store_true", help="same input, byte-identical output"
+    )
+    batch.add_argument("--cache", help="result cache directory")
+    batch.add_argument("--cache-size", type=int, default=1024, help="cache size in MB")
+    batch.add_argument("--icc", help="ICC profile, defaults to the bundled one")
+    batch.add_argument(
+        "--progress", type=_not_negative, default=1000, help="report every N invoices, 0: off"
+    )
+    batch.add_argument("--quiet", "-q", action="store_true")
+    batch.set_defaults(func=run_batch)
+
+    serve = subparsers.add_parser("serve", help="run the HTTP / Unix socket service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    serve.add_argument("--workers", type=int, default=None, help="worker threads or processes")
+    serve.add_argument("--processes", action="store_true", help="use worker processes")
+    serve.add_argument("--max-queue", type=int, default=64, help="503 above this many requests")
+    serve.add_argument("--timeout", type=float, default=30, help="504 after this many seconds")
+    serve.add_argument("--icc", help="ICC profile, defaults to the bundled one")
+    serve.set_defaults(func=run_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
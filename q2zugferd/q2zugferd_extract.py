@@ -0,0 +1,170 @@
+import os
+import time
+import traceback
+from collections import namedtuple
+
+import pikepdf
+from pikepdf import Array, Dictionary
+
+from .q2zugferd_batch import _run_batch
+from .q2zugferd_pdf import open_pdf
+
+# Embedded file names of ZUGFeRD 1/2, Factur-X and XRechnung, compared lowercase
+ZUGFERD_FILENAMES = ("factur-x.xml", "zugferd-invoice.xml", "xrechnung.xml")
+
+ExtractResult = namedtuple("ExtractResult", "index input_pdf ok error elapsed filename xml output")
+
+
+def _filespec_name(filespec):
+    for key in ("/UF", "/F"):
+        name = filespec.get(key)
+        if name is not None:
+            return str(name)
+    return None
+
+
+def _filespec_bytes(filespec):
+    ef = filespec.get("/EF")
+    if not isinstance(ef, Dictionary):
+        return None
+    for key in ("/UF", "/F"):
+        stream = ef.get(key)
+        if isinstance(stream, pikepdf.Stream):
+            return stream.read_bytes()
+    return None
+
+
+def _iter_name_tree(node, visited):
+    """(name, value) pairs of a PDF name tree, following /Kids."""
+    if not isinstance(node, Dictionary):
+        return
+    if node.is_indirect:
+        if node.objgen in visited:
+            return
+        visited.add(node.objgen)
+    names = node.get("/Names")
+    if isinstance(names, Array):
+        for index in range(0, len(names) - 1, 2):
+            yield str(names[index]), names[index + 1]
+    kids = node.get("/Kids")
+    if isinstance(kids, Array):
+        for kid in kids:
+            yield from _iter_name_tree(kid, visited)
+
+
+def _iter_filespecs(pdf):
+    """Filespecs of /AF first, then of the EmbeddedFiles name tree."""
+    af = pdf.Root.get("/AF")
+    if isinstance(af, Array):
+        for filespec in af:
+            if isinstance(filespec, Dictionary):
+                yield _filespec_name(filespec), filespec
+    names = pdf.Root.get("/Names")
+    if isinstance(names, Dictionary):
+        for name, filespec in _iter_name_tree(names.get("/EmbeddedFiles"), set()):
+            if isinstance(filespec, Dictionary):
+                yield _filespec_name(filespec) or name, filespec
+
+
+def find_zugferd_xml(pdf, filenames=ZUGFERD_FILENAMES):
+    """
+    (filename, xml bytes) of the embedded invoice of an open pikepdf.Pdf,
+    None if there is none. Only the catalog is read, pages are not touched
+    (open the PDF with open_pdf(..., large=True) so the page tree is not walked either).
+    """
+    for name, filespec in _iter_filespecs(pdf):
+        if name is not None and name.lower() in filenames:
+            data = _filespec_bytes(filespec)
+            if data is not None:
+                return name, data
+    return None
+
+
+def q2zugferd_extract(input_pdf, filenames=ZUGFERD_FILENAMES):
+    """
+    Raw bytes of the embedded ZUGFeRD/Factur-X/XRechnung XML, None if not found.
+    input_pdf - file name, bytes, memoryview or binary file-like object.
+    """
+    # Streamed, without pushing inherited attributes to the pages
+    with open_pdf(input_pdf, large=True) as pdf:
+        found = find_zugferd_xml(pdf, filenames)
+    return None if found is None else found[1]
+
+
+def _extract_job(index, job):
+    start = time.perf_counter()
+    input_pdf, output, duplicate = job
+    try:
+        if duplicate:
+            raise ValueError(f"{output} is the output of another PDF of this batch")
+        with open_pdf(input_pdf, large=True) as pdf:
+            found = find_zugferd_xml(pdf)
+        filename = xml = None
+        if found is None:
+            output = None
+        else:
+            filename, xml = found
+            if output is not None:
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+                with open(output, "wb") as f:
+                    f.write(xml)
+                xml = None
+    except Exception:
+        return ExtractResult(
+            index, input_pdf, False, traceback.format_exc(), time.perf_counter() - start,
+            None, None, None,
+        )
+    return ExtractResult(
+        index, input_pdf, True, None, time.perf_counter() - start, filename, xml, output
+    )
+
+
+def _extract_jobs(pdf_paths, output_dir, base=None):
+    """
+    (input_pdf, output, duplicate) jobs: output is <pdf name>.xml in output_dir,
+    below the path relative to base if given; a second PDF with the same
+    output is a duplicate and fails instead of overwriting the first one.
+    """
+    outputs = set()
+    for path in pdf_paths:
+        output = None
+        if output_dir is not None:
+            name = os.path.basename(path) if base is None else os.path.relpath(path, base)
+            output = os.path.join(output_dir, os.path.splitext(name)[0] + ".xml")
+        key = output and os.path.normcase(os.path.abspath(output))
+        yield path, output, key in outputs
+        if key is not None:
+            outputs.add(key)
+
+
+def q2zugferd_extract_batch(pdf_paths, output_dir=None, max_workers=None, ordered=False):
+    """
+    Extract the embedded XML of many PDFs using a process pool.
+
+    output_dir - write <pdf name>.xml there instead of returning the bytes;
+                 a PDF whose name was already used in the batch gives ok=False.
+    Yields ExtractResult(index, input_pdf, ok, error, elapsed, filename, xml, output);
+    filename is None for a PDF without an embedded invoice,
+    a broken PDF gives ok=False and does not stop the batch.
+    """
+    return _run_batch(_extract_job, _extract_jobs(pdf_paths, output_dir), max_workers, ordered)
+
+
+def _iter_pdf_files(directory, recursive):
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            if recursive:
+                yield from _iter_pdf_files(entry.path, recursive)
+        elif entry.name.lower().endswith(".pdf"):
+            yield entry.path
+
+
+def q2zugferd_extract_dir(
+    directory, output_dir=None, recursive=False, max_workers=None, ordered=False
+):
+    """
+    q2zugferd_extract_batch for all *.pdf files of directory, the XML of
+    sub/name.pdf is written to output_dir/sub/name.xml.
+    """
+    jobs = _extract_jobs(_iter_pdf_files(directory, recursive), output_dir, directory)
+    return _run_batch(_extract_job, jobs, max_workers, ordered)
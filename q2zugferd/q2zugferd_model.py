@@ -0,0 +1,312 @@
+"""
+Typed invoice model, an alternative to the zugferd_data dict.
+
+The classes use __slots__, validate and normalise their values once when
+constructed (numbers become Decimal, dates ISO strings, the IBAN loses its
+spaces) and are accepted by q2zugferd_xml, ZugferdTemplate.render and
+q2zugferd_xml_stream wherever the dict is. The writers use the normalised
+values directly (fast path): a Line is formatted without any key lookup
+or re-validation.
+
+Every class also supports the read-only mapping access of the dict
+it replaces (obj["name"], obj.get("name")), so existing code keeps working.
+"""
+
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+from .q2zugferd_totals import round_amount
+
+
+def _decimal(value, field):
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value) if isinstance(value, float) else value)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"{field}: not a number: {value!r}") from None
+
+
+def _optional_decimal(value, field):
+    return None if value is None or value == "" else _decimal(value, field)
+
+
+def _text(value, field, required=True):
+    if value is None or str(value).strip() == "":
+        if required:
+            raise ValueError(f"{field}: value required")
+        return None
+    return str(value)
+
+
+def _date(value, field, required=True):
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{field}: value required")
+        return None
+    if isinstance(value, datetime.date):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: not an ISO date (YYYY-MM-DD): {value!r}") from None
+
+
+def _code(value, field, length):
+    value = _text(value, field).upper()
+    if len(value) != length or not value.isalpha():
+        raise ValueError(f"{field}: {length} letter code expected: {value!r}")
+    return value
+
+
+class _Model:
+    """Mapping style read access for code written against the dicts."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        # Unset values are missing keys, as in the dict
+        value = getattr(self, key, None)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        # Unset values are missing keys of the dict, as with .get()
+        return [key for key in self.__slots__ if getattr(self, key) is not None]
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={getattr(self, key)!r}" for key in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Party(_Model):
+    __slots__ = ("name", "street", "postal_code", "city", "country_code", "vat_id", "part_id")
+
+    def __init__(
+        self, name, street, postal_code, city, country_code, vat_id=None, part_id=None
+    ):
+        self.name = _text(name, "name")
+        self.street = _text(street, "street", False)
+        self.postal_code = _text(postal_code, "postal_code", False)
+        self.city = _text(city, "city", False)
+        self.country_code = _code(country_code, "country_code", 2)
+        self.vat_id = _text(vat_id, "vat_id", False)
+        self.part_id = _text(part_id, "part_id", False)
+
+
+class BankAccount(_Model):
+    __slots__ = ("iban", "bic_swift")
+
+    def __init__(self, iban, bic_swift):
+        iban = re.sub(r"\s+", "", _text(iban, "iban")).upper()
+        if not re.fullmatch(r"[A-Z]{2}\d{2}[A-Z0-9]{10,30}", iban):
+            raise ValueError(f"iban: invalid IBAN: {iban!r}")
+        # ISO 13616 check digits
+        digits = "".join(str(int(char, 36)) for char in iban[4:] + iban[:4])
+        if int(digits) % 97 != 1:
+            raise ValueError(f"iban: invalid IBAN: {iban!r}")
+        bic_swift = _text(bic_swift, "bic_swift").upper()
+        if len(bic_swift) not in (8, 11):
+            raise ValueError(f"bic_swift: 8 or 11 characters expected: {bic_swift!r}")
+        self.iban = iban
+        self.bic_swift = bic_swift
+
+
+class Line(_Model):
+    __slots__ = (
+        "line_number",
+        "name",
+        "quantity",
+        "net_price",
+        "vat_rate",
+        "net_total",
+        "description",
+        "unit_code",
+        "vat_category",
+    )
+
+    def __init__(
+        self,
+        line_number,
+        name,
+        quantity,
+        net_price,
+        vat_rate,
+        net_total=None,
+        description=None,
+        unit_code="PCE",
+        vat_category="S",
+    ):
+        field = f"line {line_number}"
+        self.line_number = _text(line_number, "line_number")
+        self.name = _text(name, f"{field} name")
+        self.quantity = _decimal(quantity, f"{field} quantity")
+        self.net_price = _decimal(net_price, f"{field} net_price")
+        self.vat_rate = _decimal(vat_rate, f"{field} vat_rate")
+        self.net_total = _optional_decimal(net_total, f"{field} net_total")
+        self.description = _text(description, f"{field} description", False)
+        self.unit_code = _text(unit_code, f"{field} unit_code")
+        self.vat_category = _text(vat_category, f"{field} vat_category")
+
+    @classmethod
+    def from_dict(cls, line):
+        return cls(
+            line["line_number"],
+            line["name"],
+            line["quantity"],
+            line["net_price"],
+            line["vat_rate"],
+            line.get("net_line_total", line.get("net_total")),
+            line.get("description"),
+            line.get("unit_code", "PCE"),
+            line.get("vat_category", "S"),
+        )
+
+    def values(self):
+        """Formatted values as q2zugferd_xml._line_values returns them for a dict."""
+        return (
+            self.line_number,
+            self.name,
+            self.description,
+            "{:.4f}".format(self.net_price),
+            self.unit_code,
+            "{:.4f}".format(self.quantity),
+            "{:.2f}".format(self.vat_rate),
+            None if self.net_total is None else "{:.2f}".format(round_amount(self.net_total)),
+            self.vat_category,
+        )
+
+
+class VatItem(_Model):
+    __slots__ = ("vat_rate", "tax_base_amount", "tax_amount", "vat_category")
+
+    def __init__(self, vat_rate, tax_base_amount, tax_amount, vat_category="S"):
+        self.vat_rate = _decimal(vat_rate, "vat_rate")
+        self.tax_base_amount = _decimal(tax_base_amount, "tax_base_amount")
+        self.tax_amount = _decimal(tax_amount, "tax_amount")
+        self.vat_category = _text(vat_category, "vat_category")
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(
+            item["vat_rate"],
+            item["tax_base_amount"],
+            item["tax_amount"],
+            item.get("vat_category", "S"),
+        )
+
+
+def _items(values, cls):
+    return [value if isinstance(value, cls) else cls.from_dict(value) for value in values]
+
+
+def _party(value):
+    return value if isinstance(value, Party) else Party(**value)
+
+
+class Invoice(_Model):
+    """
+    Invoice with header fields, parties, bank account, lines and VAT breakdown.
+    invoice["invoice_header"] is the invoice itself, the other keys of
+    zugferd_data map to the attributes (invoice["invoice_lines"] is .lines).
+    """
+
+    __slots__ = (
+        "invoice_number",
+        "invoice_date",
+        "seller",
+        "buyer",
+        "bank_account",
+        "lines",
+        "vat_breakdown",
+        "currency",
+        "net_amount",
+        "delivery_date",
+        "due_date",
+        "payment_terms_days",
+        "skonto_rate",
+        "skonto_due_date",
+    )
+
+    _KEYS = {
+        "invoice_lines": "lines",
+        "seller_bank_account": "bank_account",
+    }
+
+    def __init__(
+        self,
+        invoice_number,
+        invoice_date,
+        seller,
+        buyer,
+        bank_account,
+        lines,
+        vat_breakdown=(),
+        currency="EUR",
+        net_amount=None,
+        delivery_date=None,
+        due_date=None,
+        payment_terms_days=None,
+        skonto_rate=None,
+        skonto_due_date=None,
+    ):
+        self.invoice_number = _text(invoice_number, "invoice_number")
+        self.invoice_date = _date(invoice_date, "invoice_date")
+        self.seller = _party(seller)
+        self.buyer = _party(buyer)
+        self.bank_account = (
+            bank_account if isinstance(bank_account, BankAccount) else BankAccount(**bank_account)
+        )
+        self.lines = _items(lines, Line)
+        self.vat_breakdown = _items(vat_breakdown, VatItem)
+        self.currency = _code(currency, "currency", 3)
+        self.net_amount = _optional_decimal(net_amount, "net_amount")
+        self.delivery_date = _date(delivery_date, "delivery_date", False)
+        self.due_date = _date(due_date, "due_date", False)
+        self.payment_terms_days = _text(payment_terms_days, "payment_terms_days", False)
+        self.skonto_rate = _optional_decimal(skonto_rate, "skonto_rate")
+        self.skonto_due_date = _date(skonto_due_date, "skonto_due_date", False)
+        if self.skonto_rate and self.skonto_due_date is None:
+            raise ValueError("skonto_due_date: value required with skonto_rate")
+
+    @classmethod
+    def from_dict(cls, zugferd_data):
+        """Invoice from the zugferd_data dict of q2zugferd_xml."""
+        header = zugferd_data["invoice_header"]
+        return cls(
+            header["invoice_number"],
+            header["invoice_date"],
+            zugferd_data["seller"],
+            zugferd_data["buyer"],
+            zugferd_data["seller_bank_account"],
+            zugferd_data["invoice_lines"],
+            zugferd_data["vat_breakdown"],
+            zugferd_data["currency"]["iso_code"],
+            header.get("net_amount"),
+            header.get("delivery_date"),
+            header.get("due_date"),
+            header.get("payment_terms_days"),
+            header.get("skonto_rate"),
+            header.get("skonto_due_date"),
+        )
+
+    def __getitem__(self, key):
+        if key == "invoice_header":
+            return self
+        if key == "currency":
+            return {"iso_code": self.currency}
+        return super().__getitem__(self._KEYS.get(key, key))
@@ -0,0 +1,223 @@
+import io
+import os
+import re
+
+from lxml import etree as ET
+
+from .q2zugferd_xml import RAM, RSM, UDT
+
+_LINE_ITEM = RAM + "IncludedSupplyChainTradeLineItem"
+_DOCUMENT = RSM + "ExchangedDocument"
+_AGREEMENT = RAM + "ApplicableHeaderTradeAgreement"
+_DELIVERY = RAM + "ApplicableHeaderTradeDelivery"
+_SETTLEMENT = RAM + "ApplicableHeaderTradeSettlement"
+
+_PAYMENT_TERMS = re.compile(r"Zahlungsziel:\s*(\d+)\s*Tage")
+_SKONTO = re.compile(r"([\d.]+)%\s*Skonto bis\s*(\S+?)\.?$")
+
+
+def _source(source):
+    """iterparse source: file name, os.PathLike, binary file-like, bytes or XML str."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, str) and source.lstrip("\ufeff \t\r\n").startswith("<"):
+        return io.BytesIO(source.encode("utf-8"))
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    return source
+
+
+def _text(element, *path):
+    if element is None:
+        return None
+    return element.findtext("/".join(path))
+
+
+def _date(element, *path):
+    """YYYYMMDD (format 102) to YYYY-MM-DD."""
+    value = _text(element, *path, UDT + "DateTimeString")
+    if value and len(value) == 8:
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def _release(element):
+    # Free the element and everything parsed before it
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _add_category(item, tax):
+    # Only categories other than the default "S" are stored
+    category = _text(tax, RAM + "CategoryCode")
+    if category and category != "S":
+        item["vat_category"] = category
+    return item
+
+
+def _parse_line(element):
+    quantity = element.find(f"{RAM}SpecifiedLineTradeDelivery/{RAM}BilledQuantity")
+    line = {
+        "line_number": _text(element, RAM + "AssociatedDocumentLineDocument", RAM + "LineID"),
+        "name": _text(element, RAM + "SpecifiedTradeProduct", RAM + "Name"),
+        "description": _text(element, RAM + "SpecifiedTradeProduct", RAM + "Description"),
+        "net_price": _text(
+            element,
+            RAM + "SpecifiedLineTradeAgreement",
+            RAM + "NetPriceProductTradePrice",
+            RAM + "ChargeAmount",
+        ),
+        "unit_code": None if quantity is None else quantity.get("unitCode"),
+        "quantity": None if quantity is None else quantity.text,
+        "vat_rate": _text(
+            element,
+            RAM + "SpecifiedLineTradeSettlement",
+            RAM + "ApplicableTradeTax",
+            RAM + "RateApplicablePercent",
+        ),
+        "net_total": _text(
+            element,
+            RAM + "SpecifiedLineTradeSettlement",
+            RAM + "SpecifiedTradeSettlementLineMonetarySummation",
+            RAM + "LineTotalAmount",
+        ),
+    }
+    tax = element.find(f"{RAM}SpecifiedLineTradeSettlement/{RAM}ApplicableTradeTax")
+    return _add_category(line, tax)
+
+
+def _parse_party(party):
+    address = party.find(RAM + "PostalTradeAddress")
+    return {
+        "name": _text(party, RAM + "Name"),
+        "postal_code": _text(address, RAM + "PostcodeCode"),
+        "city": _text(address, RAM + "CityName"),
+        "country_code": _text(address, RAM + "CountryID"),
+        "street": _text(address, RAM + "LineOne"),
+    }
+
+
+def _parse_agreement(element, zugferd_data):
+    seller_party = element.find(RAM + "SellerTradeParty")
+    seller = {}
+    vat_id = seller_party.find(f"{RAM}SpecifiedTaxRegistration/{RAM}ID[@schemeID='VA']")
+    if vat_id is not None:
+        seller["vat_id"] = vat_id.text
+    seller.update(_parse_party(seller_party))
+    buyer_party = element.find(RAM + "BuyerTradeParty")
+    buyer = {"part_id": _text(buyer_party, RAM + "ID") or _text(element, RAM + "BuyerReference")}
+    buyer.update(_parse_party(buyer_party))
+    zugferd_data["seller"] = seller
+    zugferd_data["buyer"] = buyer
+
+
+def _parse_settlement(element, zugferd_data):
+    header = zugferd_data["invoice_header"]
+    zugferd_data["currency"] = {"iso_code": _text(element, RAM + "InvoiceCurrencyCode")}
+    payment_means = element.find(RAM + "SpecifiedTradeSettlementPaymentMeans")
+    zugferd_data["seller_bank_account"] = {
+        "iban": _text(payment_means, RAM + "PayeePartyCreditorFinancialAccount", RAM + "IBANID"),
+        "bic_swift": _text(
+            payment_means, RAM + "PayeeSpecifiedCreditorFinancialInstitution", RAM + "BICID"
+        ),
+    }
+    zugferd_data["vat_breakdown"] = [
+        _add_category(
+            {
+                "vat_rate": _text(tax, RAM + "RateApplicablePercent"),
+                "tax_base_amount": _text(tax, RAM + "BasisAmount"),
+                "tax_amount": _text(tax, RAM + "CalculatedAmount"),
+            },
+            tax,
+        )
+        for tax in element.iterfind(RAM + "ApplicableTradeTax")
+    ]
+
+    terms = element.find(RAM + "SpecifiedTradePaymentTerms")
+    description = _text(terms, RAM + "Description") or ""
+    match = _PAYMENT_TERMS.search(description)
+    if match:
+        header["payment_terms_days"] = match.group(1)
+    match = _SKONTO.search(description)
+    if match:
+        header["skonto_rate"], header["skonto_due_date"] = match.groups()
+    due_date = _date(terms, RAM + "DueDateDateTime")
+    if due_date:
+        header["due_date"] = due_date
+    summation = element.find(RAM + "SpecifiedTradeSettlementHeaderMonetarySummation")
+    # MINIMUM and BASIC WL have no line total
+    header["net_amount"] = _text(summation, RAM + "LineTotalAmount") or _text(
+        summation, RAM + "TaxBasisTotalAmount"
+    )
+    if not zugferd_data["vat_breakdown"]:
+        # MINIMUM: the header totals are all there is of the VAT
+        for key, tag in (("tax_total", "TaxTotalAmount"), ("grand_total", "GrandTotalAmount")):
+            value = _text(summation, RAM + tag)
+            if value is not None:
+                header[key] = value
+
+
+def _iterparse(source):
+    return ET.iterparse(
+        _source(source),
+        events=("end",),
+        tag=(_LINE_ITEM, _DOCUMENT, _AGREEMENT, _DELIVERY, _SETTLEMENT),
+        remove_blank_text=True,
+        huge_tree=True,
+    )
+
+
+def iter_invoice_lines(source):
+    """
+    Generator of invoice line dicts of a CrossIndustryInvoice, parsed lazily:
+    every line item is freed once yielded, parsing stops after the last line.
+    """
+    for _, element in _iterparse(source):
+        if element.tag == _LINE_ITEM:
+            line = _parse_line(element)
+            _release(element)
+            yield line
+        elif element.tag != _DOCUMENT:
+            # Header sections follow the line items
+            return
+
+
+def q2zugferd_parse(source, invoice_lines=True):
+    """
+    Parse a CrossIndustryInvoice into the zugferd_data structure of q2zugferd_xml.
+    source - file name, os.PathLike, binary file-like object, bytes or XML str.
+    invoice_lines - False skips the lines (invoice_lines is an empty list).
+    vat_category is set on lines and VAT items only if it is not "S".
+    Elements are freed as they are parsed, so memory does not grow with the lines.
+    """
+    zugferd_data = {
+        "invoice_header": {},
+        "seller": {},
+        "buyer": {},
+        "currency": {},
+        "seller_bank_account": {},
+        "invoice_lines": [],
+        "vat_breakdown": [],
+    }
+    header = zugferd_data["invoice_header"]
+    for _, element in _iterparse(source):
+        tag = element.tag
+        if tag == _LINE_ITEM:
+            if invoice_lines:
+                zugferd_data["invoice_lines"].append(_parse_line(element))
+        elif tag == _DOCUMENT:
+            header["invoice_number"] = _text(element, RAM + "ID")
+            header["invoice_date"] = _date(element, RAM + "IssueDateTime")
+        elif tag == _AGREEMENT:
+            _parse_agreement(element, zugferd_data)
+        elif tag == _DELIVERY:
+            header["delivery_date"] = _date(
+                element, RAM + "ActualDeliverySupplyChainEvent", RAM + "OccurrenceDateTime"
+            )
+        elif tag == _SETTLEMENT:
+            _parse_settlement(element, zugferd_data)
+        _release(element)
+    return zugferd_data
@@ -1,8 +1,16 @@
+import io
 import os
+import shutil
+import time
+import zlib
 import pikepdf
-from pikepdf import Dictionary, Name, Array
+from pikepdf import Dictionary, Name, Array, Stream
 from importlib.resources import files
 
+from .q2zugferd_cache import _Digest
+from .q2zugferd_profile import detect_profile, get_profile
+from .q2zugferd_stats import stage
+
 import re
 
 
@@ -42,12 +50,13 @@ def pdf_date_to_xmp(pdf_date):
     return f"{year}-{month}-{day}T{hour}:{minute}:{second}{tz}"
 
 
-def get_zugferd_xmp(version="1.0", conformance_level="BASIC", info={}):
+def get_zugferd_xmp(
+    version="1.0", conformance_level="EN 16931", info={}, xml_filename="factur-x.xml"
+):
     zugferd_ns = "urn:factur-x:pdfa:CrossIndustryDocument:invoice:1p0#"
     pdfa_level = "U"
     documenttype = "INVOICE"
-    xml_filename = "factur-x.xml"
-    xmp_level = "EN 16931"
+    xmp_level = conformance_level
     title = info.Title
     author = info.Author
     subject = info.Subject
@@ -143,175 +152,445 @@ def get_zugferd_xmp(version="1.0", conformance_level="BASIC", info={}):
 """
 
 
-def replace_device_rgb_recursive(pdf, resources, icc_ref):
-    """Рекурсивно заменяет DeviceRGB на ICCBased во всех ресурсах и объектах."""
-    if not isinstance(resources, Dictionary):
-        return
+def is_device_rgb(cs):
+    """True for /DeviceRGB given as a name or as a one-element array."""
+    if isinstance(cs, Name):
+        return cs == Name.DeviceRGB
+    if isinstance(cs, Array):
+        return len(cs) == 1 and cs[0] == Name.DeviceRGB
+    return False
+
+
+def _seen(obj, visited):
+    """Mark an indirect object as processed; direct objects are never skipped."""
+    if not obj.is_indirect:
+        return False
+    objgen = obj.objgen
+    if objgen in visited:
+        return True
+    visited.add(objgen)
+    return False
+
+
+# Position of the base/alternate color space inside color space arrays
+_BASE_COLORSPACE_INDEX = {
+    Name.Indexed: 1,
+    Name.Pattern: 1,
+    Name.Separation: 2,
+    Name.DeviceN: 2,
+}
+
+
+def replace_device_rgb_colorspace(cs, icc_ref, visited):
+    """
+    Return the ICCBased replacement if cs is DeviceRGB itself,
+    cs itself if DeviceRGB used as its base/alternate was fixed in place,
+    None if nothing changed.
+    """
+    if is_device_rgb(cs):
+        return Array([Name("/ICCBased"), icc_ref])
+    if not isinstance(cs, Array) or len(cs) < 2 or _seen(cs, visited):
+        return None
+    index = _BASE_COLORSPACE_INDEX.get(cs[0])
+    if index is not None and len(cs) > index:
+        base_cs = cs[index]
+        base = replace_device_rgb_colorspace(base_cs, icc_ref, visited)
+        if base is not None:
+            if base is not base_cs:
+                cs[index] = base
+            return cs
+    return None
+
+
+def _replace_device_rgb_key(obj, key, icc_ref, visited):
+    """Fix the color space under obj[key], returns 1 if it was rewritten."""
+    cs = obj.get(key)
+    if cs is None:
+        return 0
+    new_cs = replace_device_rgb_colorspace(cs, icc_ref, visited)
+    if new_cs is None:
+        return 0
+    if new_cs is not cs:
+        obj[key] = new_cs
+    return 1
+
+
+def _set_default_rgb(resources, icc_ref):
+    # Only written if missing: replacing a DefaultRGB of the document would change
+    # its rendering, and resources of an already converted document stay untouched
+    if "/DefaultRGB" not in resources:
+        resources["/DefaultRGB"] = icc_ref
+
+
+def _replace_device_rgb_group(obj, icc_ref):
+    group = obj.get("/Group")
+    if isinstance(group, Dictionary) and is_device_rgb(group.get("/CS")):
+        group["/CS"] = Array([Name("/ICCBased"), icc_ref])
+        return 1
+    return 0
+
+
+def replace_device_rgb_recursive(pdf, resources, icc_ref, visited=None):
+    """
+    Рекурсивно заменяет DeviceRGB на ICCBased во всех ресурсах и объектах.
+    visited - set of objgen of already processed indirect objects; pass the same
+    set for all pages so shared XObjects, forms and patterns are processed once.
+    Returns the number of rewritten color spaces and groups.
+    """
+    if visited is None:
+        visited = set()
+    if not isinstance(resources, Dictionary) or _seen(resources, visited):
+        return 0
+    rewritten = 0
 
     # Установка DefaultRGB для текущего контекста ресурсов
-    resources["/DefaultRGB"] = icc_ref
+    _set_default_rgb(resources, icc_ref)
 
     # 1. Обработка словаря ColorSpace
     color_spaces = resources.get("/ColorSpace")
     if isinstance(color_spaces, Dictionary):
-        for cs_name, cs_ref in list(color_spaces.items()):
-            try:
-                # Если прямая ссылка на Name("/DeviceRGB")
-                if cs_ref == "/DeviceRGB" or cs_ref == Name("/DeviceRGB"):
-                    color_spaces[cs_name] = Array([Name("/ICCBased"), icc_ref])
-                else:
-                    cs_obj = cs_ref.resolve()
-                    if isinstance(cs_obj, (Dictionary, Array)) and "/DeviceRGB" in str(
-                        cs_obj
-                    ):
-                        color_spaces[cs_name] = Array([Name("/ICCBased"), icc_ref])
-            except Exception:
-                pass
+        for cs_name in list(color_spaces.keys()):
+            rewritten += _replace_device_rgb_key(color_spaces, cs_name, icc_ref, visited)
 
     # 2. Обработка XObjects (Images и Forms)
     xobjects = resources.get("/XObject")
     if isinstance(xobjects, Dictionary):
-        for xobj_name, xobj_ref in xobjects.items():
-            try:
-                xobj = xobj_ref.resolve()
-                if not isinstance(xobj, Dictionary):
-                    continue
-
-                # --- КЛЮЧЕВОЕ ИСПРАВЛЕНИЕ ДЛЯ ИЗОБРАЖЕНИЙ ---
-                # Если само изображение использует /DeviceRGB
-                if xobj.get("/Subtype") == "/Image":
-                    cs = xobj.get("/ColorSpace")
-                    if cs == "/DeviceRGB" or cs == Name("/DeviceRGB"):
-                        # Заменяем прямо в объекте изображения
-                        xobj["/ColorSpace"] = Array([Name("/ICCBased"), icc_ref])
-
+        for xobj in xobjects.values():
+            if not isinstance(xobj, Stream) or _seen(xobj, visited):
+                continue
+            subtype = xobj.get("/Subtype")
+            if subtype == Name.Image:
+                # Заменяем прямо в объекте изображения
+                rewritten += _replace_device_rgb_key(xobj, "/ColorSpace", icc_ref, visited)
+            elif subtype == Name.Form:
                 # Рекурсия для вложенных форм
-                if xobj.get("/Subtype") == "/Form":
-                    xobj_resources = xobj.get("/Resources", Dictionary())
-                    replace_device_rgb_recursive(pdf, xobj_resources, icc_ref)
-                    xobj["/Resources"] = xobj_resources
-
+                xobj_resources = xobj.get("/Resources")
+                if xobj_resources is None:
+                    xobj["/Resources"] = xobj_resources = Dictionary()
+                rewritten += replace_device_rgb_recursive(
+                    pdf, xobj_resources, icc_ref, visited
+                )
                 # Исправление цветовой группы прозрачности
-                group = xobj.get("/Group")
-                if isinstance(group, Dictionary) and group.get("/CS") == "/DeviceRGB":
-                    group["/CS"] = icc_ref
-            except Exception:
-                pass
+                rewritten += _replace_device_rgb_group(xobj, icc_ref)
 
-    # 3. Исправление в паттернах (Patterns)
+    # 3. Исправление в паттернах (Patterns) и заливках (Shadings)
     patterns = resources.get("/Pattern")
     if isinstance(patterns, Dictionary):
-        for pat_name, pat_ref in patterns.items():
-            try:
-                pat = pat_ref.resolve()
-                if isinstance(pat, Dictionary):
-                    pat_res = pat.get("/Resources", Dictionary())
-                    replace_device_rgb_recursive(pdf, pat_res, icc_ref)
-                    pat["/Resources"] = pat_res
-            except Exception:
-                pass
+        for pat in patterns.values():
+            if not isinstance(pat, (Dictionary, Stream)) or _seen(pat, visited):
+                continue
+            shading = pat.get("/Shading")
+            if isinstance(shading, (Dictionary, Stream)) and not _seen(shading, visited):
+                rewritten += _replace_device_rgb_key(shading, "/ColorSpace", icc_ref, visited)
+            pat_res = pat.get("/Resources")
+            if pat_res is not None:
+                rewritten += replace_device_rgb_recursive(pdf, pat_res, icc_ref, visited)
+
+    shadings = resources.get("/Shading")
+    if isinstance(shadings, Dictionary):
+        for shading in shadings.values():
+            if isinstance(shading, (Dictionary, Stream)) and not _seen(shading, visited):
+                rewritten += _replace_device_rgb_key(shading, "/ColorSpace", icc_ref, visited)
+    return rewritten
+
+
+def _page_resources(page):
+    """
+    Resources of a page, inherited from the page tree if the page has none
+    (documents opened with inherit_page_attributes=False), None without any.
+    """
+    node = page.obj
+    for _ in range(64):
+        resources = node.get("/Resources")
+        if resources is not None or not isinstance(node.get("/Parent"), Dictionary):
+            return resources
+        node = node.Parent
+    return None
+
 
+def _colorspace_uses_device_rgb(cs, visited):
+    if is_device_rgb(cs):
+        return True
+    if not isinstance(cs, Array) or len(cs) < 2 or _seen(cs, visited):
+        return False
+    index = _BASE_COLORSPACE_INDEX.get(cs[0])
+    return (
+        index is not None
+        and len(cs) > index
+        and _colorspace_uses_device_rgb(cs[index], visited)
+    )
+
+
+class _ScanLimit(Exception):
+    pass
+
+
+def scan_for_device_rgb(pdf, limit=None):
+    """
+    Scan entire PDF for any remaining DeviceRGB references.
+    limit - stop after that many issues were found.
+    Returns {"issues": [paths], "count": int, "elapsed": seconds}.
+    """
+    start = time.perf_counter()
+    issues = []
+    visited = set()
+
+    def add_issue(path):
+        issues.append(path)
+        if limit is not None and len(issues) >= limit:
+            raise _ScanLimit
 
-def scan_for_device_rgb(pdf):
-    """Scan entire PDF for any remaining DeviceRGB references"""
-    issues_found = 0
+    def check_colorspace(obj, key, path):
+        cs = obj.get(key)
+        if cs is not None and _colorspace_uses_device_rgb(cs, visited):
+            add_issue(f"{path}/{key[1:]}")
+
+    def check_group(obj, path):
+        group = obj.get("/Group")
+        if (
+            isinstance(group, Dictionary)
+            and group.get("/S") == "/Transparency"
+            and is_device_rgb(group.get("/CS"))
+        ):
+            add_issue(f"{path}/Group/CS")
 
     def check_resources(resources, path="Root"):
-        nonlocal issues_found
-        if not isinstance(resources, Dictionary):
+        if not isinstance(resources, Dictionary) or _seen(resources, visited):
             return
 
         # ColorSpaces
         color_spaces = resources.get("/ColorSpace")
         if isinstance(color_spaces, Dictionary):
-            for cs_name, cs_ref in color_spaces.items():
-                if cs_ref == "/DeviceRGB":
-                    print(f"DeviceRGB found at {path}/ColorSpace/{cs_name}")
-                    issues_found += 1
+            for cs_name in color_spaces.keys():
+                check_colorspace(color_spaces, cs_name, f"{path}/ColorSpace")
 
         # XObjects
         xobjects = resources.get("/XObject")
         if isinstance(xobjects, Dictionary):
-            for xobj_name, xobj_ref in xobjects.items():
-                try:
-                    xobj = xobj_ref.resolve()
-                    if isinstance(xobj, Dictionary):
-                        xobj_resources = xobj.get("/Resources", Dictionary())
-                        check_resources(xobj_resources, path + f"/XObject/{xobj_name}")
-                        group = xobj.get("/Group")
-                        if (
-                            isinstance(group, Dictionary)
-                            and group.get("/S") == "/Transparency"
-                        ):
-                            if group.get("/CS") == "/DeviceRGB":
-                                print(
-                                    f"DeviceRGB found at {path}/XObject/{xobj_name}/Group/CS"
-                                )
-                                issues_found += 1
-                except Exception:
-                    pass
+            for xobj_name, xobj in xobjects.items():
+                if not isinstance(xobj, Stream) or _seen(xobj, visited):
+                    continue
+                xobj_path = f"{path}/XObject/{xobj_name[1:]}"
+                if xobj.get("/Subtype") == Name.Image:
+                    check_colorspace(xobj, "/ColorSpace", xobj_path)
+                else:
+                    check_resources(xobj.get("/Resources"), xobj_path)
+                    check_group(xobj, xobj_path)
 
         # Patterns
         patterns = resources.get("/Pattern")
         if isinstance(patterns, Dictionary):
-            for pat_name, pat_ref in patterns.items():
-                try:
-                    pat = pat_ref.resolve()
-                    if isinstance(pat, Dictionary):
-                        pat_res = pat.get("/Resources", Dictionary())
-                        check_resources(pat_res, path + f"/Pattern/{pat_name}")
-                except Exception:
-                    pass
+            for pat_name, pat in patterns.items():
+                if not isinstance(pat, (Dictionary, Stream)) or _seen(pat, visited):
+                    continue
+                pat_path = f"{path}/Pattern/{pat_name[1:]}"
+                shading = pat.get("/Shading")
+                if isinstance(shading, (Dictionary, Stream)):
+                    check_colorspace(shading, "/ColorSpace", f"{pat_path}/Shading")
+                check_resources(pat.get("/Resources"), pat_path)
+
+        # Shadings
+        shadings = resources.get("/Shading")
+        if isinstance(shadings, Dictionary):
+            for sh_name, shading in shadings.items():
+                if isinstance(shading, (Dictionary, Stream)):
+                    check_colorspace(shading, "/ColorSpace", f"{path}/Shading/{sh_name[1:]}")
 
         # ExtGState
         extgstate = resources.get("/ExtGState")
         if isinstance(extgstate, Dictionary):
-            for gs_name, gs_ref in extgstate.items():
-                try:
-                    gs = gs_ref.resolve()
-                    if isinstance(gs, Dictionary):
-                        if "/BG" in gs and gs["/BG"] == "/DeviceRGB":
-                            print(f"DeviceRGB found at {path}/ExtGState/{gs_name}/BG")
-                            issues_found += 1
-                        if "/BG2" in gs and gs["/BG2"] == "/DeviceRGB":
-                            print(f"DeviceRGB found at {path}/ExtGState/{gs_name}/BG2")
-                            issues_found += 1
-                except Exception:
-                    pass
+            for gs_name, gs in extgstate.items():
+                if not isinstance(gs, Dictionary):
+                    continue
+                for key in ("/BG", "/BG2"):
+                    if is_device_rgb(gs.get(key)):
+                        add_issue(f"{path}/ExtGState/{gs_name[1:]}/{key[1:]}")
 
     # Check pages
-    for i, page in enumerate(pdf.pages):
-        resources = page.get("/Resources", Dictionary())
-        check_resources(resources, f"Page[{i}]")
-        group = page.get("/Group")
-        if isinstance(group, Dictionary) and group.get("/S") == "/Transparency":
-            if group.get("/CS") == "/DeviceRGB":
-                print(f"DeviceRGB found at Page[{i}]/Group/CS")
-                issues_found += 1
-
-    if issues_found == 0:
-        print("✅ No DeviceRGB references found. PDF is ready for PDF/A-3B validation.")
+    try:
+        for i, page in enumerate(pdf.pages):
+            check_resources(_page_resources(page), f"Page[{i}]")
+            check_group(page, f"Page[{i}]")
+    except _ScanLimit:
+        pass
+
+    return {
+        "issues": issues,
+        "count": len(issues),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def read_icc_profile(path=None):
+    """Read ICC profile bytes, by default the bundled sRGB2014 profile."""
+    if path is None:
+        path = files("q2zugferd").joinpath("icc/sRGB2014.icc")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Process-wide ICC profile: (raw bytes, Flate-compressed bytes)
+_icc_profile = None
+
+
+def _prepare_icc_profile(icc_data):
+    icc_data = bytes(icc_data)
+    return icc_data, zlib.compress(icc_data, 9)
+
+
+def set_icc_profile(profile=None):
+    """
+    Set the ICC profile used by q2zugferd_pdf in this process.
+    profile - path or bytes; None restores the bundled sRGB2014 profile.
+    """
+    global _icc_profile
+    if profile is None:
+        _icc_profile = None
+    elif isinstance(profile, (bytes, bytearray, memoryview)):
+        _icc_profile = _prepare_icc_profile(profile)
     else:
-        print(f"⚠️ Total DeviceRGB references remaining: {issues_found}")
+        _icc_profile = _prepare_icc_profile(read_icc_profile(profile))
 
 
-def q2zugferd_pdf(input_pdf, xml_path, output_pdf, pdfa_level="B"):
-    # --- Open PDF ---
-    pdf = pikepdf.open(input_pdf)
-    info = pdf.docinfo
-    info["/Creator"] = "q2zugferd"
-    info["/Author"] = "q2zugferd"
-    info["/Title"] = "Title"
-    info["/Subject"] = "Subject"
+def get_icc_profile():
+    """Return (raw, compressed) ICC profile bytes, loading them on first use."""
+    global _icc_profile
+    if _icc_profile is None:
+        _icc_profile = _prepare_icc_profile(read_icc_profile())
+    return _icc_profile
 
-    # --- Load ICC profile ---
-    icc_profile_path = files("q2zugferd").joinpath("icc/sRGB2014.icc")
-    with open(icc_profile_path, "rb") as f:
-        icc_data = f.read()
-    icc_stream = pdf.make_stream(icc_data)
+
+def make_icc_stream(pdf, icc_profile=None):
+    """Embed the ICC profile as a Flate-compressed indirect stream."""
+    if icc_profile is None:
+        icc_data, icc_flate = get_icc_profile()
+    else:
+        icc_data, icc_flate = _prepare_icc_profile(icc_profile)
+    icc_stream = pdf.make_stream(b"")
+    icc_stream.write(icc_flate, filter=Name.FlateDecode)
     icc_stream["/N"] = 3
-    icc_ref = pdf.make_indirect(icc_stream)
+    return pdf.make_indirect(icc_stream)
+
+
+# pikepdf.save options; all of them keep the PDF/A-3 structure valid
+# (object streams need PDF 1.5, which PDF/A-3 allows, XMP metadata stays uncompressed)
+SAVE_PROFILES = {
+    # fastest save, existing streams are copied as they are
+    "fast": dict(linearize=False, compress_streams=False),
+    # smallest file: compress all streams, pack objects into object streams
+    "compact": dict(
+        linearize=False,
+        compress_streams=True,
+        stream_decode_level=pikepdf.StreamDecodeLevel.generalized,
+        recompress_flate=True,
+        object_stream_mode=pikepdf.ObjectStreamMode.generate,
+    ),
+    # compact + linearized for fast first-page view
+    "web": dict(
+        linearize=True,
+        compress_streams=True,
+        stream_decode_level=pikepdf.StreamDecodeLevel.generalized,
+        recompress_flate=True,
+        object_stream_mode=pikepdf.ObjectStreamMode.generate,
+    ),
+}
+
+
+def _stream_start(output_pdf):
+    """Position the PDF is written at, None for file names and streams without tell()."""
+    if not hasattr(output_pdf, "write"):
+        return None
+    try:
+        return output_pdf.tell()
+    except (OSError, ValueError):
+        # Pipes and sockets
+        return None
+
+
+class _CountingWriter(io.RawIOBase):
+    """Writes through to a stream without tell() and counts the bytes."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.stream.write(data)
+        self.size += len(data)
+        return len(data)
+
+
+def save_pdf(pdf, output_pdf, save_profile="fast", deterministic=False):
+    """
+    Save pdf with one of SAVE_PROFILES (or a dict of pikepdf.save options).
+    deterministic - /ID computed from the content instead of a random one.
+    Returns {"save_profile", "size", "save_time"}.
+    """
+    if isinstance(save_profile, dict):
+        options = save_profile
+        save_profile = "custom"
+    elif save_profile in SAVE_PROFILES:
+        options = SAVE_PROFILES[save_profile]
+    else:
+        raise ValueError(f"Unknown save profile: {save_profile!r}")
+    if deterministic:
+        options = dict(options, deterministic_id=True)
+    position = _stream_start(output_pdf)
+    target = output_pdf
+    if position is None and hasattr(output_pdf, "write"):
+        target = _CountingWriter(output_pdf)
+    start = time.perf_counter()
+    pdf.save(target, **options)
+    save_time = time.perf_counter() - start
+    if target is not output_pdf:
+        size = target.size
+    elif position is None:
+        size = os.path.getsize(output_pdf)
+    else:
+        # Streams may already hold data of the caller before the PDF
+        size = output_pdf.tell() - position
+    return {
+        "save_profile": save_profile,
+        "size": size,
+        "save_time": save_time,
+    }
+
 
+def find_pdfa_output_profile(pdf):
+    """ICC stream of an existing PDF/A OutputIntent with an RGB profile, None if there is none."""
+    intents = pdf.Root.get("/OutputIntents")
+    if not isinstance(intents, Array):
+        return None
+    for intent in intents:
+        if isinstance(intent, Dictionary) and intent.get("/S") == Name("/GTS_PDFA1"):
+            profile = intent.get("/DestOutputProfile")
+            if isinstance(profile, Stream) and profile.get("/N") == 3:
+                return profile
+    return None
+
+
+def preflight_pdf(pdf):
+    """
+    Fast check of what q2zugferd_pdf has to do with pdf.
+    Returns {"icc_ref": reusable PDF/A output profile or None,
+             "device_rgb": True if any DeviceRGB is used, "elapsed": seconds}.
+    The DeviceRGB scan stops at the first use found.
+    """
+    start = time.perf_counter()
+    icc_ref = find_pdfa_output_profile(pdf)
+    device_rgb = scan_for_device_rgb(pdf, limit=1)["count"] > 0
+    return {
+        "icc_ref": icc_ref,
+        "device_rgb": device_rgb,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def add_output_intent(pdf, icc_ref):
     # --- OutputIntent ---
     oid = Dictionary(
         Type=Name.OutputIntent,
@@ -327,36 +606,82 @@ def q2zugferd_pdf(input_pdf, xml_path, output_pdf, pdfa_level="B"):
     output_intent = Array([output_intent_ref])
 
     pdf.Root["/OutputIntents"] = output_intent
+    return output_intent_ref
 
-    # --- Fix DeviceRGB ---
+
+def fix_device_rgb(pdf, icc_ref, visited=None):
+    """
+    Replace DeviceRGB in the document and all pages, returns the rewritten count.
+    Objects are changed in place and only where something changes, page
+    dictionaries are only written to for pages without any resources.
+    """
+    if visited is None:
+        visited = set()
     if "/Resources" not in pdf.Root:
         pdf.Root["/Resources"] = Dictionary()
-    replace_device_rgb_recursive(pdf, pdf.Root["/Resources"], icc_ref)
+    rewritten = replace_device_rgb_recursive(pdf, pdf.Root["/Resources"], icc_ref, visited)
     for page in pdf.pages:
-        resources = page.get("/Resources", Dictionary())
-        replace_device_rgb_recursive(pdf, resources, icc_ref)
-        page["/Resources"] = resources
-        group = page.get("/Group")
-        if isinstance(group, Dictionary) and group.get("/S") == "/Transparency":
-            if group.get("/CS") == "/DeviceRGB":
-                group["/CS"] = icc_ref
-
-    # --- Embed XML (ZUGFeRD) ---
-    if isinstance(xml_path, (bytes, bytearray)):
-        xml_bytes = xml_path
-    elif os.path.isfile(xml_path):
-        with open(xml_path, "rb") as f:
-            xml_bytes = f.read()
-    else:
-        xml_bytes = xml_path.encode("utf-8")
-    xml_filename = "factur-x.xml"
+        resources = _page_resources(page)
+        if resources is None:
+            # DefaultRGB for the color operators of the content stream
+            page["/Resources"] = resources = Dictionary()
+        rewritten += replace_device_rgb_recursive(pdf, resources, icc_ref, visited)
+        rewritten += _replace_device_rgb_group(page, icc_ref)
+    return rewritten
+
+
+def _read_xml(xml):
+    """
+    XML bytes from bytes/bytearray/memoryview, a binary file-like object,
+    an os.PathLike, or a str: XML content if it starts with "<", else a file name.
+    """
+    if isinstance(xml, bytes):
+        return xml
+    if isinstance(xml, (bytearray, memoryview)):
+        return bytes(xml)
+    if hasattr(xml, "read"):
+        return xml.read()
+    if isinstance(xml, str) and xml.lstrip("\ufeff \t\r\n").startswith("<"):
+        return xml.encode("utf-8")
+    with open(xml, "rb") as f:
+        return f.read()
+
+
+def _open_input(input_pdf):
+    if isinstance(input_pdf, (bytes, bytearray, memoryview)):
+        # BytesIO shares the buffer of a bytes object until it is written to
+        return io.BytesIO(input_pdf)
+    return input_pdf
+
+
+def open_pdf(input_pdf, large=False):
+    """
+    Open input_pdf (see q2zugferd_pdf). With large=True stream data is read
+    from the file when it is written and inherited page attributes stay on
+    the page tree instead of being copied into every page dictionary.
+    """
+    if not large:
+        return pikepdf.open(_open_input(input_pdf))
+    # Not AccessMode.mmap: every mapped page read while saving stays resident,
+    # the peak RSS would grow with the input size
+    return pikepdf.open(
+        _open_input(input_pdf),
+        access_mode=pikepdf.AccessMode.stream,
+        inherit_page_attributes=False,
+    )
+
+
+def embed_zugferd_xml(
+    pdf, xml_bytes, creation_date, xml_filename="factur-x.xml", relationship="Alternative"
+):
+    """Embed the XML as associated file (/AF) and in the EmbeddedFiles name tree."""
     xml_mime = Name("/text/xml")
     ef_stream = pdf.make_stream(xml_bytes)
 
     ef_stream["/Type"] = Name.EmbeddedFile
     ef_stream["/Subtype"] = xml_mime
     ef_stream["/Params"] = Dictionary()
-    ef_stream["/Params"]["/CreationDate"] = info["/CreationDate"]
+    ef_stream["/Params"]["/CreationDate"] = creation_date
     ef_stream["/Params"]["/Size"] = ef_stream["/Length"]
 
     ef_stream_ref = pdf.make_indirect(ef_stream)
@@ -371,7 +696,7 @@ def q2zugferd_pdf(input_pdf, xml_path, output_pdf, pdfa_level="B"):
         F=xml_filename,
         UF=xml_filename,
     )
-    filespec["/AFRelationship"] = Name("/Alternative")
+    filespec["/AFRelationship"] = Name("/" + relationship)
     filespec["/Desc"] = "Invoice metadata: ZUGFeRD standard"
     filespec["/EF"] = files_dict_ref
 
@@ -385,9 +710,6 @@ def q2zugferd_pdf(input_pdf, xml_path, output_pdf, pdfa_level="B"):
     if "/Names" not in pdf.Root:
         pdf.Root["/Names"] = Dictionary()
 
-    if "/Names" not in pdf.Root:
-        pdf.Root.Names = Dictionary()
-
     # Теперь pdf.Root.Names.EmbeddedFiles будет указывать на 16 0 R
     pdf.Root.Names.EmbeddedFiles = ef_tree_ref
 
@@ -395,18 +717,314 @@ def q2zugferd_pdf(input_pdf, xml_path, output_pdf, pdfa_level="B"):
     if "/AF" not in pdf.Root:
         pdf.Root.AF = Array()
     pdf.Root.AF.append(filespec_ref)
+    return filespec_ref
+
 
-    xmp = get_zugferd_xmp(info=info)
+def set_zugferd_metadata(pdf, info, profile=None):
+    profile = get_profile(profile)
+    xmp = get_zugferd_xmp(
+        profile.version, profile.conformance_level, info, profile.xml_filename
+    )
     meta_stream = pdf.make_stream(xmp.encode("utf-8"))
     meta_stream["/Type"] = "/Metadata"
     meta_stream["/Subtype"] = "/XML"
     pdf.Root["/Metadata"] = pdf.make_indirect(meta_stream)
 
-    # --- Save ---
-    pdf.save(output_pdf, linearize=False, compress_streams=False)
-    pdf.close()
 
-    # --- Automatic check after saving ---
-    pdf_check = pikepdf.open(output_pdf)
-    scan_for_device_rgb(pdf_check)
-    pdf_check.close()
+_ISSUE_DATE = re.compile(
+    rb"IssueDateTime>\s*<(?:\w+:)?DateTimeString[^>]*>\s*(\d{8})"
+)
+
+
+def invoice_pdf_date(xml_bytes):
+    """Invoice date of ZUGFeRD XML as PDF date (D:YYYYMMDD000000Z), None if not found."""
+    match = _ISSUE_DATE.search(xml_bytes)
+    if match is None:
+        return None
+    return "D:" + match.group(1).decode("ascii") + "000000Z"
+
+
+def _readable_stream(output_pdf):
+    try:
+        return output_pdf.readable() and output_pdf.seekable()
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _verify_output(output_pdf, size, large=False):
+    """scan_for_device_rgb of a written PDF, a stream is left at the end of the PDF."""
+    if not hasattr(output_pdf, "write"):
+        with open_pdf(output_pdf, large) as pdf_check:
+            return scan_for_device_rgb(pdf_check)
+    end = output_pdf.tell()
+    source = output_pdf
+    if end == size:
+        output_pdf.seek(0)
+    else:
+        # Written after data of the caller
+        output_pdf.seek(end - size)
+        source = io.BytesIO(output_pdf.read(size))
+    try:
+        with open_pdf(source, large) as pdf_check:
+            return scan_for_device_rgb(pdf_check)
+    finally:
+        output_pdf.seek(end)
+
+
+def _save_output(
+    pdf, output_pdf, save_profile="fast", deterministic=False, verify=None, large=False
+):
+    """
+    Save stage and, with verify="after", verify stage of the written PDF.
+    A write-only output_pdf (pipe, socket, file opened with "wb") is checked
+    on an in-memory copy that is then written to it.
+    Returns (save_pdf report, scan_for_device_rgb result or None).
+    """
+    target = output_pdf
+    if verify == "after" and hasattr(output_pdf, "write") and not _readable_stream(output_pdf):
+        target = io.BytesIO()
+    with stage("save") as st:
+        report = save_pdf(pdf, target, save_profile, deterministic)
+        pdf.close()
+        if target is not output_pdf:
+            output_pdf.write(target.getbuffer())
+        if st:
+            st.add("bytes_written", report["size"])
+    verification = None
+    if verify == "after":
+        with stage("verify"):
+            verification = _verify_output(target, report["size"], large)
+    return report, verification
+
+
+VERIFY_MODES = (None, "before", "after")
+
+
+def _set_docinfo(info, xml_bytes, deterministic=False):
+    """
+    Document info of a ZUGFeRD PDF. deterministic - dates from the invoice date.
+    A missing CreationDate is set from the invoice date, else the current time.
+    """
+    info["/Creator"] = "q2zugferd"
+    info["/Author"] = "q2zugferd"
+    info["/Title"] = "Title"
+    info["/Subject"] = "Subject"
+    if "/Producer" not in info:
+        info["/Producer"] = "q2zugferd"
+    date = invoice_pdf_date(xml_bytes)
+    if deterministic:
+        date = date or info.get("/CreationDate")
+        if date is not None:
+            info["/CreationDate"] = info["/ModDate"] = date
+    if "/CreationDate" not in info:
+        info["/CreationDate"] = date or time.strftime("D:%Y%m%d%H%M%SZ", time.gmtime())
+
+
+def _finish_pdf(
+    pdf,
+    xml_bytes,
+    output_pdf=None,
+    profile=None,
+    save_profile="fast",
+    verify="after",
+    deterministic=False,
+    large=False,
+):
+    """
+    Embed, xmp, verify and save stages of a converted document (see q2zugferd_pdf).
+    Returns the report of save_pdf with "verification", "profile" and,
+    if output_pdf is None, the bytes under "pdf".
+    """
+    with stage("embed") as st:
+        profile = detect_profile(xml_bytes) if profile is None else get_profile(profile)
+        embed_zugferd_xml(
+            pdf,
+            xml_bytes,
+            pdf.docinfo["/CreationDate"],
+            profile.xml_filename,
+            profile.relationship,
+        )
+        if st:
+            st.add("xml_bytes", len(xml_bytes))
+
+    with stage("xmp"):
+        set_zugferd_metadata(pdf, pdf.docinfo, profile)
+
+    verification = None
+    if verify == "before":
+        with stage("verify"):
+            verification = scan_for_device_rgb(pdf)
+
+    buffer = None
+    if output_pdf is None:
+        buffer = output_pdf = io.BytesIO()
+    report, checked_after = _save_output(
+        pdf, output_pdf, save_profile, deterministic, verify, large
+    )
+    if verify == "after":
+        verification = checked_after
+    report["verification"] = verification
+    report["profile"] = profile.name
+    if buffer is not None:
+        report["pdf"] = buffer.getvalue()
+    return report
+
+
+def _pdf_cache_key(input_pdf, xml_bytes, icc_profile, options):
+    """(cache key, input_pdf); file-like inputs are read and returned as bytes."""
+    digest = _Digest("pdf")
+    if isinstance(input_pdf, (str, os.PathLike)):
+        digest.add_file(input_pdf)
+    else:
+        if hasattr(input_pdf, "read"):
+            input_pdf = input_pdf.read()
+        digest.add(input_pdf)
+    digest.add(xml_bytes)
+    if icc_profile is None:
+        icc_profile = get_icc_profile()[0]
+    elif not isinstance(icc_profile, (bytes, bytearray, memoryview)):
+        icc_profile = read_icc_profile(icc_profile)
+    digest.add(icc_profile)
+    # repr: save_profile may be a dict of pikepdf.save options with enum values
+    digest.add(repr(options))
+    return digest.hexdigest(), input_pdf
+
+
+def _from_cache(cache, key, output_pdf):
+    """Report of a cached result written to output_pdf, None on a miss."""
+    hit = cache.get(key)
+    if hit is None or hit.meta is None:
+        return None
+    report = dict(hit.meta, cached=True)
+    try:
+        if output_pdf is None:
+            with open(hit.path, "rb") as f:
+                report["pdf"] = f.read()
+        elif hasattr(output_pdf, "write"):
+            with open(hit.path, "rb") as f:
+                shutil.copyfileobj(f, output_pdf)
+        else:
+            shutil.copyfile(hit.path, output_pdf)
+    except FileNotFoundError:
+        # Evicted by another process after the lookup
+        return None
+    return report
+
+
+def _to_cache(cache, key, report, output_pdf):
+    meta = {name: value for name, value in report.items() if name != "pdf"}
+    if "pdf" in report:
+        cache.put(key, report["pdf"], meta)
+    elif hasattr(output_pdf, "getvalue"):
+        end = output_pdf.tell()
+        cache.put(key, output_pdf.getvalue()[end - report["size"] : end], meta)
+    elif isinstance(output_pdf, (str, os.PathLike)):
+        cache.put(key, output_pdf, meta)
+
+
+def q2zugferd_pdf(
+    input_pdf,
+    xml_path,
+    output_pdf=None,
+    pdfa_level="B",
+    icc_profile=None,
+    save_profile="fast",
+    verify="after",
+    preflight=True,
+    profile=None,
+    large=False,
+    deterministic=False,
+    cache=None,
+):
+    """
+    Embed ZUGFeRD XML into input_pdf and write a PDF/A-3 to output_pdf.
+    input_pdf - file name, bytes, memoryview or binary file-like object.
+    xml_path - XML as bytes, memoryview, binary file-like object or str
+               (content if it starts with "<", else a file name), or os.PathLike.
+    output_pdf - file name or binary file-like object,
+                 None returns the PDF bytes in report["pdf"].
+    save_profile - "fast", "compact", "web" (see SAVE_PROFILES).
+    verify - scan for remaining DeviceRGB: "after" reopens the saved output
+             (a copy of it for write-only streams),
+             "before" scans the document in memory before saving, None skips it.
+    preflight - reuse the profile of an existing PDF/A OutputIntent instead of
+                embedding icc_profile and skip the DeviceRGB rewrite if the
+                document does not use DeviceRGB (see preflight_pdf).
+    profile - conformance profile for the XMP metadata and the name of the
+              embedded XML, None detects it from the guideline ID of the XML.
+    large - bounded memory mode for very large inputs: stream data is read
+            from the input on demand (see open_pdf) and the output written
+            straight to output_pdf, which is required; the "web" save profile
+            (linearization) is not allowed.
+    deterministic - same input, same output bytes: the /ID is derived from
+                    the content and the document dates from the invoice date.
+    cache - ResultCache (see q2zugferd_cache) to return a stored result of
+            the same input PDF, XML and options instead of generating it.
+    Returns a report dict with the output size, save time,
+    the scan_for_device_rgb result under "verification", what
+    preflight decided under "preflight" (None without preflight) and
+    whether the result came from the cache under "cached".
+    Every step is reported as a stage to the hooks of q2zugferd_stats.
+    """
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode: {verify!r}")
+    if large and output_pdf is None:
+        raise ValueError("large=True writes to output_pdf, it cannot return the PDF bytes")
+    if large and save_profile == "web":
+        raise ValueError("large=True cannot linearize, use the fast or compact save profile")
+    xml_bytes = _read_xml(xml_path)
+
+    # --- Result cache ---
+    if cache is not None:
+        with stage("cache"):
+            options = [pdfa_level, save_profile, verify, preflight, profile, large, deterministic]
+            key, input_pdf = _pdf_cache_key(input_pdf, xml_bytes, icc_profile, options)
+            report = _from_cache(cache, key, output_pdf)
+        if report is not None:
+            return report
+
+    # --- Open PDF ---
+    with stage("open"):
+        pdf = open_pdf(input_pdf, large)
+        _set_docinfo(pdf.docinfo, xml_bytes, deterministic)
+
+    # --- Pre-flight ---
+    checked = None
+    if preflight:
+        with stage("preflight"):
+            checked = preflight_pdf(pdf)
+
+    # --- Load ICC profile ---
+    with stage("icc"):
+        icc_ref = checked and checked["icc_ref"]
+        reuse_icc = icc_ref is not None
+        if not reuse_icc:
+            icc_ref = make_icc_stream(pdf, icc_profile)
+            add_output_intent(pdf, icc_ref)
+
+    # --- Fix DeviceRGB ---
+    rewrite = checked is None or checked["device_rgb"]
+    if rewrite:
+        with stage("rewrite") as st:
+            visited = set()
+            rewritten = fix_device_rgb(pdf, icc_ref, visited)
+            if st:
+                st.add("pages", len(pdf.pages))
+                st.add("objects_visited", len(visited))
+                st.add("objects_rewritten", rewritten)
+
+    # --- Embed XML, save, automatic check ---
+    report = _finish_pdf(
+        pdf, xml_bytes, output_pdf, profile, save_profile, verify, deterministic, large
+    )
+    report["preflight"] = None
+    if checked is not None:
+        report["preflight"] = {
+            "icc_reused": reuse_icc,
+            "rewrite": rewrite,
+            "elapsed": checked["elapsed"],
+        }
+    report["cached"] = False
+    if cache is not None:
+        _to_cache(cache, key, report, output_pdf)
+    return report
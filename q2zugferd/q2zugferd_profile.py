@@ -0,0 +1,115 @@
+"""
+Conformance profiles.
+
+A profile names the guideline written into the XML context, the XMP
+metadata and file name of the embedded XML, and which parts of the
+invoice the XML carries. q2zugferd_xml compiles one emitter per profile
+that writes only those parts.
+
+    q2zugferd_xml(zugferd_data, profile="XRechnung")
+    register_profile(get_profile("EN16931")._replace(name="MYCIUS", guideline="urn:..."))
+"""
+
+import re
+from collections import namedtuple
+
+# name - registry key, case-insensitive
+# guideline - GuidelineSpecifiedDocumentContextParameter ID (BT-24)
+# conformance_level - fx:ConformanceLevel of the XMP metadata
+# xml_filename - name of the embedded XML
+# business_process - BusinessProcessSpecifiedDocumentContextParameter ID (BT-23) or None
+# version - fx:Version of the XMP metadata
+# relationship - /AFRelationship of the embedded XML
+# line_items - write the invoice lines
+# line_description - write the product description of the lines
+# header_details - addresses, delivery date, payment means and terms, VAT breakdown
+#                  and the full monetary summation (False: MINIMUM subset)
+Profile = namedtuple(
+    "Profile",
+    "name guideline conformance_level xml_filename business_process version relationship "
+    "line_items line_description header_details",
+    defaults=(None, "1.0", "Alternative", True, True, True),
+)
+
+MINIMUM = Profile(
+    "MINIMUM",
+    "urn:factur-x.eu:1p0:minimum",
+    "MINIMUM",
+    "factur-x.xml",
+    relationship="Data",
+    line_items=False,
+    line_description=False,
+    header_details=False,
+)
+BASIC = Profile(
+    "BASIC",
+    "urn:cen.eu:en16931:2017#compliant#urn:factur-x.eu:1p0:basic",
+    "BASIC",
+    "factur-x.xml",
+    line_description=False,
+)
+EN16931 = Profile("EN16931", "urn:cen.eu:en16931:2017", "EN 16931", "factur-x.xml")
+EXTENDED = Profile(
+    "EXTENDED",
+    "urn:cen.eu:en16931:2017#conformant#urn:factur-x.eu:1p0:extended",
+    "EXTENDED",
+    "factur-x.xml",
+)
+XRECHNUNG = Profile(
+    "XRechnung",
+    "urn:cen.eu:en16931:2017#compliant#urn:xeinkauf.de:kosit:xrechnung_3.0",
+    "XRECHNUNG",
+    "xrechnung.xml",
+    business_process="urn:fdc:peppol.eu:2017:poacc:billing:01:1.0",
+)
+
+DEFAULT_PROFILE = EN16931
+
+_profiles = {}
+
+
+def register_profile(profile):
+    """Add or replace a profile, found by get_profile under its name."""
+    if not isinstance(profile, Profile):
+        raise ValueError(f"Profile expected: {profile!r}")
+    _profiles[profile.name.upper()] = profile
+    return profile
+
+
+for _profile in (MINIMUM, BASIC, EN16931, EXTENDED, XRECHNUNG):
+    register_profile(_profile)
+
+
+def get_profile(profile=None):
+    """Profile for a name (case-insensitive) or a Profile, None is EN16931."""
+    if profile is None:
+        return DEFAULT_PROFILE
+    if isinstance(profile, Profile):
+        return profile
+    try:
+        return _profiles[str(profile).upper()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown profile: {profile!r}, one of {', '.join(p.name for p in profiles())}"
+        ) from None
+
+
+def profiles():
+    return list(_profiles.values())
+
+
+_GUIDELINE = re.compile(
+    rb"GuidelineSpecifiedDocumentContextParameter>\s*<(?:\w+:)?ID>\s*([^<\s]+)"
+)
+
+
+def detect_profile(xml_bytes, default=DEFAULT_PROFILE):
+    """Registered profile of the guideline ID of ZUGFeRD XML, default if unknown."""
+    # The context is the first element of the invoice
+    match = _GUIDELINE.search(bytes(xml_bytes[:4096]))
+    if match is not None:
+        guideline = match.group(1).decode("utf-8", "replace")
+        for profile in _profiles.values():
+            if profile.guideline == guideline:
+                return profile
+    return default
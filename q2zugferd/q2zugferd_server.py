@@ -0,0 +1,295 @@
+"""
+Long running service: warm workers behind a small HTTP/1.1 front end
+on localhost or a Unix socket.
+
+    q2zugferd serve --port 8765 --workers 4
+    q2zugferd serve --unix /run/q2zugferd.sock --processes
+
+Endpoints (request and response bodies):
+    POST /xml       zugferd_data JSON                      -> XML
+    POST /pdf       {"pdf": base64, "xml": str | "zugferd_data": {...},
+                     "options": {q2zugferd_pdf options}}   -> PDF
+    POST /extract   PDF                                    -> XML, 404 without invoice
+    GET  /health    -> JSON counters
+
+Query parameters totals=compute|check and profile=<name> apply to /xml and
+to /pdf with zugferd_data.
+A full queue answers 503 with Retry-After, a timed out request 504.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import stat
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pikepdf
+
+from .q2zugferd_async import AsyncZugferd
+from .q2zugferd_pdf import get_icc_profile, set_icc_profile
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+# q2zugferd_pdf options a client may set
+PDF_OPTIONS = ("pdfa_level", "save_profile", "verify", "preflight", "profile")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None, headers=None):
+        super().__init__(message or REASONS[status])
+        self.status = status
+        self.headers = headers or {}
+
+
+async def _read_request(reader, max_body):
+    """(method, target, headers, body) or None at the end of the connection."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", ""):
+        raise HTTPError(411)
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length") from None
+    if length < 0:
+        raise HTTPError(400, "Malformed Content-Length")
+    if length > max_body:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _response(
+    status, body=b"", content_type="text/plain; charset=utf-8", headers=None, keep_alive=True
+):
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _json_body(body):
+    try:
+        return json.loads(body)
+    except ValueError as error:
+        raise HTTPError(400, f"Invalid JSON: {error}") from None
+
+
+class ZugferdServer:
+    """
+    HTTP front end for an AsyncZugferd runner.
+
+    max_queue - requests accepted at the same time (running and waiting for
+                a worker); more are rejected with 503 right away.
+    timeout - seconds per request, 504 when exceeded.
+    """
+
+    def __init__(self, runner=None, max_queue=64, timeout=30, max_body=64 * 2**20):
+        self.runner = runner or AsyncZugferd()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_body = max_body
+        self.pending = 0
+        self.stats = {"requests": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self.started = time.time()
+        self._server = None
+
+    async def _xml(self, body, query):
+        zugferd_data = _json_body(body)
+        xml = await self.runner.xml(
+            zugferd_data, as_bytes=True, totals=query.get("totals"), profile=query.get("profile")
+        )
+        return 200, xml, "application/xml"
+
+    async def _pdf(self, body, query):
+        request = _json_body(body)
+        if not isinstance(request, dict) or "pdf" not in request:
+            raise HTTPError(400, 'Expected {"pdf": base64, "xml" or "zugferd_data": ...}')
+        try:
+            input_pdf = base64.b64decode(request["pdf"], validate=True)
+        except ValueError:
+            raise HTTPError(400, "pdf is not valid base64") from None
+        options = {
+            key: value
+            for key, value in (request.get("options") or {}).items()
+            if key in PDF_OPTIONS
+        }
+        if "zugferd_data" in request:
+            options["xml_options"] = {
+                "totals": query.get("totals"),
+                "profile": query.get("profile"),
+            }
+            report = await self.runner.xml_pdf(request["zugferd_data"], input_pdf, **options)
+        elif "xml" in request:
+            xml = request["xml"]
+            # XML content only, a str that is no XML would be opened as a file name
+            if not isinstance(xml, str) or not xml.lstrip("\ufeff \t\r\n").startswith("<"):
+                raise HTTPError(400, "xml must be the XML document as a string")
+            report = await self.runner.pdf(input_pdf, xml.encode("utf-8"), **options)
+        else:
+            raise HTTPError(400, "xml or zugferd_data required")
+        return 200, report["pdf"], "application/pdf"
+
+    async def _extract(self, body, query):
+        xml = await self.runner.extract(body)
+        if xml is None:
+            raise HTTPError(404, "No embedded invoice")
+        return 200, xml, "application/xml"
+
+    def _health(self):
+        data = dict(
+            self.stats,
+            pending=self.pending,
+            max_queue=self.max_queue,
+            uptime=round(time.time() - self.started, 1),
+        )
+        return 200, json.dumps(data).encode("utf-8"), "application/json"
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            return self._health()
+        handler = {"/xml": self._xml, "/pdf": self._pdf, "/extract": self._extract}.get(url.path)
+        if handler is None:
+            raise HTTPError(404)
+        if method != "POST":
+            raise HTTPError(405, headers={"Allow": "POST"})
+        if self.pending >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPError(503, "Queue full", {"Retry-After": "1"})
+        self.pending += 1
+        try:
+            # Covers the wait for a free worker as well as the work itself
+            return await asyncio.wait_for(handler(body, query), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HTTPError(504) from None
+        except (KeyError, TypeError, ValueError, pikepdf.PdfError) as error:
+            # Invalid invoice data, totals that do not add up (TotalsError) or a broken PDF
+            raise HTTPError(422, f"{type(error).__name__}: {error}") from None
+        finally:
+            self.pending -= 1
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await _read_request(reader, self.max_body)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    self.stats["requests"] += 1
+                    status, payload, content_type = await self.dispatch(method, target, body)
+                    extra = None
+                except HTTPError as error:
+                    status, payload = error.status, str(error).encode("utf-8")
+                    content_type, extra = "text/plain; charset=utf-8", error.headers
+                    if status in (400, 411, 413):
+                        keep_alive = False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as error:
+                    self.stats["errors"] += 1
+                    status, payload = 500, f"{type(error).__name__}: {error}".encode("utf-8")
+                    content_type, extra = "text/plain; charset=utf-8", None
+                writer.write(_response(status, payload, content_type, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, unix=None):
+        if unix is not None:
+            try:
+                mode = os.stat(unix).st_mode
+            except FileNotFoundError:
+                mode = None
+            if mode is not None:
+                # A stale socket of an earlier run, anything else is left alone
+                if not stat.S_ISSOCK(mode):
+                    raise ValueError(f"Not a socket, will not replace it: {unix}")
+                os.remove(unix)
+            self._server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port)
+        return self._server
+
+    async def serve_forever(self, host="127.0.0.1", port=8765, unix=None):
+        server = await self.start(host, port, unix)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.runner.close()
+
+
+def warm_up(icc_profile=None):
+    """Load and compress the ICC profile once, so the first request does not pay for it."""
+    set_icc_profile(icc_profile)
+    try:
+        get_icc_profile()
+    except OSError:
+        pass
+
+
+def run_server(
+    host="127.0.0.1",
+    port=8765,
+    unix=None,
+    workers=None,
+    processes=False,
+    max_queue=64,
+    timeout=30,
+    icc_profile=None,
+):
+    """Run the service until interrupted."""
+    warm_up(icc_profile)
+    runner = AsyncZugferd(workers, processes=processes, icc_profile=icc_profile)
+    # Worker processes start on demand, started and loaded before the first request
+    runner.warm_up()
+    server = ZugferdServer(runner, max_queue=max_queue, timeout=timeout)
+    try:
+        asyncio.run(server.serve_forever(host, port, unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.close()
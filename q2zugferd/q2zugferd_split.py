@@ -0,0 +1,194 @@
+"""
+Split one print-run PDF into many ZUGFeRD invoices.
+
+    jobs = [(range(0, 2), zugferd_data_1, "out/1.pdf"), (range(2, 5), xml_2, "out/2.pdf")]
+    for result in q2zugferd_split("cycle.pdf", jobs, max_workers=4):
+        ...
+
+The source is opened and its colors converted (ICC profile, DeviceRGB
+rewrite) once; every invoice then copies its pages, so shared fonts and
+images are neither parsed nor rewritten again.
+"""
+
+import os
+import tempfile
+import time
+import traceback
+
+import pikepdf
+
+from .q2zugferd_batch import BatchResult, _init_worker, _run_batch, _split_job
+from .q2zugferd_pdf import (
+    VERIFY_MODES,
+    _finish_pdf,
+    _read_xml,
+    _set_docinfo,
+    add_output_intent,
+    fix_device_rgb,
+    make_icc_stream,
+    open_pdf,
+    preflight_pdf,
+)
+from .q2zugferd_stats import stage
+from .q2zugferd_xml import q2zugferd_xml
+
+# Source of the worker process, see _init_split_worker
+_source = None
+
+
+def prepare_source(pdf, icc_profile=None, preflight=True):
+    """
+    Convert the colors of pdf once for all invoices cut from it: reuse or
+    embed the ICC profile as PDF/A OutputIntent and rewrite DeviceRGB.
+    Returns {"icc_reused", "rewrite", "objects_rewritten"}.
+    """
+    checked = None
+    if preflight:
+        with stage("preflight"):
+            checked = preflight_pdf(pdf)
+    with stage("icc"):
+        icc_ref = checked and checked["icc_ref"]
+        reuse_icc = icc_ref is not None
+        if not reuse_icc:
+            icc_ref = make_icc_stream(pdf, icc_profile)
+            add_output_intent(pdf, icc_ref)
+    if not pdf.Root.OutputIntents.is_indirect:
+        # Indirect, so every invoice can copy it with copy_foreign
+        pdf.Root.OutputIntents = pdf.make_indirect(pdf.Root.OutputIntents)
+    rewrite = checked is None or checked["device_rgb"]
+    rewritten = 0
+    if rewrite:
+        with stage("rewrite") as st:
+            rewritten = fix_device_rgb(pdf, icc_ref)
+            if st:
+                st.add("pages", len(pdf.pages))
+                st.add("objects_rewritten", rewritten)
+    return {"icc_reused": reuse_icc, "rewrite": rewrite, "objects_rewritten": rewritten}
+
+
+def _invoice_xml(invoice, xml_options):
+    """XML bytes of a job: zugferd_data / Invoice, or XML as q2zugferd_pdf accepts it."""
+    if hasattr(invoice, "keys"):
+        return q2zugferd_xml(invoice, as_bytes=True, **(xml_options or {}))
+    return _read_xml(invoice)
+
+
+def _write_invoice(
+    source,
+    pages,
+    invoice,
+    output_pdf,
+    xml_options=None,
+    save_profile="fast",
+    verify="after",
+    profile=None,
+    deterministic=False,
+):
+    """One invoice from the pages of the prepared source, returns its report."""
+    xml_bytes = _invoice_xml(invoice, xml_options)
+    with stage("split_pages") as st:
+        pdf = pikepdf.new()
+        pdf.pages.extend(source.pages[index] for index in pages)
+        # The OutputIntent and its ICC stream are copied once, the pages refer to them
+        pdf.Root.OutputIntents = pdf.copy_foreign(source.Root.OutputIntents)
+        if st:
+            st.add("pages", len(pdf.pages))
+
+    info = pdf.docinfo
+    for key, value in source.docinfo.items():
+        info[key] = pdf.copy_foreign(value) if value.is_indirect else value
+    _set_docinfo(info, xml_bytes, deterministic)
+    report = _finish_pdf(pdf, xml_bytes, output_pdf, profile, save_profile, verify, deterministic)
+    report["pages"] = len(pages)
+    return report
+
+
+def _invoice_job(index, job, source=None):
+    start = time.perf_counter()
+    output_pdf = None
+    try:
+        pages, invoice, output_pdf, options = job
+        report = _write_invoice(source or _source, pages, invoice, output_pdf, **options)
+    except Exception:
+        return BatchResult(
+            index, output_pdf, False, traceback.format_exc(), time.perf_counter() - start, None
+        )
+    return BatchResult(index, output_pdf, True, None, time.perf_counter() - start, report)
+
+
+def _init_split_worker(path, icc_profile):
+    # The converted source is opened once per worker process
+    global _source
+    _init_worker(icc_profile)
+    _source = pikepdf.open(path)
+
+
+def q2zugferd_split(
+    input_pdf,
+    jobs,
+    max_workers=1,
+    ordered=True,
+    icc_profile=None,
+    preflight=True,
+    xml_options=None,
+    save_profile="fast",
+    verify="after",
+    profile=None,
+    deterministic=False,
+):
+    """
+    Cut invoices out of one PDF.
+
+    input_pdf - file name, bytes or binary file-like object (see q2zugferd_pdf).
+    jobs - iterable of (pages, invoice, output_pdf) tuples or dicts with these keys:
+           pages - 0-based page indexes of input_pdf, e.g. range(4, 6),
+           invoice - zugferd_data or Invoice (rendered with xml_options),
+                     or XML as q2zugferd_pdf accepts it,
+           output_pdf - file name, binary file-like object (only with
+                        max_workers=1) or None for the bytes in result["pdf"].
+    max_workers - 1 writes the invoices in this process; more (None: one per
+                  CPU) use a process pool, every worker opens the converted
+                  source once.
+    icc_profile, preflight, save_profile, verify, profile, deterministic - see q2zugferd_pdf.
+
+    The colors are converted once for the whole source (see prepare_source).
+    Yields BatchResult(index, output_pdf, ok, error, elapsed, result) with the
+    report of each invoice as result; a failed invoice does not stop the others.
+    """
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode: {verify!r}")
+    options = {
+        "xml_options": xml_options,
+        "save_profile": save_profile,
+        "verify": verify,
+        "profile": profile,
+        "deterministic": deterministic,
+    }
+    jobs = (_split_job(job, ("pages", "invoice", "output_pdf"))[0] + [options] for job in jobs)
+    with stage("open"):
+        source = open_pdf(input_pdf)
+    try:
+        prepare_source(source, icc_profile, preflight)
+        if max_workers == 1:
+            for index, job in enumerate(jobs):
+                yield _invoice_job(index, job, source)
+            return
+        # Workers open the converted source instead of converting it again
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            with stage("split_source"):
+                source.save(path)
+            source.close()
+            yield from _run_batch(
+                _invoice_job,
+                jobs,
+                max_workers,
+                ordered,
+                _init_split_worker,
+                (path, icc_profile),
+            )
+        finally:
+            os.remove(path)
+    finally:
+        source.close()
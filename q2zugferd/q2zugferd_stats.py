@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Registered hooks: callables hook(stage, duration, counters)
+_hooks = []
+
+
+class _NullStage:
+    """Returned by stage() when no hook is registered: does nothing, is falsy."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def add(self, name, value=1):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "counters", "_start")
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self._start
+        for hook in list(_hooks):
+            hook(self.name, duration, self.counters)
+        return False
+
+    def __bool__(self):
+        return True
+
+    def add(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+def stage(name):
+    """
+    Context manager timing one processing stage and reporting it to the hooks.
+    Costs a single check when no hook is registered; the returned object is
+    falsy then, so counters can be skipped with "if st: st.add(...)".
+    """
+    if not _hooks:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def add_stage_hook(hook):
+    """Register hook(stage, duration, counters), called after every stage."""
+    _hooks.append(hook)
+    return hook
+
+
+def remove_stage_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@contextmanager
+def stage_hook(hook):
+    """Register hook for the duration of a with block."""
+    add_stage_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_stage_hook(hook)
+
+
+class StageCollector:
+    """
+    Built-in hook aggregating durations per stage into histograms.
+
+        collector = StageCollector()
+        with stage_hook(collector):
+            q2zugferd_pdf(...)
+        collector.export()
+    """
+
+    # upper bounds in seconds: 0.1 ms .. ~100 s, doubling
+    BUCKETS = tuple(0.0001 * 2**i for i in range(21))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def __call__(self, name, duration, counters):
+        with self._lock:
+            data = self._stages.get(name)
+            if data is None:
+                data = self._stages[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": math.inf,
+                    "max": 0.0,
+                    "buckets": [0] * (len(self.BUCKETS) + 1),
+                    "counters": {},
+                }
+            data["count"] += 1
+            data["total"] += duration
+            data["min"] = min(data["min"], duration)
+            data["max"] = max(data["max"], duration)
+            index = 0
+            while index < len(self.BUCKETS) and duration > self.BUCKETS[index]:
+                index += 1
+            data["buckets"][index] += 1
+            for key, value in counters.items():
+                data["counters"][key] = data["counters"].get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def export(self):
+        """
+        {stage: {"count", "total", "mean", "min", "max", "counters",
+                 "histogram": [(upper_bound_seconds, cumulative_count), ...]}}
+        The last histogram bound is math.inf.
+        """
+        result = {}
+        bounds = self.BUCKETS + (math.inf,)
+        with self._lock:
+            for name, data in self._stages.items():
+                cumulative = 0
+                histogram = []
+                for bound, count in zip(bounds, data["buckets"]):
+                    cumulative += count
+                    histogram.append((bound, cumulative))
+                result[name] = {
+                    "count": data["count"],
+                    "total": data["total"],
+                    "mean": data["total"] / data["count"],
+                    "min": data["min"],
+                    "max": data["max"],
+                    "counters": dict(data["counters"]),
+                    "histogram": histogram,
+                }
+        return result
@@ -0,0 +1,166 @@
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+_CENT = Decimal("0.01")
+
+TotalsDifference = namedtuple("TotalsDifference", "field supplied computed")
+
+
+class TotalsError(ValueError):
+    """Caller supplied totals differ from the computed ones, see .differences."""
+
+    def __init__(self, differences):
+        self.differences = differences
+        super().__init__(
+            "; ".join(f"{d.field}: supplied {d.supplied}, computed {d.computed}" for d in differences)
+        )
+
+
+def round_amount(value):
+    """EN16931 amounts: 2 decimals, rounded half up."""
+    return Decimal(value).quantize(_CENT, ROUND_HALF_UP)
+
+
+def _rate(vat_rate):
+    return Decimal(vat_rate).quantize(_CENT)
+
+
+class TotalsAccumulator:
+    """
+    Single pass totals engine.
+
+    Every added line contributes its net amount (quantity * net price,
+    rounded to cents) to the group of its VAT category and rate.
+    The VAT of each group is computed once from the group basis (BR-CO-17),
+    the header sums from the group values.
+    With check=True caller supplied line totals are compared and collected
+    in .differences instead of being replaced.
+    """
+
+    def __init__(self, check=False):
+        self.check = check
+        self.line_count = 0
+        self.line_total = Decimal(0)
+        # (category, rate) -> basis amount, in order of first appearance
+        self.groups = {}
+        self.differences = []
+
+    def add(self, quantity, net_price, vat_rate, vat_category="S", net_total=None, line_id=None):
+        """Add one line, returns its computed net amount."""
+        amount = round_amount(Decimal(quantity) * Decimal(net_price))
+        self.line_count += 1
+        if self.check and net_total is not None and round_amount(net_total) != amount:
+            self.differences.append(
+                TotalsDifference(f"line {line_id or self.line_count} net_total", net_total, str(amount))
+            )
+        key = (vat_category or "S", _rate(vat_rate))
+        self.groups[key] = self.groups.get(key, 0) + amount
+        self.line_total += amount
+        return amount
+
+    def add_line(self, line):
+        """Add a line dict of zugferd_data["invoice_lines"]."""
+        return self.add(
+            line["quantity"],
+            line["net_price"],
+            line["vat_rate"],
+            line.get("vat_category", "S"),
+            line.get("net_line_total", line.get("net_total")),
+            line.get("line_number"),
+        )
+
+    def add_values(self, values):
+        """
+        Add formatted line values (see q2zugferd_xml._line_values),
+        returns them with the computed line total unless checking.
+        """
+        amount = self.add(values[5], values[3], values[6], values[8], values[7], values[0])
+        if self.check:
+            return values
+        return values[:7] + ("{:.2f}".format(amount),) + values[8:]
+
+    def vat_breakdown(self):
+        breakdown = []
+        for (category, rate), basis in self.groups.items():
+            breakdown.append(
+                {
+                    "vat_category": category,
+                    "vat_rate": str(rate),
+                    "tax_base_amount": "{:.2f}".format(basis),
+                    "tax_amount": "{:.2f}".format(round_amount(basis * rate / 100)),
+                }
+            )
+        return breakdown
+
+    def totals(self):
+        """Header monetary summation and VAT breakdown as strings."""
+        breakdown = self.vat_breakdown()
+        tax_total = sum((Decimal(item["tax_amount"]) for item in breakdown), Decimal(0))
+        grand_total = self.line_total + tax_total
+        return {
+            "net_amount": "{:.2f}".format(self.line_total),
+            "tax_basis_total": "{:.2f}".format(self.line_total),
+            "tax_total": "{:.2f}".format(tax_total),
+            "grand_total": "{:.2f}".format(grand_total),
+            "due_payable": "{:.2f}".format(grand_total),
+            "vat_breakdown": breakdown,
+        }
+
+    def compare(self, invoice_header, vat_breakdown):
+        """Differences between supplied header totals/VAT breakdown and the computed ones."""
+        differences = list(self.differences)
+        computed = self.totals()
+        net_amount = invoice_header.get("net_amount")
+        if net_amount is None or round_amount(net_amount) != Decimal(computed["net_amount"]):
+            differences.append(TotalsDifference("net_amount", net_amount, computed["net_amount"]))
+        supplied = {
+            (item.get("vat_category", "S"), _rate(item["vat_rate"])): item for item in vat_breakdown
+        }
+        for item in computed["vat_breakdown"]:
+            key = (item["vat_category"], Decimal(item["vat_rate"]))
+            name = f"vat_breakdown {item['vat_category']} {item['vat_rate']}"
+            given = supplied.pop(key, None)
+            if given is None:
+                differences.append(TotalsDifference(name, None, item["tax_base_amount"]))
+                continue
+            for field in ("tax_base_amount", "tax_amount"):
+                if round_amount(given[field]) != Decimal(item[field]):
+                    differences.append(
+                        TotalsDifference(f"{name} {field}", given[field], item[field])
+                    )
+        for category, rate in supplied:
+            differences.append(TotalsDifference(f"vat_breakdown {category} {rate}", "present", None))
+        return differences
+
+    def apply(self, invoice_header, vat_breakdown):
+        """
+        Header and VAT breakdown to write: the computed ones, or with check=True
+        the supplied ones after raising TotalsError on any difference.
+        """
+        if self.check:
+            differences = self.compare(invoice_header, vat_breakdown)
+            if differences:
+                raise TotalsError(differences)
+            return invoice_header, vat_breakdown
+        computed = self.totals()
+        header = dict(invoice_header, net_amount=computed["net_amount"])
+        # Supplied header totals of an invoice without VAT breakdown (see q2zugferd_parse)
+        header.pop("tax_total", None)
+        header.pop("grand_total", None)
+        return header, computed["vat_breakdown"]
+
+
+def compute_totals(invoice_lines):
+    """Totals of an iterable of line dicts, see TotalsAccumulator.totals."""
+    accumulator = TotalsAccumulator()
+    for line in invoice_lines:
+        accumulator.add_line(line)
+    return accumulator.totals()
+
+
+def check_totals(zugferd_data):
+    """List of TotalsDifference between the supplied and the computed totals."""
+    accumulator = TotalsAccumulator(check=True)
+    for line in zugferd_data["invoice_lines"]:
+        accumulator.add_line(line)
+    return accumulator.compare(zugferd_data["invoice_header"], zugferd_data["vat_breakdown"])
@@ -0,0 +1,171 @@
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from lxml import etree as ET
+
+from .q2zugferd_parse import _source
+
+SVRL = "{http://purl.oclc.org/dsdl/svrl}"
+
+ValidationIssue = namedtuple("ValidationIssue", "source rule path message line")
+ValidationResult = namedtuple("ValidationResult", "index ok issues error elapsed")
+
+_schemas = {"xsd": None, "schematron": None}
+# Compiled validators, one per file and thread: XMLSchema keeps the errors
+# of the last run in its error_log. They are freed with their thread.
+_local = threading.local()
+# Bumped by clear_schema_cache, older caches of other threads are dropped on use
+_generation = 0
+
+
+def set_schemas(xsd=None, schematron=None):
+    """
+    Set the XSD and the Schematron XSLT used by validate().
+    The schema files are not shipped with q2zugferd, there is no default:
+    None unsets a schema, False disables that step.
+    """
+    _schemas["xsd"] = xsd
+    _schemas["schematron"] = schematron
+
+
+def _schema_path(kind, path):
+    if path is None:
+        path = _schemas[kind]
+    return path or None
+
+
+def _schema_paths(xsd, schematron):
+    xsd = _schema_path("xsd", xsd)
+    schematron = _schema_path("schematron", schematron)
+    if not xsd and not schematron:
+        raise ValueError(
+            "No schema to validate against: the schema files are not shipped with "
+            "q2zugferd, pass xsd/schematron or call set_schemas()"
+        )
+    return xsd, schematron
+
+
+def _thread_cache():
+    """Compiled validators of the current thread."""
+    cache = getattr(_local, "compiled", None)
+    if cache is None or _local.generation != _generation:
+        cache = _local.compiled = {}
+        _local.generation = _generation
+    return cache
+
+
+def _compile(kind, path):
+    cache = _thread_cache()
+    key = (kind, str(path))
+    validator = cache.get(key)
+    if validator is None:
+        # Parsed from the file, so relative xsd:import/include resolve
+        document = ET.parse(str(path))
+        if kind == "xsd":
+            validator = ET.XMLSchema(document)
+        else:
+            validator = ET.XSLT(document)
+        cache[key] = validator
+    return validator
+
+
+def clear_schema_cache():
+    global _generation
+    _generation += 1
+
+
+def _document(xml):
+    if isinstance(xml, ET._ElementTree):
+        return xml
+    if isinstance(xml, ET._Element):
+        return xml.getroottree()
+    return ET.parse(_source(xml))
+
+
+def _xsd_issues(schema, document):
+    if schema.validate(document):
+        return []
+    return [
+        ValidationIssue("xsd", error.type_name, error.path, error.message, error.line)
+        for error in schema.error_log
+    ]
+
+
+def _schematron_issues(transform, document):
+    report = transform(document)
+    issues = []
+    for failed in report.getroot().iter(SVRL + "failed-assert", SVRL + "successful-report"):
+        flag = failed.get("flag") or failed.get("role") or "error"
+        if failed.tag == SVRL + "successful-report" and flag not in ("error", "fatal"):
+            continue
+        issues.append(
+            ValidationIssue(
+                "schematron",
+                failed.get("id") or failed.get("test"),
+                failed.get("location"),
+                " ".join(failed.findtext(SVRL + "text", "").split()),
+                None,
+            )
+        )
+    return issues
+
+
+def validate(xml, xsd=None, schematron=None):
+    """
+    Validate ZUGFeRD XML against the XSD and the Schematron rules.
+    xml - bytes, str, file name, binary file-like object or lxml element/tree.
+    xsd, schematron - schema files instead of the ones of set_schemas(),
+                      False skips that step.
+    Returns a list of ValidationIssue(source, rule, path, message, line),
+    empty if the document is valid. Raises ValueError if no schema is set.
+    """
+    xsd, schematron = _schema_paths(xsd, schematron)
+    document = _document(xml)
+    issues = []
+    if xsd:
+        issues.extend(_xsd_issues(_compile("xsd", xsd), document))
+    if schematron:
+        issues.extend(_schematron_issues(_compile("schematron", schematron), document))
+    return issues
+
+
+def is_valid(xml, xsd=None, schematron=None):
+    return not validate(xml, xsd, schematron)
+
+
+def _init_validate_worker(xsd, schematron):
+    # Compile once per worker process
+    set_schemas(xsd, schematron)
+    for kind, path in (("xsd", xsd), ("schematron", schematron)):
+        path = _schema_path(kind, path)
+        if path:
+            _compile(kind, path)
+
+
+def _validate_job(index, xml):
+    start = time.perf_counter()
+    try:
+        issues = validate(xml)
+    except Exception:
+        return ValidationResult(
+            index, False, None, traceback.format_exc(), time.perf_counter() - start
+        )
+    return ValidationResult(index, not issues, issues, None, time.perf_counter() - start)
+
+
+def validate_batch(xmls, xsd=None, schematron=None, max_workers=None, ordered=True):
+    """
+    Validate many XML documents (bytes, str or file names) using a process pool,
+    the schemas are compiled once per worker.
+    Yields ValidationResult(index, ok, issues, error, elapsed).
+    """
+    # Imported here, the batch module loads pikepdf
+    from .q2zugferd_batch import _run_batch
+
+    # Resolved here, workers do not see set_schemas() of this process
+    xsd, schematron = _schema_paths(xsd, schematron)
+    return _run_batch(
+        _validate_job, xmls, max_workers, ordered, _init_validate_worker, (xsd, schematron)
+    )
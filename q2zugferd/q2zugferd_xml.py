@@ -1,7 +1,15 @@
 from lxml import etree as ET
-from decimal import Decimal
+from collections import namedtuple
+from copy import deepcopy
+from decimal import ROUND_HALF_UP, Decimal
 import re
 
+from .q2zugferd_cache import cache_key
+from .q2zugferd_model import Line
+from .q2zugferd_profile import get_profile
+from .q2zugferd_stats import stage
+from .q2zugferd_totals import TotalsAccumulator, round_amount
+
 NS_MAP = {
     "rsm": "urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100",
     "qdt": "urn:un:unece:uncefact:data:standard:QualifiedDataType:100",
@@ -15,38 +23,34 @@ RSM = "{%s}" % NS_MAP["rsm"]
 UDT = "{%s}" % NS_MAP["udt"]
 
 
-def q2zugferd_xml(zugferd_data: dict):
-    invoice_header = zugferd_data["invoice_header"]
-    seller = zugferd_data["seller"]
-    buyer = zugferd_data["buyer"]
-    currency = zugferd_data["currency"]
-    seller_bank_account = zugferd_data["seller_bank_account"]
-    invoice_lines = zugferd_data["invoice_lines"]
-    vat_breakdown = zugferd_data["vat_breakdown"]
+def _add_text_element(parent, tag_name, text_value):
+    if text_value is not None and str(text_value).strip() != "":
+        elem = ET.SubElement(parent, tag_name)
+        elem.text = str(text_value)
+        return elem
 
-    def _add_text_element(parent, tag_name, text_value):
-        if text_value is not None and str(text_value).strip() != "":
-            elem = ET.SubElement(parent, tag_name)
-            elem.text = str(text_value)
-            return elem
-
-    root = ET.Element(RSM + "CrossIndustryInvoice", nsmap=NS_MAP)
 
+def _add_context(root, profile=None):
     # 1. CONTEXT
+    profile = get_profile(profile)
     context = ET.SubElement(root, RSM + "ExchangedDocumentContext")
-    # bus_proc = ET.SubElement(
-    #     context, RAM + "BusinessProcessSpecifiedDocumentContextParameter"
-    # )
-    # _add_text_element(bus_proc, RAM + "ID", "urn:factur-x.eu:1p0:comfort")
+    if profile.business_process:
+        bus_proc = ET.SubElement(
+            context, RAM + "BusinessProcessSpecifiedDocumentContextParameter"
+        )
+        _add_text_element(bus_proc, RAM + "ID", profile.business_process)
     spec_doc = ET.SubElement(
         context, RAM + "GuidelineSpecifiedDocumentContextParameter"
     )
     _add_text_element(
         spec_doc,
         RAM + "ID",
-        "urn:cen.eu:en16931:2017",
+        profile.guideline,
     )
+    return context
 
+
+def _add_document(root, invoice_header):
     # 2. DOCUMENT HEADER
     doc = ET.SubElement(root, RSM + "ExchangedDocument")
     _add_text_element(doc, RAM + "ID", invoice_header["invoice_number"])
@@ -62,88 +66,240 @@ def q2zugferd_xml(zugferd_data: dict):
     #         ET.SubElement(note, RAM + "Content").text = invoice_header[note_key]
 
     # _add_text_element(doc, RAM + "LanguageID", "deu")
+    return doc
+
+
+def _line_values(line):
+    """Formatted values of one line item, shared by the tree and stream writers."""
+    if type(line) is Line:
+        # Validated and normalised when the Line was created
+        return line.values()
+    unit_code = line.get("unit_code", "PCE")
+    line_total = line.get("net_line_total", line.get("net_total"))
+    return (
+        line["line_number"],
+        line["name"],
+        line["description"],
+        "{:.4f}".format(Decimal(line["net_price"])),
+        unit_code,
+        "{:.4f}".format(Decimal(line["quantity"])),
+        "{:.2f}".format(Decimal(line["vat_rate"])),
+        None if line_total is None else "{:.2f}".format(round_amount(line_total)),
+        line.get("vat_category", "S"),
+    )
 
-    # 3. TRANSACTION (СТРОГИЙ ПОРЯДОК: Lines -> Agreement -> Delivery -> Settlement)
-    transaction = ET.SubElement(root, RSM + "SupplyChainTradeTransaction")
 
-    # --- LINE ITEMS ---
-    for line in invoice_lines:
-        line_item = ET.SubElement(transaction, RAM + "IncludedSupplyChainTradeLineItem")
+_QUANTUM_2 = Decimal("0.01")
+_QUANTUM_4 = Decimal("0.0001")
+
+
+def _scalar(value):
+    """
+    Python value of a column element: floats (also NumPy ones) as their
+    shortest str, so 2.675 stays 2.675 and not 2.67499999..., other NumPy
+    scalars unwrapped.
+    """
+    if hasattr(value, "dtype"):
+        return str(value) if value.dtype.kind == "f" else value.item()
+    return str(value) if isinstance(value, float) else value
+
+
+def _column_values(values):
+    """Plain list from a column: NumPy array, sequence or a single scalar."""
+    if hasattr(values, "dtype"):
+        # float arrays through their shortest str, see _scalar
+        if values.dtype.kind == "f":
+            values = values.astype(str)
+        return values.tolist()
+    return [_scalar(v) for v in values]
+
+
+def _fixed_point_column(values, places):
+    """
+    Formatted values of a NumPy int/float array by integer scaling of the
+    whole column, None for the positions that are no exact decimal with at
+    most places decimals (the float is not the nearest one of such a decimal).
+    """
+    import numpy as np
+
+    scale = 10**places
+    if values.dtype.kind in "iu":
+        if values.size and np.abs(values).max() >= 2**63 // scale:
+            return [None] * values.size, [False] * values.size
+        scaled = values.astype(np.int64) * scale
+        exact = None
+    else:
+        values = values.astype(np.float64)
+        scaled = np.rint(values * scale)
+        # Below 2**51 / scale two decimals of `places` decimals are more than
+        # an ulp apart, so the scaled integer is the decimal the float stands for
+        exact = (np.abs(values) < 2**51 / scale) & (scaled / scale == values)
+        negative = np.signbit(scaled)
+        scaled = np.where(exact, scaled, 0).astype(np.int64)
+    whole, fraction = np.divmod(np.abs(scaled), scale)
+    text = np.char.add(
+        np.char.add(whole.astype(str), "."), np.char.zfill(fraction.astype(str), places)
+    )
+    if exact is None:
+        return np.where(scaled < 0, np.char.add("-", text), text).tolist(), None
+    return np.where(negative, np.char.add("-", text), text).tolist(), exact.tolist()
+
+
+def _format_column(values, quantum, rounding=None):
+    """
+    Quantize a column with exact decimal semantics (same result as "{:.Nf}",
+    or as round_amount with rounding=ROUND_HALF_UP).
+    NumPy int and float arrays are formatted in bulk by integer scaling,
+    values that are no exact decimal fall back to Decimal one by one.
+    """
+    if hasattr(values, "dtype") and values.dtype.kind in "iuf":
+        text, exact = _fixed_point_column(values, -quantum.as_tuple().exponent)
+        if exact is not None and not all(exact):
+            for index, value in enumerate(values):
+                if not exact[index]:
+                    text[index] = str(Decimal(_scalar(value)).quantize(quantum, rounding))
+        return text
+    return [str(Decimal(value).quantize(quantum, rounding)) for value in _column_values(values)]
+
+
+def _columnar_line_values(columns):
+    """
+    Line values from a columnar table: dict of per-field sequences or NumPy arrays
+    (quantity, net_price, vat_rate, name, optional net_total, line_number,
+    description, unit_code and vat_category - a sequence or one code for all lines).
+    """
+    quantity = _format_column(columns["quantity"], _QUANTUM_4)
+    count = len(quantity)
+    net_total = columns.get("net_line_total", columns.get("net_total"))
+
+    def code_column(name, default):
+        codes = columns.get(name, default)
+        if isinstance(codes, str):
+            return [codes] * count
+        return _column_values(codes)
+
+    description = columns.get("description")
+    return zip(
+        _column_values(columns.get("line_number", range(1, count + 1))),
+        _column_values(columns["name"]),
+        [None] * count if description is None else _column_values(description),
+        _format_column(columns["net_price"], _QUANTUM_4),
+        code_column("unit_code", "PCE"),
+        quantity,
+        _format_column(columns["vat_rate"], _QUANTUM_2),
+        (
+            [None] * count
+            if net_total is None
+            else _format_column(net_total, _QUANTUM_2, ROUND_HALF_UP)
+        ),
+        code_column("vat_category", "S"),
+    )
 
-        doc_line = ET.SubElement(line_item, RAM + "AssociatedDocumentLineDocument")
-        _add_text_element(doc_line, RAM + "LineID", line["line_number"])
 
-        product = ET.SubElement(line_item, RAM + "SpecifiedTradeProduct")
-        _add_text_element(product, RAM + "Name", line["name"])
-        _add_text_element(product, RAM + "Description", line["description"])
+def _iter_line_values(invoice_lines):
+    if isinstance(invoice_lines, dict):
+        return _columnar_line_values(invoice_lines)
+    return map(_line_values, invoice_lines)
+
+
+def _add_line_item(transaction, values):
+    (
+        line_number,
+        name,
+        description,
+        net_price_amount,
+        unit_code,
+        quantity,
+        vat_rate,
+        line_total,
+        vat_category,
+    ) = values
+    line_item = ET.SubElement(transaction, RAM + "IncludedSupplyChainTradeLineItem")
+
+    doc_line = ET.SubElement(line_item, RAM + "AssociatedDocumentLineDocument")
+    _add_text_element(doc_line, RAM + "LineID", line_number)
+
+    product = ET.SubElement(line_item, RAM + "SpecifiedTradeProduct")
+    _add_text_element(product, RAM + "Name", name)
+    _add_text_element(product, RAM + "Description", description)
+
+    trade_agreement = ET.SubElement(line_item, RAM + "SpecifiedLineTradeAgreement")
+    net_price = ET.SubElement(trade_agreement, RAM + "NetPriceProductTradePrice")
+    _add_text_element(net_price, RAM + "ChargeAmount", net_price_amount)
+    ET.SubElement(
+        net_price,
+        RAM + "BasisQuantity",
+        unitCode=unit_code,
+    ).text = "{:.4f}".format(Decimal(1))
 
-        trade_agreement = ET.SubElement(line_item, RAM + "SpecifiedLineTradeAgreement")
-        net_price = ET.SubElement(trade_agreement, RAM + "NetPriceProductTradePrice")
-        _add_text_element(
-            net_price, RAM + "ChargeAmount", "{:.4f}".format(Decimal(line["net_price"]))
-        )
-        ET.SubElement(
-            net_price,
-            RAM + "BasisQuantity",
-            unitCode=line.get("unit_code", "PCE"),
-        ).text = "{:.4f}".format(Decimal(1))
+    trade_delivery = ET.SubElement(line_item, RAM + "SpecifiedLineTradeDelivery")
+    ET.SubElement(
+        trade_delivery,
+        RAM + "BilledQuantity",
+        unitCode=unit_code,
+    ).text = quantity
 
-        trade_delivery = ET.SubElement(line_item, RAM + "SpecifiedLineTradeDelivery")
-        ET.SubElement(
-            trade_delivery,
-            RAM + "BilledQuantity",
-            unitCode=line.get("unit_code", "PCE"),
-        ).text = "{:.4f}".format(Decimal(line["quantity"]))
+    trade_settlement = ET.SubElement(
+        line_item, RAM + "SpecifiedLineTradeSettlement"
+    )
+    tax = ET.SubElement(trade_settlement, RAM + "ApplicableTradeTax")
+    _add_text_element(tax, RAM + "TypeCode", "VAT")
+    _add_text_element(tax, RAM + "CategoryCode", vat_category)
+    _add_text_element(tax, RAM + "RateApplicablePercent", vat_rate)
 
-        trade_settlement = ET.SubElement(
-            line_item, RAM + "SpecifiedLineTradeSettlement"
-        )
-        tax = ET.SubElement(trade_settlement, RAM + "ApplicableTradeTax")
-        _add_text_element(tax, RAM + "TypeCode", "VAT")
-        _add_text_element(tax, RAM + "CategoryCode", "S")
-        _add_text_element(
-            tax,
-            RAM + "RateApplicablePercent",
-            "{:.2f}".format(Decimal(line["vat_rate"])),
-        )
+    monetary_sum = ET.SubElement(
+        trade_settlement, RAM + "SpecifiedTradeSettlementLineMonetarySummation"
+    )
+    _add_text_element(monetary_sum, RAM + "LineTotalAmount", line_total)
+    return line_item
 
-        monetary_sum = ET.SubElement(
-            trade_settlement, RAM + "SpecifiedTradeSettlementLineMonetarySummation"
-        )
-        _add_text_element(
-            monetary_sum,
-            RAM + "LineTotalAmount",
-            "{:.2f}".format(Decimal(line.get("net_line_total", line["net_total"]))),
-        )
 
-    # --- AGREEMENT ---
-    agreement = ET.SubElement(transaction, RAM + "ApplicableHeaderTradeAgreement")
-    _add_text_element(agreement, RAM + "BuyerReference", buyer["part_id"])
+def _add_seller_party(agreement, seller, details=True):
     seller_party = ET.SubElement(agreement, RAM + "SellerTradeParty")
     _add_text_element(seller_party, RAM + "Name", seller["name"])
 
     seller_addr = ET.SubElement(seller_party, RAM + "PostalTradeAddress")
-    _add_text_element(seller_addr, RAM + "PostcodeCode", seller["postal_code"])
-    _add_text_element(seller_addr, RAM + "LineOne", seller["street"])
-    _add_text_element(seller_addr, RAM + "CityName", seller["city"])
+    if details:
+        _add_text_element(seller_addr, RAM + "PostcodeCode", seller.get("postal_code"))
+        _add_text_element(seller_addr, RAM + "LineOne", seller.get("street"))
+        _add_text_element(seller_addr, RAM + "CityName", seller.get("city"))
     _add_text_element(seller_addr, RAM + "CountryID", seller["country_code"])
 
     if seller.get("vat_id"):
         tax_reg = ET.SubElement(seller_party, RAM + "SpecifiedTaxRegistration")
         tax_id_elem = ET.SubElement(tax_reg, RAM + "ID", schemeID="VA")
         tax_id_elem.text = seller["vat_id"]
+    return seller_party
+
+
+def _add_agreement(transaction, seller, buyer, seller_party=None, details=True):
+    # --- AGREEMENT ---
+    agreement = ET.SubElement(transaction, RAM + "ApplicableHeaderTradeAgreement")
+    _add_text_element(agreement, RAM + "BuyerReference", buyer.get("part_id"))
+    if seller_party is None:
+        _add_seller_party(agreement, seller, details)
+    else:
+        agreement.append(deepcopy(seller_party))
 
     buyer_party = ET.SubElement(agreement, RAM + "BuyerTradeParty")
-    _add_text_element(buyer_party, RAM + "ID", buyer["part_id"])
+    if not details:
+        _add_text_element(buyer_party, RAM + "Name", buyer["name"])
+        return agreement
+    _add_text_element(buyer_party, RAM + "ID", buyer.get("part_id"))
     _add_text_element(buyer_party, RAM + "Name", buyer["name"])
     buyer_addr = ET.SubElement(buyer_party, RAM + "PostalTradeAddress")
-    _add_text_element(buyer_addr, RAM + "PostcodeCode", buyer["postal_code"])
-    _add_text_element(buyer_addr, RAM + "LineOne", buyer["street"])
-    _add_text_element(buyer_addr, RAM + "CityName", buyer["city"])
+    _add_text_element(buyer_addr, RAM + "PostcodeCode", buyer.get("postal_code"))
+    _add_text_element(buyer_addr, RAM + "LineOne", buyer.get("street"))
+    _add_text_element(buyer_addr, RAM + "CityName", buyer.get("city"))
     _add_text_element(buyer_addr, RAM + "CountryID", buyer["country_code"])
+    return agreement
+
 
+def _add_delivery(transaction, invoice_header, details=True):
     # --- DELIVERY ---
     trade_delivery = ET.SubElement(transaction, RAM + "ApplicableHeaderTradeDelivery")
+    if not details or not invoice_header.get("delivery_date"):
+        return trade_delivery
     delivery_event = ET.SubElement(
         trade_delivery, RAM + "ActualDeliverySupplyChainEvent"
     )
@@ -151,14 +307,10 @@ def q2zugferd_xml(zugferd_data: dict):
     ET.SubElement(
         occurrence_date, UDT + "DateTimeString", format="102"
     ).text = invoice_header["delivery_date"].replace("-", "")
+    return trade_delivery
 
-    # --- SETTLEMENT ---
-    settlement = ET.SubElement(transaction, RAM + "ApplicableHeaderTradeSettlement")
-    _add_text_element(
-        settlement, RAM + "PaymentReference", invoice_header["invoice_number"]
-    )
-    _add_text_element(settlement, RAM + "InvoiceCurrencyCode", currency["iso_code"])
 
+def _add_payment_means(settlement, seller_bank_account):
     payment_means = ET.SubElement(
         settlement, RAM + "SpecifiedTradeSettlementPaymentMeans"
     )
@@ -174,6 +326,50 @@ def q2zugferd_xml(zugferd_data: dict):
         payment_means, RAM + "PayeeSpecifiedCreditorFinancialInstitution"
     )
     _add_text_element(institution, RAM + "BICID", seller_bank_account["bic_swift"])
+    return payment_means
+
+
+def _net_amount(invoice_header):
+    net_amount = invoice_header.get("net_amount")
+    if net_amount is None:
+        raise ValueError('net_amount: value required, or use totals="compute"')
+    return Decimal(net_amount)
+
+
+def _header_totals(invoice_header, net, vat_breakdown):
+    """
+    (tax total, grand total): from the VAT breakdown, or without one (a parsed
+    MINIMUM invoice) the tax_total / grand_total of the header.
+    """
+    if vat_breakdown or invoice_header.get("tax_total") is None:
+        tax_total = sum(Decimal(v["tax_amount"]) for v in vat_breakdown)
+        return tax_total, net + tax_total
+    tax_total = Decimal(invoice_header["tax_total"])
+    grand_total = invoice_header.get("grand_total")
+    return tax_total, net + tax_total if grand_total is None else Decimal(grand_total)
+
+
+def _add_settlement(
+    transaction,
+    invoice_header,
+    currency,
+    seller_bank_account,
+    vat_breakdown,
+    payment_means=None,
+    details=True,
+):
+    # --- SETTLEMENT ---
+    settlement = ET.SubElement(transaction, RAM + "ApplicableHeaderTradeSettlement")
+    if not details:
+        return _add_minimum_settlement(settlement, invoice_header, currency, vat_breakdown)
+    _add_text_element(
+        settlement, RAM + "PaymentReference", invoice_header["invoice_number"]
+    )
+    _add_text_element(settlement, RAM + "InvoiceCurrencyCode", currency["iso_code"])
+    if payment_means is None:
+        _add_payment_means(settlement, seller_bank_account)
+    else:
+        settlement.append(deepcopy(payment_means))
 
     for vat_item in vat_breakdown:
         tax = ET.SubElement(settlement, RAM + "ApplicableTradeTax")
@@ -188,18 +384,23 @@ def q2zugferd_xml(zugferd_data: dict):
             RAM + "BasisAmount",
             "{:.2f}".format(Decimal(vat_item["tax_base_amount"])),
         )
-        _add_text_element(tax, RAM + "CategoryCode", "S")
+        _add_text_element(tax, RAM + "CategoryCode", vat_item.get("vat_category", "S"))
         _add_text_element(
             tax,
             RAM + "RateApplicablePercent",
             "{:.2f}".format(Decimal(vat_item["vat_rate"])),
         )
 
-    terms = ET.SubElement(settlement, RAM + "SpecifiedTradePaymentTerms")
-    desc = f"Zahlungsziel: {invoice_header['payment_terms_days']} Tage netto."
+    desc = []
+    if invoice_header.get("payment_terms_days"):
+        desc.append(f"Zahlungsziel: {invoice_header['payment_terms_days']} Tage netto.")
     if Decimal(invoice_header.get("skonto_rate", 0)) > 0:
-        desc += f" {invoice_header['skonto_rate']}% Skonto bis {invoice_header['skonto_due_date']}."
-    _add_text_element(terms, RAM + "Description", desc)
+        desc.append(
+            f"{invoice_header['skonto_rate']}% Skonto bis {invoice_header['skonto_due_date']}."
+        )
+    if desc or invoice_header.get("due_date"):
+        terms = ET.SubElement(settlement, RAM + "SpecifiedTradePaymentTerms")
+        _add_text_element(terms, RAM + "Description", " ".join(desc))
 
     if invoice_header.get("due_date"):
         due_date = ET.SubElement(terms, RAM + "DueDateDateTime")
@@ -210,9 +411,9 @@ def q2zugferd_xml(zugferd_data: dict):
     monetary_sum = ET.SubElement(
         settlement, RAM + "SpecifiedTradeSettlementHeaderMonetarySummation"
     )
-    net = Decimal(invoice_header["net_amount"])
+    net = _net_amount(invoice_header)
     # Расчет налога на основе breakdown для точности
-    tax_total = sum(Decimal(v["tax_amount"]) for v in vat_breakdown)
+    tax_total, grand_total = _header_totals(invoice_header, net, vat_breakdown)
 
     _add_text_element(monetary_sum, RAM + "LineTotalAmount", "{:.2f}".format(net))
     _add_text_element(monetary_sum, RAM + "ChargeTotalAmount", "0.00")
@@ -224,15 +425,349 @@ def q2zugferd_xml(zugferd_data: dict):
     if el is not None:
         el.set("currencyID", currency["iso_code"])
     _add_text_element(
-        monetary_sum, RAM + "GrandTotalAmount", "{:.2f}".format(net + tax_total)
+        monetary_sum, RAM + "GrandTotalAmount", "{:.2f}".format(grand_total)
     )
     _add_text_element(
         monetary_sum, RAM + "TotalPrepaidAmount", "{:.2f}".format(Decimal(0))
     )
     _add_text_element(
-        monetary_sum, RAM + "DuePayableAmount", "{:.2f}".format(net + tax_total)
+        monetary_sum, RAM + "DuePayableAmount", "{:.2f}".format(grand_total)
     )
+    return settlement
 
-    return ET.tostring(
-        root, pretty_print=True, encoding="UTF-8", xml_declaration=True
-    ).decode("utf-8")
+
+def _add_minimum_settlement(settlement, invoice_header, currency, vat_breakdown):
+    """Currency and header totals only (MINIMUM)."""
+    _add_text_element(settlement, RAM + "InvoiceCurrencyCode", currency["iso_code"])
+    monetary_sum = ET.SubElement(
+        settlement, RAM + "SpecifiedTradeSettlementHeaderMonetarySummation"
+    )
+    net = _net_amount(invoice_header)
+    tax_total, grand_total = _header_totals(invoice_header, net, vat_breakdown)
+    _add_text_element(monetary_sum, RAM + "TaxBasisTotalAmount", "{:.2f}".format(net))
+    _add_text_element(
+        monetary_sum, RAM + "TaxTotalAmount", "{:.2f}".format(tax_total)
+    ).set("currencyID", currency["iso_code"])
+    _add_text_element(
+        monetary_sum, RAM + "GrandTotalAmount", "{:.2f}".format(grand_total)
+    )
+    _add_text_element(
+        monetary_sum, RAM + "DuePayableAmount", "{:.2f}".format(grand_total)
+    )
+    return settlement
+
+
+def _without_description(add_line_item):
+    def add_line(parent, values):
+        return add_line_item(parent, values[:2] + (None,) + values[3:])
+
+    return add_line
+
+
+# Section writers of one profile, see _emitter
+_Emitter = namedtuple(
+    "Emitter", "profile context line_item write_line_item agreement delivery settlement"
+)
+_emitters = {}
+
+
+def _emitter(profile=None):
+    """
+    Emitter of a profile, compiled once: the prebuilt context element and
+    the section writers with the profile switches applied, None for the
+    line writers of a profile without lines.
+    """
+    profile = get_profile(profile)
+    emitter = _emitters.get(profile)
+    if emitter is None:
+        line_item, write_line_item = _add_line_item, _write_line_item
+        if not profile.line_description:
+            line_item = _without_description(line_item)
+            write_line_item = _without_description(write_line_item)
+        if not profile.line_items:
+            line_item = write_line_item = None
+        details = profile.header_details
+        emitter = _emitters[profile] = _Emitter(
+            profile,
+            _add_context(ET.Element(RSM + "CrossIndustryInvoice", nsmap=NS_MAP), profile),
+            line_item,
+            write_line_item,
+            lambda parent, *args: _add_agreement(parent, *args, details=details),
+            lambda parent, *args: _add_delivery(parent, *args, details=details),
+            lambda parent, *args: _add_settlement(parent, *args, details=details),
+        )
+    return emitter
+
+
+def _totals_accumulator(totals):
+    if totals is None:
+        return None
+    if totals not in ("compute", "check"):
+        raise ValueError(f"Unknown totals mode: {totals!r}")
+    return TotalsAccumulator(check=totals == "check")
+
+
+def _build_invoice(zugferd_data, template=None, totals=None, profile=None):
+    invoice_header = zugferd_data["invoice_header"]
+    buyer = zugferd_data["buyer"]
+    currency = zugferd_data["currency"]
+    invoice_lines = zugferd_data["invoice_lines"]
+    vat_breakdown = zugferd_data["vat_breakdown"]
+    if template is None:
+        emitter = _emitter(profile)
+        seller = zugferd_data["seller"]
+        seller_bank_account = zugferd_data["seller_bank_account"]
+        add_line_item = emitter.line_item
+        seller_party = payment_means = None
+    else:
+        emitter = template._emitter
+        seller = template.seller
+        seller_bank_account = template.seller_bank_account
+        add_line_item = emitter.line_item and template._add_line_item
+        seller_party = template._seller_party
+        payment_means = template._payment_means
+
+    root = ET.Element(RSM + "CrossIndustryInvoice", nsmap=NS_MAP)
+    root.append(deepcopy(emitter.context))
+    _add_document(root, invoice_header)
+
+    # 3. TRANSACTION (СТРОГИЙ ПОРЯДОК: Lines -> Agreement -> Delivery -> Settlement)
+    transaction = ET.SubElement(root, RSM + "SupplyChainTradeTransaction")
+
+    # --- LINE ITEMS ---
+    accumulator = _totals_accumulator(totals)
+    # Profiles without lines only read them to compute totals
+    if add_line_item is not None or accumulator is not None:
+        with stage("xml_lines") as st:
+            for values in _iter_line_values(invoice_lines):
+                if accumulator is not None:
+                    values = accumulator.add_values(values)
+                if add_line_item is not None:
+                    add_line_item(transaction, values)
+            if st:
+                st.add("lines", len(transaction))
+    if accumulator is not None:
+        invoice_header, vat_breakdown = accumulator.apply(invoice_header, vat_breakdown)
+
+    emitter.agreement(transaction, seller, buyer, seller_party)
+    emitter.delivery(transaction, invoice_header)
+    emitter.settlement(
+        transaction,
+        invoice_header,
+        currency,
+        seller_bank_account,
+        vat_breakdown,
+        payment_means,
+    )
+    return root
+
+
+def _to_string(root, as_bytes=False):
+    with stage("xml_serialize") as st:
+        xml = ET.tostring(root, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+        if st:
+            st.add("bytes", len(xml))
+        return xml if as_bytes else xml.decode("utf-8")
+
+
+def _xml_cache_key(zugferd_data, totals, profile):
+    """None for invoice lines that are not plain data (generators, NumPy columns)."""
+    try:
+        return cache_key("xml", zugferd_data, totals, get_profile(profile))
+    except TypeError:
+        return None
+
+
+def q2zugferd_xml(zugferd_data: dict, as_bytes=False, totals=None, profile=None, cache=None):
+    """
+    ZUGFeRD XML for zugferd_data as str, or as UTF-8 bytes with as_bytes=True
+    (can be passed to q2zugferd_pdf without re-encoding).
+    totals - None writes the supplied totals as they are,
+             "compute" computes line totals, VAT breakdown and header sums
+             (see TotalsAccumulator), "check" raises TotalsError
+             if the supplied ones differ from the computed ones.
+    profile - name of a registered profile or a Profile (see q2zugferd_profile),
+              None is EN16931.
+    cache - ResultCache (see q2zugferd_cache), returns the stored XML of the same
+            zugferd_data and options.
+    """
+    key = None
+    if cache is not None:
+        key = _xml_cache_key(zugferd_data, totals, profile)
+        xml = None if key is None else cache.read(key)
+        if xml is not None:
+            return xml if as_bytes else xml.decode("utf-8")
+    root = _build_invoice(zugferd_data, totals=totals, profile=profile)
+    if key is None:
+        return _to_string(root, as_bytes)
+    xml = _to_string(root, as_bytes=True)
+    cache.put(key, xml)
+    return xml if as_bytes else xml.decode("utf-8")
+
+
+class ZugferdTemplate:
+    """
+    Precompiled invoice skeleton for one seller and bank account.
+
+    The invariant parts (document context, seller party, payment means and
+    the line item skeleton) are built once and copied into every invoice.
+    render() returns exactly the same XML as q2zugferd_xml for the profile of
+    the template; the "seller" and "seller_bank_account" of zugferd_data are ignored.
+    """
+
+    def __init__(self, seller: dict, seller_bank_account: dict, profile=None):
+        self.seller = seller
+        self.seller_bank_account = seller_bank_account
+        self._emitter = emitter = _emitter(profile)
+        self.profile = emitter.profile
+        details = self.profile.header_details
+        holder = ET.Element(RSM + "CrossIndustryInvoice", nsmap=NS_MAP)
+        self._seller_party = _add_seller_party(holder, seller, details)
+        self._payment_means = _add_payment_means(holder, seller_bank_account) if details else None
+
+        # Line item skeleton: find where every value of _line_values goes
+        markers = tuple(f"@{index}@" for index in range(9))
+        self._line_item = (emitter.line_item or _add_line_item)(holder, markers)
+        self._line_text_slots = []
+        self._line_attr_slots = []
+        for position, element in enumerate(self._line_item.iter()):
+            if element.text in markers:
+                self._line_text_slots.append((markers.index(element.text), position))
+            if element.get("unitCode") in markers:
+                self._line_attr_slots.append(
+                    (markers.index(element.get("unitCode")), position)
+                )
+
+    @classmethod
+    def from_data(cls, zugferd_data: dict, profile=None):
+        return cls(zugferd_data["seller"], zugferd_data["seller_bank_account"], profile)
+
+    def _add_line_item(self, transaction, values):
+        line_item = deepcopy(self._line_item)
+        transaction.append(line_item)
+        elements = list(line_item.iter())
+        for index, position in self._line_attr_slots:
+            elements[position].set("unitCode", values[index])
+        for index, position in self._line_text_slots:
+            value = values[index]
+            element = elements[position]
+            if value is not None and str(value).strip() != "":
+                element.text = str(value)
+            else:
+                element.getparent().remove(element)
+        return line_item
+
+    def render(self, zugferd_data: dict, as_bytes=False, totals=None):
+        return _to_string(_build_invoice(zugferd_data, self, totals), as_bytes)
+
+
+def _write_element(xf, element):
+    """Write an element through xmlfile, reusing the namespaces declared by the open parents."""
+    with xf.element(element.tag, element.attrib):
+        if element.text:
+            xf.write(element.text)
+        for child in element:
+            _write_element(xf, child)
+
+
+def _write_text_element(xf, tag_name, text_value, attrib=None):
+    if text_value is not None and str(text_value).strip() != "":
+        with xf.element(tag_name, attrib):
+            xf.write(str(text_value))
+
+
+def _write_line_item(xf, values):
+    """Stream counterpart of _add_line_item, writes without building elements."""
+    (
+        line_number,
+        name,
+        description,
+        net_price_amount,
+        unit_code,
+        quantity,
+        vat_rate,
+        line_total,
+        vat_category,
+    ) = values
+    with xf.element(RAM + "IncludedSupplyChainTradeLineItem"):
+        with xf.element(RAM + "AssociatedDocumentLineDocument"):
+            _write_text_element(xf, RAM + "LineID", line_number)
+        with xf.element(RAM + "SpecifiedTradeProduct"):
+            _write_text_element(xf, RAM + "Name", name)
+            _write_text_element(xf, RAM + "Description", description)
+        with xf.element(RAM + "SpecifiedLineTradeAgreement"):
+            with xf.element(RAM + "NetPriceProductTradePrice"):
+                _write_text_element(xf, RAM + "ChargeAmount", net_price_amount)
+                with xf.element(RAM + "BasisQuantity", unitCode=unit_code):
+                    xf.write("1.0000")
+        with xf.element(RAM + "SpecifiedLineTradeDelivery"):
+            with xf.element(RAM + "BilledQuantity", unitCode=unit_code):
+                xf.write(quantity)
+        with xf.element(RAM + "SpecifiedLineTradeSettlement"):
+            with xf.element(RAM + "ApplicableTradeTax"):
+                _write_text_element(xf, RAM + "TypeCode", "VAT")
+                _write_text_element(xf, RAM + "CategoryCode", vat_category)
+                _write_text_element(xf, RAM + "RateApplicablePercent", vat_rate)
+            with xf.element(RAM + "SpecifiedTradeSettlementLineMonetarySummation"):
+                _write_text_element(xf, RAM + "LineTotalAmount", line_total)
+
+
+def q2zugferd_xml_stream(
+    zugferd_data: dict, output, invoice_lines=None, totals=None, profile=None
+):
+    """
+    Write ZUGFeRD XML incrementally to output (file name or binary file-like object).
+    invoice_lines - any iterable or generator of line dicts or a columnar
+                    table (see _columnar_line_values),
+                    defaults to zugferd_data["invoice_lines"].
+    totals - see q2zugferd_xml, computed on the fly while the lines are written.
+    profile - see q2zugferd_xml.
+    Line items are written one at a time, so memory does not grow
+    with the number of lines. The output is not pretty printed.
+    """
+    invoice_header = zugferd_data["invoice_header"]
+    vat_breakdown = zugferd_data["vat_breakdown"]
+    if invoice_lines is None:
+        invoice_lines = zugferd_data["invoice_lines"]
+    accumulator = _totals_accumulator(totals)
+    emitter = _emitter(profile)
+    write_line_item = emitter.write_line_item
+
+    # Small detached parent for the sections written through xmlfile
+    holder = ET.Element(RSM + "SupplyChainTradeTransaction", nsmap=NS_MAP)
+
+    def write_section(add_section, *args):
+        element = add_section(holder, *args)
+        _write_element(xf, element)
+        holder.remove(element)
+
+    with ET.xmlfile(output, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(RSM + "CrossIndustryInvoice", nsmap=NS_MAP):
+            _write_element(xf, emitter.context)
+            write_section(_add_document, invoice_header)
+            with xf.element(RSM + "SupplyChainTradeTransaction"):
+                if write_line_item is not None or accumulator is not None:
+                    with stage("xml_stream_lines") as st:
+                        count = 0
+                        for values in _iter_line_values(invoice_lines):
+                            if accumulator is not None:
+                                values = accumulator.add_values(values)
+                            if write_line_item is not None:
+                                write_line_item(xf, values)
+                                count += 1
+                        if st:
+                            st.add("lines", count)
+                if accumulator is not None:
+                    invoice_header, vat_breakdown = accumulator.apply(
+                        invoice_header, vat_breakdown
+                    )
+                write_section(emitter.agreement, zugferd_data["seller"], zugferd_data["buyer"])
+                write_section(emitter.delivery, invoice_header)
+                write_section(
+                    emitter.settlement,
+                    invoice_header,
+                    zugferd_data["currency"],
+                    zugferd_data["seller_bank_account"],
+                    vat_breakdown,
+                )
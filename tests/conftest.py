@@ -0,0 +1,116 @@
+import copy
+
+import pikepdf
+import pytest
+from pikepdf import Dictionary, Name
+
+ICC_PROFILE = b"\x00" * 128
+
+ZUGFERD_DATA = {
+    "invoice_header": {
+        "invoice_number": "INV-2025-11-102",
+        "invoice_date": "2025-11-27",
+        "payment_terms_days": "14",
+        "due_date": "2025-12-10",
+        "net_amount": "36630.00",
+        "delivery_date": "2025-12-01",
+        "skonto_rate": "3.00",
+        "skonto_due_date": "2025-12-03",
+    },
+    "seller": {
+        "vat_id": "DE279247134",
+        "name": "Webware Internet Solutions GmbH",
+        "postal_code": "12345",
+        "city": "Bremen",
+        "country_code": "DE",
+        "street": "Einbahn Straße 19",
+    },
+    "buyer": {
+        "part_id": "2",
+        "name": "Agoratech",
+        "postal_code": "34130",
+        "city": "Kassel",
+        "country_code": "DE",
+        "street": "Teichstr. 14-16",
+    },
+    "currency": {"iso_code": "EUR"},
+    "seller_bank_account": {"iban": "DE02 1203 0000 0000 2020 51", "bic_swift": "BYLADEM1001"},
+    "invoice_lines": [
+        {
+            "line_number": "1",
+            "quantity": "333.0000",
+            "unit_code": "MTR",
+            "net_price": "55.0000",
+            "vat_rate": "19.00",
+            "description": "Rolle Netzwerkkabel, 100 Meter.",
+            "net_total": "18315.00",
+            "name": "Netzwerkkabel Cat 6 (100m)",
+        },
+        {
+            "line_number": "2",
+            "quantity": "333.0000",
+            "unit_code": "MTR",
+            "net_price": "55.0000",
+            "vat_rate": "7.00",
+            "description": "Rolle Netzwerkkabel, 100 Meter.",
+            "net_total": "18315.00",
+            "name": "Netzwerkkabel Cat 6 (100m)",
+        },
+    ],
+    "vat_breakdown": [
+        {"vat_rate": "7.00", "tax_base_amount": "18315.00", "tax_amount": "1282.05"},
+        {"vat_rate": "19.00", "tax_base_amount": "18315.00", "tax_amount": "3479.85"},
+    ],
+}
+
+
+@pytest.fixture
+def zugferd_data():
+    return copy.deepcopy(ZUGFERD_DATA)
+
+
+@pytest.fixture
+def icc_profile():
+    return ICC_PROFILE
+
+
+def make_pdf(path, pages=2):
+    """Small PDF with a shared DeviceRGB image and form on every page."""
+    pdf = pikepdf.new()
+    pdf.docinfo["/CreationDate"] = "D:20251127120000+01'00'"
+    pdf.docinfo["/Producer"] = "q2zugferd tests"
+    image = pdf.make_indirect(
+        pikepdf.Stream(
+            pdf,
+            b"\xff\x00\x00",
+            Type=Name.XObject,
+            Subtype=Name.Image,
+            Width=1,
+            Height=1,
+            ColorSpace=Name.DeviceRGB,
+            BitsPerComponent=8,
+        )
+    )
+    form = pdf.make_indirect(
+        pikepdf.Stream(
+            pdf,
+            b"q 1 0 0 rg 0 0 10 10 re f Q",
+            Type=Name.XObject,
+            Subtype=Name.Form,
+            BBox=[0, 0, 10, 10],
+            Resources=Dictionary(XObject=Dictionary(Im0=image)),
+        )
+    )
+    for _ in range(pages):
+        pdf.add_blank_page()
+        pdf.pages[-1].Resources = Dictionary(
+            ColorSpace=Dictionary(CS0=Name.DeviceRGB),
+            XObject=Dictionary(Im0=image, Fm0=form),
+        )
+    pdf.save(path)
+    return path
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    return str(make_pdf(tmp_path / "input.pdf"))
@@ -0,0 +1,117 @@
+import pytest
+
+from q2zugferd import q2zugferd_xml, set_schemas, validate, validate_batch
+from q2zugferd.q2zugferd_validate import _thread_cache, clear_schema_cache
+
+# Minimal stand-ins for the EN16931 XSD and the compiled Schematron rules
+XSD = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100"
+    elementFormDefault="qualified">
+  <xs:element name="CrossIndustryInvoice">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="ExchangedDocumentContext" type="xs:anyType"/>
+        <xs:element name="ExchangedDocument" type="xs:anyType"/>
+        <xs:element name="SupplyChainTradeTransaction" type="xs:anyType"/>
+      </xs:sequence>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+SCHEMATRON_XSLT = """<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+    xmlns:svrl="http://purl.oclc.org/dsdl/svrl"
+    xmlns:ram="urn:un:unece:uncefact:data:standard:ReusableAggregateBusinessInformationEntity:100">
+  <xsl:template match="/">
+    <svrl:schematron-output>
+      <xsl:for-each select="//ram:IncludedSupplyChainTradeLineItem">
+        <xsl:if test="not(ram:SpecifiedTradeProduct/ram:Name)">
+          <svrl:failed-assert id="BR-25" flag="fatal" location="/line[{position()}]">
+            <svrl:text>Each Invoice line shall contain the Item name.</svrl:text>
+          </svrl:failed-assert>
+        </xsl:if>
+      </xsl:for-each>
+    </svrl:schematron-output>
+  </xsl:template>
+</xsl:stylesheet>
+"""
+
+
+@pytest.fixture
+def schemas(tmp_path):
+    xsd = tmp_path / "cii.xsd"
+    xsd.write_text(XSD, encoding="utf-8")
+    xslt = tmp_path / "cii.xslt"
+    xslt.write_text(SCHEMATRON_XSLT, encoding="utf-8")
+    set_schemas(str(xsd), str(xslt))
+    yield str(xsd), str(xslt)
+    set_schemas()
+    clear_schema_cache()
+
+
+def test_validate(schemas, zugferd_data):
+    assert validate(q2zugferd_xml(zugferd_data, as_bytes=True)) == []
+    # compiled once and reused
+    assert len(_thread_cache()) == 2
+    validate(q2zugferd_xml(zugferd_data))
+    assert len(_thread_cache()) == 2
+
+    zugferd_data["invoice_lines"][1]["name"] = ""
+    issues = validate(q2zugferd_xml(zugferd_data))
+    assert [(i.source, i.rule, i.path) for i in issues] == [("schematron", "BR-25", "/line[2]")]
+
+    issues = validate(b"<rsm:CrossIndustryInvoice xmlns:rsm="
+                      b'"urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100"/>',
+                      schematron=False)
+    assert len(issues) == 1
+    assert issues[0].source == "xsd"
+    assert issues[0].line == 1
+    assert "CrossIndustryInvoice" in issues[0].message
+
+
+def test_validate_threads(schemas, zugferd_data):
+    import threading
+
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    validate(xml)
+    main_cache = _thread_cache()
+    sizes = []
+
+    def worker():
+        sizes.append(len(_thread_cache()))
+        validate(xml)
+        sizes.append(len(_thread_cache()))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    # Own validators per thread, the main thread's are untouched
+    assert sizes == [0, 2]
+    assert _thread_cache() is main_cache
+    clear_schema_cache()
+    assert _thread_cache() == {}
+
+
+def test_validate_without_schema():
+    with pytest.raises(ValueError):
+        validate("<a/>", xsd=False, schematron=False)
+    # No schemas are shipped, there is no default
+    with pytest.raises(ValueError, match="set_schemas"):
+        validate("<a/>")
+    with pytest.raises(ValueError, match="set_schemas"):
+        validate_batch(["<a/>"])
+
+
+def test_validate_batch(schemas, zugferd_data):
+    valid = q2zugferd_xml(zugferd_data, as_bytes=True)
+    zugferd_data["invoice_lines"][0]["name"] = ""
+    invalid = q2zugferd_xml(zugferd_data, as_bytes=True)
+    results = list(validate_batch([valid, invalid, b"<broken"], *schemas, max_workers=2))
+    assert [r.ok for r in results] == [True, False, False]
+    assert results[1].issues[0].rule == "BR-25"
+    assert results[2].error is not None
+    # The schemas of set_schemas() reach the workers
+    results = list(validate_batch([valid, invalid], max_workers=2))
+    assert [r.ok for r in results] == [True, False]
@@ -0,0 +1,118 @@
+import io
+
+import pytest
+
+from q2zugferd import (
+    Line,
+    TotalsError,
+    ZugferdTemplate,
+    check_totals,
+    compute_totals,
+    q2zugferd_parse,
+    q2zugferd_xml,
+    q2zugferd_xml_stream,
+)
+from q2zugferd.q2zugferd_totals import round_amount
+
+
+def test_round_half_up():
+    assert str(round_amount("2.675")) == "2.68"
+    assert str(round_amount("0.125")) == "0.13"
+    assert str(round_amount("-0.125")) == "-0.13"
+
+
+def test_compute_totals(zugferd_data):
+    lines = zugferd_data["invoice_lines"]
+    lines.append(
+        {
+            "line_number": "3",
+            "quantity": "3",
+            "net_price": "0.3350",
+            "vat_rate": "0",
+            "vat_category": "E",
+            "name": "Exempt",
+            "description": None,
+        }
+    )
+    totals = compute_totals(lines)
+    assert totals["net_amount"] == "36631.01"
+    assert totals["vat_breakdown"] == [
+        {"vat_category": "S", "vat_rate": "19.00", "tax_base_amount": "18315.00", "tax_amount": "3479.85"},
+        {"vat_category": "S", "vat_rate": "7.00", "tax_base_amount": "18315.00", "tax_amount": "1282.05"},
+        {"vat_category": "E", "vat_rate": "0.00", "tax_base_amount": "1.01", "tax_amount": "0.00"},
+    ]
+    assert totals["tax_total"] == "4761.90"
+    assert totals["grand_total"] == "41392.91"
+
+
+def test_check_totals(zugferd_data):
+    assert check_totals(zugferd_data) == []
+    assert q2zugferd_xml(zugferd_data, totals="check") == q2zugferd_xml(zugferd_data)
+
+    zugferd_data["invoice_lines"][0]["net_total"] = "18315.01"
+    zugferd_data["vat_breakdown"][0]["tax_amount"] = "1282.00"
+    fields = [d.field for d in check_totals(zugferd_data)]
+    assert fields == ["line 1 net_total", "vat_breakdown S 7.00 tax_amount"]
+    with pytest.raises(TotalsError) as error:
+        q2zugferd_xml(zugferd_data, totals="check")
+    assert len(error.value.differences) == 2
+
+
+def test_check_totals_round_half_up(zugferd_data):
+    line = {"line_number": "1", "name": "a", "description": "d", "quantity": "1",
+            "net_price": "10.125", "vat_rate": "19", "net_total": "10.125"}
+    zugferd_data["invoice_lines"] = [line]
+    zugferd_data["invoice_header"]["net_amount"] = "10.13"
+    zugferd_data["vat_breakdown"] = [
+        {"vat_category": "S", "vat_rate": "19", "tax_base_amount": "10.13", "tax_amount": "1.92"}
+    ]
+    assert check_totals(zugferd_data) == []
+    # The supplied line total is written rounded half up, as it is checked
+    xml = q2zugferd_xml(zugferd_data, totals="check")
+    assert "<ram:LineTotalAmount>10.13</ram:LineTotalAmount>" in xml
+    zugferd_data["invoice_lines"] = {key: [value] for key, value in line.items()}
+    assert q2zugferd_xml(zugferd_data, totals="check") == xml
+    zugferd_data["invoice_lines"] = [Line.from_dict(line)]
+    assert q2zugferd_xml(zugferd_data, totals="check") == xml
+
+
+def test_xml_compute(zugferd_data):
+    expected = q2zugferd_parse(q2zugferd_xml(zugferd_data))
+    for line in zugferd_data["invoice_lines"]:
+        del line["net_total"]
+    zugferd_data["invoice_header"]["net_amount"] = "0"
+    zugferd_data["vat_breakdown"] = []
+    for xml in (
+        q2zugferd_xml(zugferd_data, totals="compute"),
+        ZugferdTemplate.from_data(zugferd_data).render(zugferd_data, totals="compute"),
+    ):
+        parsed = q2zugferd_parse(xml)
+        assert parsed["invoice_lines"] == expected["invoice_lines"]
+        assert parsed["invoice_header"] == expected["invoice_header"]
+        assert sorted(parsed["vat_breakdown"], key=str) == sorted(expected["vat_breakdown"], key=str)
+    # the caller's data is not modified
+    assert zugferd_data["vat_breakdown"] == []
+
+
+def test_stream_compute(zugferd_data):
+    line = dict(zugferd_data["invoice_lines"][0], net_total="0", vat_category="S")
+    lines = (dict(line, line_number=str(i + 1)) for i in range(1000))
+    output = io.BytesIO()
+    q2zugferd_xml_stream(zugferd_data, output, invoice_lines=lines, totals="compute")
+    parsed = q2zugferd_parse(output.getvalue())
+    assert parsed["invoice_header"]["net_amount"] == "18315000.00"
+    assert parsed["vat_breakdown"] == [
+        {"vat_rate": "19.00", "tax_base_amount": "18315000.00", "tax_amount": "3479850.00"}
+    ]
+    assert {line["net_total"] for line in parsed["invoice_lines"]} == {"18315.00"}
+
+
+def test_vat_category_round_trip(zugferd_data):
+    zugferd_data["invoice_lines"][1].update(vat_rate="0", vat_category="AE")
+    xml = q2zugferd_xml(zugferd_data, totals="compute")
+    parsed = q2zugferd_parse(xml)
+    assert parsed["invoice_lines"][1]["vat_category"] == "AE"
+    assert "vat_category" not in parsed["invoice_lines"][0]
+    assert {"vat_category": "AE", "vat_rate": "0.00", "tax_base_amount": "18315.00",
+            "tax_amount": "0.00"} in parsed["vat_breakdown"]
+    assert q2zugferd_xml(parsed) == xml
@@ -0,0 +1,140 @@
+import datetime
+import io
+import pickle
+from decimal import Decimal
+
+import pytest
+
+from q2zugferd import (
+    BankAccount,
+    Invoice,
+    Line,
+    Party,
+    VatItem,
+    ZugferdTemplate,
+    check_totals,
+    q2zugferd_xml,
+    q2zugferd_xml_stream,
+)
+
+
+def test_invoice_from_dict(zugferd_data):
+    invoice = Invoice.from_dict(zugferd_data)
+    assert invoice.bank_account.iban == "DE02120300000000202051"
+    assert invoice.lines[0].quantity == Decimal("333.0000")
+    assert invoice["invoice_header"]["invoice_number"] == "INV-2025-11-102"
+    assert invoice["currency"] == {"iso_code": "EUR"}
+    assert invoice.seller.get("part_id", "-") == "-"
+    with pytest.raises(KeyError):
+        invoice.seller["missing"]
+    assert pickle.loads(pickle.dumps(invoice)) == invoice
+
+
+def test_invoice_xml(zugferd_data):
+    xml = q2zugferd_xml(zugferd_data)
+    invoice = Invoice.from_dict(zugferd_data)
+    assert q2zugferd_xml(invoice) == xml
+    assert ZugferdTemplate.from_data(invoice).render(invoice) == xml
+    assert q2zugferd_xml(invoice, totals="check") == xml
+    assert check_totals(invoice) == []
+
+    stream_dict, stream_model = io.BytesIO(), io.BytesIO()
+    q2zugferd_xml_stream(zugferd_data, stream_dict)
+    q2zugferd_xml_stream(invoice, stream_model)
+    assert stream_dict.getvalue() == stream_model.getvalue()
+
+
+def test_invoice_typed_construction():
+    invoice = Invoice(
+        "INV-1",
+        datetime.date(2025, 11, 27),
+        Party("Seller GmbH", "Hauptstr. 1", "12345", "Bremen", "de", vat_id="DE279247134"),
+        Party("Buyer AG", "Teichstr. 14", "34130", "Kassel", "DE", part_id="2"),
+        BankAccount("de02 1203 0000 0000 2020 51", "byladem1001"),
+        [Line("1", "Cable", 2, "1.25", 19), Line("2", "Service", "1", 10.1, 7, vat_category="S")],
+        [VatItem(19, "2.50", "0.48"), VatItem(7, "10.10", "0.71")],
+        delivery_date="2025-12-01",
+        net_amount="12.60",
+        payment_terms_days=14,
+    )
+    assert invoice.invoice_date == "2025-11-27"
+    assert invoice.seller.country_code == "DE"
+    assert invoice.bank_account.bic_swift == "BYLADEM1001"
+    assert invoice.lines[1].net_price == Decimal("10.1")
+    xml = q2zugferd_xml(invoice, totals="compute")
+    assert "<ram:LineTotalAmount>2.50</ram:LineTotalAmount>" in xml
+    assert "<ram:CountryID>DE</ram:CountryID>" in xml
+
+
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda: Line("1", "Cable", "two", "1.25", 19),
+        lambda: Line("1", "", 1, "1.25", 19),
+        lambda: Party("Seller", "Street", "1", "City", "DEU"),
+        lambda: BankAccount("DE03120300000000202051", "BYLADEM1001"),
+        lambda: BankAccount("DE02120300000000202051", "BYLA"),
+    ],
+)
+def test_validation(make):
+    with pytest.raises(ValueError):
+        make()
+
+
+def test_invoice_date_validation(zugferd_data):
+    zugferd_data["invoice_header"]["invoice_date"] = "27.11.2025"
+    with pytest.raises(ValueError, match="invoice_date"):
+        Invoice.from_dict(zugferd_data)
+
+
+def test_invoice_optional_fields():
+    invoice = Invoice(
+        "INV-2",
+        "2025-11-27",
+        Party("Seller GmbH", None, None, None, "DE"),
+        Party("Buyer AG", "Teichstr. 14", "34130", "Kassel", "DE"),
+        BankAccount("DE02120300000000202051", "BYLADEM1001"),
+        [Line("1", "Cable", 2, "1.25", 19)],
+    )
+    with pytest.raises(KeyError):
+        invoice["net_amount"]
+    assert invoice.get("payment_terms_days") is None
+    assert "payment_terms_days" not in dict(invoice)
+
+    xml = q2zugferd_xml(invoice, totals="compute")
+    assert "<ram:TaxBasisTotalAmount>2.50</ram:TaxBasisTotalAmount>" in xml
+    assert "Zahlungsziel" not in xml and "None" not in xml
+    assert "SpecifiedTradePaymentTerms" not in xml
+    assert "ActualDeliverySupplyChainEvent" not in xml
+    stream = io.BytesIO()
+    q2zugferd_xml_stream(invoice, stream, totals="compute")
+    assert b"<ram:GrandTotalAmount>2.98</ram:GrandTotalAmount>" in stream.getvalue()
+    assert [difference.field for difference in check_totals(invoice)] == [
+        "net_amount",
+        "vat_breakdown S 19.00",
+    ]
+    with pytest.raises(ValueError, match="net_amount"):
+        q2zugferd_xml(invoice)
+
+
+def test_decimal_from_float():
+    assert Line("1", "Cable", 0.1, 1.1, 19.0).net_price == Decimal("1.1")
+
+
+def test_invoice_get_like_dict(zugferd_data):
+    invoice = Invoice.from_dict(zugferd_data)
+    for key in zugferd_data:
+        assert invoice.get(key) is not None
+        assert invoice.get(key) == invoice[key]
+    for key in zugferd_data["invoice_header"]:
+        assert invoice["invoice_header"].get(key) == invoice["invoice_header"][key]
+    assert invoice.get("currency") == {"iso_code": "EUR"}
+    assert invoice.get("invoice_lines") is invoice.lines
+    assert invoice.get("seller_bank_account") is invoice.bank_account
+    assert invoice.get("missing", "-") == "-"
+
+
+@pytest.mark.parametrize("iban", ["²E02120300000000202051", "DE02-1203-0000-0000-2020-51"])
+def test_iban_format_checked_first(iban):
+    with pytest.raises(ValueError, match="iban: invalid IBAN"):
+        BankAccount(iban, "BYLADEM1001")
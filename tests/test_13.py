@@ -0,0 +1,74 @@
+import json
+
+from q2zugferd import q2zugferd_extract, q2zugferd_xml
+from q2zugferd.q2zugferd_cli import main
+
+
+def _write_jsonl(path, records):
+    path.write_text("\n".join(json.dumps(record) for record in records) + "\n", encoding="utf-8")
+
+
+def test_cli_batch_resume(tmp_path, sample_pdf, zugferd_data, icc_profile, capsys):
+    icc = tmp_path / "profile.icc"
+    icc.write_bytes(icc_profile)
+    records = []
+    for number in range(3):
+        data = json.loads(json.dumps(zugferd_data))
+        data["invoice_header"]["invoice_number"] = f"INV/{number}"
+        records.append(data)
+    source = tmp_path / "invoices.jsonl"
+    _write_jsonl(source, records)
+    output_dir = tmp_path / "out"
+    argv = ["batch", str(source), "--pdf", sample_pdf, "--output-dir", str(output_dir),
+            "--jobs", "2", "--icc", str(icc), "--totals", "check", "-q"]
+
+    assert main(argv) == 0
+    assert "3 written, 0 skipped, 0 failed" in capsys.readouterr().out
+    assert sorted(p.name for p in output_dir.iterdir()) == ["INV_0.pdf", "INV_1.pdf", "INV_2.pdf"]
+    assert q2zugferd_extract(str(output_dir / "INV_1.pdf")) == q2zugferd_xml(
+        records[1], as_bytes=True
+    )
+
+    # resume: a broken output is redone, complete ones are skipped
+    (output_dir / "INV_2.pdf").write_bytes(b"%PDF-1.7 truncated")
+    assert main(argv) == 0
+    assert "1 written, 2 skipped, 0 failed" in capsys.readouterr().out
+    assert main(argv + ["--force"]) == 0
+    assert "3 written, 0 skipped" in capsys.readouterr().out
+
+
+def test_cli_batch_directory_failures(tmp_path, sample_pdf, zugferd_data, icc_profile, capsys):
+    json_dir = tmp_path / "json"
+    pdf_dir = tmp_path / "pdf"
+    json_dir.mkdir()
+    pdf_dir.mkdir()
+    for name in ("a", "b"):
+        (json_dir / f"{name}.json").write_text(json.dumps(zugferd_data), encoding="utf-8")
+    (pdf_dir / "a.pdf").write_bytes(open(sample_pdf, "rb").read())
+    icc = tmp_path / "profile.icc"
+    icc.write_bytes(icc_profile)
+    output_dir = tmp_path / "out"
+
+    code = main(["batch", str(json_dir), "--pdf-dir", str(pdf_dir), "--output-dir",
+                 str(output_dir), "--icc", str(icc), "-j", "1", "-q"])
+    assert code == 1
+    captured = capsys.readouterr()
+    assert "1 written, 0 skipped, 1 failed" in captured.out
+    assert "b.pdf" in captured.err
+    assert [p.name for p in output_dir.iterdir()] == ["a.pdf"]
+
+
+def test_cli_progress_option(tmp_path, sample_pdf, zugferd_data, icc_profile, capsys):
+    import pytest
+
+    icc = tmp_path / "profile.icc"
+    icc.write_bytes(icc_profile)
+    source = tmp_path / "invoices.jsonl"
+    _write_jsonl(source, [zugferd_data])
+    argv = ["batch", str(source), "--pdf", sample_pdf, "--output-dir", str(tmp_path / "out"),
+            "--jobs", "1", "--icc", str(icc)]
+    assert main(argv + ["--progress", "0"]) == 0
+    captured = capsys.readouterr()
+    assert "1 written" in captured.out and "invoices," not in captured.err
+    with pytest.raises(SystemExit):
+        main(argv + ["--progress", "-1"])
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import json
+
+from q2zugferd import q2zugferd_extract, q2zugferd_xml
+from q2zugferd.q2zugferd_async import AsyncZugferd
+from q2zugferd.q2zugferd_server import ZugferdServer
+
+
+async def _request(port, method, path, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    headers = dict(
+        line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")[1:]
+    )
+    return status, headers, payload
+
+
+def _serve(test, **kwargs):
+    async def main():
+        server = ZugferdServer(AsyncZugferd(2), **kwargs)
+        await server.start("127.0.0.1", 0)
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            await test(server, port)
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+
+
+def test_server_endpoints(sample_pdf, zugferd_data, icc_profile):
+    async def test(server, port):
+        status, headers, xml = await _request(
+            port, "POST", "/xml?totals=check", json.dumps(zugferd_data).encode()
+        )
+        assert status == 200 and headers["Content-Type"] == "application/xml"
+        assert xml == q2zugferd_xml(zugferd_data, as_bytes=True)
+
+        with open(sample_pdf, "rb") as f:
+            pdf = base64.b64encode(f.read()).decode("ascii")
+        for request in ({"pdf": pdf, "zugferd_data": zugferd_data}, {"pdf": pdf, "xml": xml.decode()}):
+            request["options"] = {"save_profile": "compact"}
+            status, headers, output = await _request(port, "POST", "/pdf", json.dumps(request).encode())
+            assert status == 200 and headers["Content-Type"] == "application/pdf"
+            assert q2zugferd_extract(output) == xml
+
+        status, _, extracted = await _request(port, "POST", "/extract", output)
+        assert status == 200 and extracted == xml
+        status, _, _ = await _request(port, "POST", "/extract", base64.b64decode(pdf))
+        assert status == 404
+
+        zugferd_data["vat_breakdown"][0]["tax_amount"] = "1.00"
+        status, _, message = await _request(
+            port, "POST", "/xml?totals=check", json.dumps(zugferd_data).encode()
+        )
+        assert status == 422 and b"TotalsError" in message
+        assert (await _request(port, "POST", "/xml", b"{not json"))[0] == 400
+        assert (await _request(port, "GET", "/xml"))[0] == 405
+        assert (await _request(port, "POST", "/nothing"))[0] == 404
+
+        status, _, health = await _request(port, "GET", "/health")
+        assert status == 200 and json.loads(health)["pending"] == 0
+
+    from q2zugferd import set_icc_profile
+
+    set_icc_profile(icc_profile)
+    try:
+        _serve(test)
+    finally:
+        set_icc_profile(None)
+
+
+def test_server_backpressure(zugferd_data):
+    async def test(server, port):
+        status, headers, _ = await _request(port, "POST", "/xml", json.dumps(zugferd_data).encode())
+        assert status == 503 and headers["Retry-After"] == "1"
+        assert server.stats["rejected"] == 1
+
+    _serve(test, max_queue=0)
+
+
+def test_server_timeout(zugferd_data):
+    line = zugferd_data["invoice_lines"][0]
+    zugferd_data["invoice_lines"] = [line] * 20000
+
+    async def test(server, port):
+        status, _, _ = await _request(port, "POST", "/xml", json.dumps(zugferd_data).encode())
+        assert status == 504
+        assert server.stats["timeouts"] == 1
+
+    _serve(test, timeout=0.01)
+
+
+def test_server_rejects_xml_file_name(sample_pdf, tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("secret")
+    with open(sample_pdf, "rb") as f:
+        pdf = base64.b64encode(f.read()).decode("ascii")
+
+    async def test(server, port):
+        for xml in (str(secret), 42):
+            request = json.dumps({"pdf": pdf, "xml": xml}).encode()
+            status, _, message = await _request(port, "POST", "/pdf", request)
+            assert status == 400 and b"secret" not in message
+
+    _serve(test)
+
+
+def test_server_content_length(zugferd_data):
+    async def raw(port, length):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /xml HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1])
+
+    async def test(server, port):
+        assert await raw(port, "abc") == 400
+        assert await raw(port, "-1") == 400
+        assert await raw(port, "2048") == 413
+        assert server.stats["errors"] == 0
+
+    _serve(test, max_body=1024)
+
+
+def test_server_unix_socket_path(tmp_path, zugferd_data):
+    import pytest
+
+    not_a_socket = tmp_path / "typo.txt"
+    not_a_socket.write_text("keep")
+    server = ZugferdServer(AsyncZugferd(1))
+    with pytest.raises(ValueError):
+        asyncio.run(server.start(unix=str(not_a_socket)))
+    assert not_a_socket.read_text() == "keep"
+
+    path = str(tmp_path / "q2zugferd.sock")
+
+    async def start_twice():
+        for _ in range(2):
+            # The socket left by the first run is replaced
+            await server.start(unix=path)
+            server._server.close()
+            await server._server.wait_closed()
+
+    asyncio.run(start_twice())
+    server.runner.close()
+
+
+def test_runner_warm_up():
+    runner = AsyncZugferd(2, processes=True)
+    try:
+        runner.warm_up()
+        # Both worker processes started before any request
+        assert len(runner._executor._processes) == 2
+    finally:
+        runner.close()
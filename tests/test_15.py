@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import q2zugferd
+from benchmarks.import_time import SCENARIOS, measure
+
+
+def _run(code):
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout.split()
+
+
+def test_xml_only_imports_skip_pikepdf():
+    for name in ("package", "xml", "model", "parse", "validate", "async"):
+        assert not measure(SCENARIOS[name], repeat=1)[1], name
+    assert measure(SCENARIOS["pdf"], repeat=1)[1]
+
+
+def test_names_are_functions_after_submodule_import():
+    output = _run(
+        "import q2zugferd.q2zugferd_pdf, q2zugferd.q2zugferd_xml\n"
+        "from q2zugferd import q2zugferd_pdf, q2zugferd_xml\n"
+        "import q2zugferd\n"
+        "print(callable(q2zugferd_pdf), callable(q2zugferd_xml), callable(q2zugferd.q2zugferd_pdf))"
+    )
+    assert output == ["True", "True", "True"]
+
+
+def test_lazy_exports():
+    assert set(q2zugferd.__all__) <= set(dir(q2zugferd))
+    assert q2zugferd.compute_totals is q2zugferd.q2zugferd_totals.compute_totals
+    with pytest.raises(AttributeError):
+        q2zugferd.no_such_name
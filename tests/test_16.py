@@ -0,0 +1,107 @@
+import io
+
+import pikepdf
+import pytest
+from lxml import etree as ET
+
+from q2zugferd import (
+    Invoice,
+    ZugferdTemplate,
+    get_profile,
+    q2zugferd_extract,
+    q2zugferd_pdf,
+    q2zugferd_xml,
+    q2zugferd_xml_stream,
+    register_profile,
+)
+from q2zugferd import q2zugferd_profile
+from q2zugferd.q2zugferd_profile import EN16931, detect_profile, profiles
+
+PROFILES = ("MINIMUM", "BASIC", "EN16931", "EXTENDED", "XRechnung")
+
+
+def canonical(xml):
+    return ET.canonicalize(xml_data=xml.decode("utf-8").split("?>", 1)[1], strip_text=True)
+
+
+def _root(xml):
+    return ET.fromstring(xml)
+
+
+def test_default_profile_unchanged(zugferd_data):
+    assert q2zugferd_xml(zugferd_data) == q2zugferd_xml(zugferd_data, profile="en16931")
+    assert get_profile(None) is EN16931
+    with pytest.raises(ValueError):
+        get_profile("COMFORT")
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_profile_writers_agree(zugferd_data, name):
+    profile = get_profile(name)
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True, profile=name)
+    root = _root(xml)
+    guideline = root.findtext(".//{*}GuidelineSpecifiedDocumentContextParameter/{*}ID")
+    assert guideline == profile.guideline
+    assert detect_profile(xml) is profile
+
+    template = ZugferdTemplate.from_data(zugferd_data, profile=name)
+    assert template.render(zugferd_data, as_bytes=True) == xml
+    output = io.BytesIO()
+    q2zugferd_xml_stream(zugferd_data, output, profile=name)
+    assert canonical(output.getvalue()) == canonical(xml)
+
+
+def test_profile_content(zugferd_data):
+    minimum = _root(q2zugferd_xml(zugferd_data, as_bytes=True, profile="MINIMUM"))
+    assert minimum.find(".//{*}IncludedSupplyChainTradeLineItem") is None
+    assert minimum.find(".//{*}SpecifiedTradeSettlementPaymentMeans") is None
+    assert minimum.find(".//{*}ApplicableHeaderTradeSettlement/{*}ApplicableTradeTax") is None
+    assert minimum.findtext(".//{*}GrandTotalAmount") == "41391.90"
+
+    basic = _root(q2zugferd_xml(zugferd_data, as_bytes=True, profile="BASIC"))
+    assert len(basic.findall(".//{*}IncludedSupplyChainTradeLineItem")) == 2
+    assert basic.find(".//{*}SpecifiedTradeProduct/{*}Description") is None
+
+    xrechnung = _root(q2zugferd_xml(zugferd_data, as_bytes=True, profile="XRechnung"))
+    assert (
+        xrechnung.findtext(".//{*}BusinessProcessSpecifiedDocumentContextParameter/{*}ID")
+        == "urn:fdc:peppol.eu:2017:poacc:billing:01:1.0"
+    )
+
+
+def test_minimum_computes_totals_from_lines(zugferd_data):
+    data = dict(zugferd_data, vat_breakdown=[])
+    data["invoice_header"] = dict(data["invoice_header"], net_amount="0")
+    root = _root(q2zugferd_xml(Invoice.from_dict(data), True, "compute", "MINIMUM"))
+    assert root.findtext(".//{*}TaxBasisTotalAmount") == "36630.00"
+    assert root.findtext(".//{*}GrandTotalAmount") == "41391.90"
+
+
+def test_pdf_metadata_follows_profile(sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True, profile="XRechnung")
+    report = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile)
+    assert report["profile"] == "XRechnung"
+    with pikepdf.open(io.BytesIO(report["pdf"])) as pdf:
+        assert str(pdf.Root.Names.EmbeddedFiles.Names[0]) == "xrechnung.xml"
+        xmp = pdf.Root.Metadata.read_bytes()
+        assert b"<fx:ConformanceLevel>XRECHNUNG</fx:ConformanceLevel>" in xmp
+        assert b"<fx:DocumentFileName>xrechnung.xml</fx:DocumentFileName>" in xmp
+    assert q2zugferd_extract(report["pdf"]) == xml
+
+    minimum = q2zugferd_xml(zugferd_data, as_bytes=True, profile="MINIMUM")
+    report = q2zugferd_pdf(sample_pdf, minimum, icc_profile=icc_profile, profile="MINIMUM")
+    with pikepdf.open(io.BytesIO(report["pdf"])) as pdf:
+        assert pdf.Root.AF[0].AFRelationship == pikepdf.Name.Data
+        xmp = pdf.Root.Metadata.read_bytes()
+        assert b"<fx:ConformanceLevel>MINIMUM</fx:ConformanceLevel>" in xmp
+
+
+def test_register_profile(zugferd_data):
+    custom = register_profile(EN16931._replace(name="Custom", guideline="urn:example:cius"))
+    try:
+        xml = q2zugferd_xml(zugferd_data, as_bytes=True, profile="custom")
+        assert b"<ram:ID>urn:example:cius</ram:ID>" in xml
+        assert detect_profile(xml) is custom
+    finally:
+        del q2zugferd_profile._profiles["CUSTOM"]
+    assert [profile.name for profile in profiles()] == list(PROFILES)
@@ -0,0 +1,64 @@
+import io
+
+import pikepdf
+import pytest
+from pikepdf import Dictionary, Name
+
+from q2zugferd import q2zugferd_pdf, q2zugferd_xml
+from q2zugferd.q2zugferd_pdf import fix_device_rgb, make_icc_stream, open_pdf, scan_for_device_rgb
+
+
+def _inherited_resources_pdf(path):
+    """Two pages that inherit DeviceRGB resources from the page tree."""
+    pdf = pikepdf.new()
+    pdf.docinfo["/CreationDate"] = "D:20251127120000+01'00'"
+    pdf.docinfo["/Producer"] = "test"
+    pdf.add_blank_page()
+    pdf.add_blank_page()
+    pdf.Root.Pages.Resources = Dictionary(ColorSpace=Dictionary(CS0=Name.DeviceRGB))
+    for page in pdf.pages:
+        del page.obj["/Resources"]
+        page.Contents = pdf.make_stream(b"/CS0 cs 1 0 0 sc 0 0 10 10 re f")
+    pdf.save(path)
+    return str(path)
+
+
+def test_large_inherited_resources(tmp_path, zugferd_data, icc_profile):
+    source = _inherited_resources_pdf(tmp_path / "inherited.pdf")
+    with open_pdf(source, large=True) as pdf:
+        assert scan_for_device_rgb(pdf)["count"] == 2
+    output = tmp_path / "out.pdf"
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    report = q2zugferd_pdf(source, xml, str(output), icc_profile=icc_profile, large=True)
+    assert report["verification"]["count"] == 0
+    with pikepdf.open(output, inherit_page_attributes=False) as pdf:
+        # Fixed on the page tree, the page dictionaries were not touched
+        assert all("/Resources" not in page.obj for page in pdf.pages)
+        assert pdf.Root.Pages.Resources.ColorSpace.CS0[0] == Name.ICCBased
+
+
+def test_large_options(sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    with pytest.raises(ValueError):
+        q2zugferd_pdf(sample_pdf, xml, large=True)
+    with pytest.raises(ValueError):
+        q2zugferd_pdf(sample_pdf, xml, io.BytesIO(), save_profile="web", large=True)
+
+
+def test_fix_device_rgb_writes_only_changes(sample_pdf, icc_profile):
+    with pikepdf.open(sample_pdf) as pdf:
+        icc_ref = make_icc_stream(pdf, icc_profile)
+        assert fix_device_rgb(pdf, icc_ref) > 0
+        resources = pdf.pages[0].obj.Resources
+        default_rgb = resources.DefaultRGB
+        assert fix_device_rgb(pdf, icc_ref) == 0
+        assert resources.DefaultRGB.objgen == default_rgb.objgen
+
+
+def test_fix_device_rgb_keeps_default_rgb(sample_pdf, icc_profile):
+    with pikepdf.open(sample_pdf) as pdf:
+        own = pdf.make_indirect(pdf.make_stream(b"own profile"))
+        resources = pdf.pages[0].obj.Resources
+        resources.DefaultRGB = own
+        fix_device_rgb(pdf, make_icc_stream(pdf, icc_profile))
+        assert resources.DefaultRGB.objgen == own.objgen
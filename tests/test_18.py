@@ -0,0 +1,71 @@
+import io
+import os
+import time
+
+import pikepdf
+
+from q2zugferd import Invoice, ResultCache, q2zugferd_pdf, q2zugferd_xml
+from q2zugferd.q2zugferd_cache import cache_key
+from q2zugferd.q2zugferd_pdf import invoice_pdf_date
+
+
+def test_deterministic_output(sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    assert invoice_pdf_date(xml) == "D:20251127000000Z"
+    first = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile, deterministic=True)["pdf"]
+    second = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile, deterministic=True)["pdf"]
+    assert first == second
+    with pikepdf.open(io.BytesIO(first)) as pdf:
+        assert str(pdf.docinfo.CreationDate) == "D:20251127000000Z"
+        assert str(pdf.docinfo.ModDate) == "D:20251127000000Z"
+        xmp = pdf.Root.Metadata.read_bytes()
+        assert b"<xmp:CreateDate>2025-11-27T00:00:00Z</xmp:CreateDate>" in xmp
+    assert q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile)["pdf"] != first
+
+
+def test_pdf_cache(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    cache = ResultCache(tmp_path / "cache")
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    report = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile, cache=cache)
+    assert report["cached"] is False
+    assert cache.hits == 0 and cache.misses == 1
+
+    output = tmp_path / "out.pdf"
+    cached = q2zugferd_pdf(sample_pdf, xml, str(output), icc_profile=icc_profile, cache=cache)
+    assert cached["cached"] is True
+    assert cached["verification"] == report["verification"]
+    assert output.read_bytes() == report["pdf"]
+    with open(sample_pdf, "rb") as f:
+        assert q2zugferd_pdf(f, xml, icc_profile=icc_profile, cache=cache)["pdf"] == report["pdf"]
+
+    # Any change of the inputs or options is another entry
+    other = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile, cache=cache, verify=None)
+    assert other["cached"] is False
+
+
+def test_xml_cache(tmp_path, zugferd_data):
+    cache = ResultCache(tmp_path / "cache")
+    xml = q2zugferd_xml(zugferd_data, cache=cache)
+    assert q2zugferd_xml(zugferd_data, cache=cache) == xml
+    invoice = Invoice.from_dict(zugferd_data)
+    assert q2zugferd_xml(invoice, as_bytes=True, cache=cache) == xml.encode()
+    assert cache.hits == 1
+    lines = iter(zugferd_data["invoice_lines"])
+    assert q2zugferd_xml(dict(zugferd_data, invoice_lines=lines), cache=cache) == xml
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_size=250)
+    keys = [cache_key("test", str(number)) for number in range(3)]
+    for key in keys:
+        assert cache.put(key, b"x" * 100)
+        time.sleep(0.01)
+    # The oldest entry went, the rest fits
+    assert cache.read(keys[0]) is None
+    assert cache.size == 200
+    os.utime(cache._path(keys[1]), (1, 1))
+    assert cache.read(keys[1]) == b"x" * 100
+    cache.put(cache_key("test", "3"), b"y" * 100)
+    assert cache.read(keys[2]) is None
+    assert cache.read(keys[1]) is not None
+    assert not cache.put(cache_key("test", "large"), b"z" * 251)
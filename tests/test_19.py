@@ -0,0 +1,79 @@
+import io
+
+import pikepdf
+import pytest
+
+from benchmarks.corpus import make_pdf
+from q2zugferd import q2zugferd_extract, q2zugferd_split, q2zugferd_xml
+from q2zugferd.q2zugferd_pdf import scan_for_device_rgb
+
+SPLIT = (range(0, 1), range(1, 3), range(3, 6))
+
+
+@pytest.fixture
+def print_run(tmp_path):
+    path = tmp_path / "cycle.pdf"
+    make_pdf(str(path), 6, "patterns")
+    with pikepdf.open(path, allow_overwriting_input=True) as pdf:
+        pdf.docinfo["/CreationDate"] = "D:20251127120000+01'00'"
+        pdf.docinfo["/Producer"] = "test"
+        pdf.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_split(print_run, zugferd_data, icc_profile, max_workers):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    jobs = [(pages, zugferd_data, None) for pages in SPLIT]
+    results = list(
+        q2zugferd_split(print_run, jobs, max_workers=max_workers, icc_profile=icc_profile)
+    )
+    assert [result.index for result in results] == [0, 1, 2]
+    for pages, result in zip(SPLIT, results):
+        assert result.ok, result.error
+        assert result.result["verification"]["count"] == 0
+        assert q2zugferd_extract(result.result["pdf"]) == xml
+        with pikepdf.open(io.BytesIO(result.result["pdf"])) as pdf:
+            assert len(pdf.pages) == len(pages)
+            assert scan_for_device_rgb(pdf)["count"] == 0
+            assert pdf.Root.OutputIntents[0].DestOutputProfile.is_indirect
+
+
+def test_split_deterministic_files(print_run, zugferd_data, icc_profile, tmp_path):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    outputs = []
+    for run in range(2):
+        jobs = [
+            {"pages": pages, "invoice": xml, "output_pdf": str(tmp_path / f"{run}_{i}.pdf")}
+            for i, pages in enumerate(SPLIT)
+        ]
+        results = list(
+            q2zugferd_split(print_run, jobs, icc_profile=icc_profile, deterministic=True)
+        )
+        assert all(result.ok for result in results)
+        outputs.append([open(result.output_pdf, "rb").read() for result in results])
+    assert outputs[0] == outputs[1]
+
+
+def test_split_failure_isolated(print_run, zugferd_data, icc_profile):
+    jobs = [(range(0, 2), zugferd_data, None), ([99], zugferd_data, None)]
+    first, second = q2zugferd_split(print_run, jobs, icc_profile=icc_profile)
+    assert first.ok
+    assert not second.ok
+    assert "IndexError" in second.error
+    with pytest.raises(ValueError):
+        list(q2zugferd_split(print_run, jobs, verify="always"))
+
+
+def test_split_outputs_like_q2zugferd_pdf(print_run, zugferd_data, icc_profile, tmp_path):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    result = next(
+        q2zugferd_split(print_run, [(range(6), xml, None)], icc_profile=icc_profile, verify="before")
+    )
+    assert result.result["verification"]["count"] == 0
+    # Write-only output, verified on a copy
+    with open(tmp_path / "out.pdf", "wb") as f:
+        result = next(q2zugferd_split(print_run, [(range(2), xml, f)], icc_profile=icc_profile))
+    assert result.ok, result.error
+    assert result.result["size"] == (tmp_path / "out.pdf").stat().st_size
+    assert result.result["verification"]["count"] == 0
@@ -0,0 +1,26 @@
+import os
+
+from q2zugferd import q2zugferd_pdf_batch, q2zugferd_xml_pdf_batch, q2zugferd_xml
+
+
+def test_pdf_batch(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data)
+    jobs = [
+        (sample_pdf, xml, str(tmp_path / "out0.pdf")),
+        (str(tmp_path / "missing.pdf"), xml, str(tmp_path / "out1.pdf")),
+        {"input_pdf": sample_pdf, "xml_path": xml, "output_pdf": str(tmp_path / "out2.pdf")},
+    ]
+    results = list(q2zugferd_pdf_batch(jobs, max_workers=2, icc_profile=icc_profile))
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.ok for r in results] == [True, False, True]
+    assert results[1].error
+    assert os.path.getsize(tmp_path / "out2.pdf") > 0
+
+
+def test_xml_pdf_batch_unordered(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    jobs = [(zugferd_data, sample_pdf, str(tmp_path / f"out{i}.pdf")) for i in range(5)]
+    results = list(
+        q2zugferd_xml_pdf_batch(jobs, max_workers=2, ordered=False, icc_profile=icc_profile)
+    )
+    assert sorted(r.index for r in results) == list(range(5))
+    assert all(r.ok for r in results)
@@ -0,0 +1,171 @@
+import io
+
+import pikepdf
+
+from q2zugferd import q2zugferd_pdf, q2zugferd_xml, set_icc_profile
+
+
+def test_icc_profile_compressed(tmp_path, sample_pdf, zugferd_data):
+    icc_profile = b"sRGB" * 1000
+    set_icc_profile(icc_profile)
+    try:
+        output_pdf = tmp_path / "out.pdf"
+        q2zugferd_pdf(sample_pdf, q2zugferd_xml(zugferd_data), str(output_pdf))
+    finally:
+        set_icc_profile(None)
+    with pikepdf.open(output_pdf) as pdf:
+        icc = pdf.Root.OutputIntents[0].DestOutputProfile
+        assert icc.Filter == "/FlateDecode"
+        assert len(icc.read_raw_bytes()) < len(icc_profile)
+        assert icc.read_bytes() == icc_profile
+
+
+def test_save_profiles(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data)
+    sizes = {}
+    for save_profile in ("fast", "compact", "web"):
+        output_pdf = tmp_path / f"{save_profile}.pdf"
+        report = q2zugferd_pdf(
+            sample_pdf, xml, str(output_pdf), icc_profile=icc_profile, save_profile=save_profile
+        )
+        assert report["save_profile"] == save_profile
+        assert report["size"] == output_pdf.stat().st_size
+        assert report["save_time"] >= 0
+        sizes[save_profile] = report["size"]
+        with pikepdf.open(output_pdf) as pdf:
+            assert pdf.is_linearized == (save_profile == "web")
+            assert "/Filter" not in pdf.Root.Metadata
+    assert sizes["compact"] < sizes["fast"]
+
+
+def test_replace_device_rgb_shared_and_cyclic(sample_pdf, icc_profile):
+    from pikepdf import Array, Dictionary, Name
+
+    from q2zugferd.q2zugferd_pdf import make_icc_stream, replace_device_rgb_recursive
+
+    with pikepdf.open(sample_pdf) as pdf:
+        icc_ref = make_icc_stream(pdf, icc_profile)
+        resources = pdf.pages[0].Resources
+        form = resources.XObject.Fm0
+        # form referencing itself and an indexed color space based on DeviceRGB
+        form.Resources.XObject.Fm0 = form
+        indexed = Array([Name.Indexed, Name.DeviceRGB, 0, b"\x00\x00\x00"])
+        form.Resources.ColorSpace = Dictionary(CS1=indexed)
+
+        visited = set()
+        for page in pdf.pages:
+            replace_device_rgb_recursive(pdf, page.Resources, icc_ref, visited)
+
+        image = resources.XObject.Im0
+        assert image.ColorSpace[0] == Name.ICCBased
+        assert resources.ColorSpace.CS0[0] == Name.ICCBased
+        cs1 = form.Resources.ColorSpace.CS1
+        assert cs1[0] == Name.Indexed and cs1[1][0] == Name.ICCBased
+        assert image.objgen in visited and form.objgen in visited
+
+
+def test_verification_modes(tmp_path, sample_pdf, zugferd_data, icc_profile, capsys):
+    from q2zugferd.q2zugferd_pdf import scan_for_device_rgb
+
+    with pikepdf.open(sample_pdf) as pdf:
+        result = scan_for_device_rgb(pdf)
+    assert result["count"] == len(result["issues"]) == 3
+    assert "Page[0]/ColorSpace/CS0" in result["issues"]
+    assert "Page[0]/XObject/Fm0/XObject/Im0/ColorSpace" in result["issues"]
+
+    xml = q2zugferd_xml(zugferd_data)
+    for verify in ("before", "after"):
+        report = q2zugferd_pdf(
+            sample_pdf, xml, str(tmp_path / "out.pdf"), icc_profile=icc_profile, verify=verify
+        )
+        assert report["verification"]["count"] == 0
+        assert report["verification"]["elapsed"] >= 0
+    report = q2zugferd_pdf(
+        sample_pdf, xml, str(tmp_path / "out.pdf"), icc_profile=icc_profile, verify=None
+    )
+    assert report["verification"] is None
+    assert capsys.readouterr().out == ""
+
+
+def test_in_memory_io(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    assert isinstance(xml, bytes)
+    assert xml.decode("utf-8") == q2zugferd_xml(zugferd_data)
+    with open(sample_pdf, "rb") as f:
+        data = f.read()
+    for source in (data, memoryview(data), io.BytesIO(data)):
+        report = q2zugferd_pdf(source, memoryview(xml), icc_profile=icc_profile)
+        assert report["size"] == len(report["pdf"])
+        with pikepdf.open(io.BytesIO(report["pdf"])) as pdf:
+            filespec = pdf.Root.Names.EmbeddedFiles.Names[1]
+            assert filespec.EF.F.read_bytes() == xml
+
+
+def test_xml_sources(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data)
+    xml_file = tmp_path / "factur-x.xml"
+    xml_file.write_text(xml, encoding="utf-8")
+    for source in (xml, xml_file, str(xml_file), io.BytesIO(xml.encode("utf-8"))):
+        report = q2zugferd_pdf(sample_pdf, source, icc_profile=icc_profile, verify=None)
+        with pikepdf.open(io.BytesIO(report["pdf"])) as pdf:
+            filespec = pdf.Root.Names.EmbeddedFiles.Names[1]
+            assert filespec.EF.F.read_bytes() == xml.encode("utf-8")
+
+
+def _icc_streams(pdf):
+    return [
+        obj for obj in pdf.objects
+        if isinstance(obj, pikepdf.Stream) and "/N" in obj and "/Subtype" not in obj
+    ]
+
+
+def test_preflight_reuses_output_intent(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    first = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile)
+    assert first["preflight"]["rewrite"] and not first["preflight"]["icc_reused"]
+
+    second = q2zugferd_pdf(first["pdf"], xml, icc_profile=b"\x01" * 128)
+    assert second["preflight"] == {
+        "icc_reused": True, "rewrite": False, "elapsed": second["preflight"]["elapsed"]
+    }
+    assert second["verification"]["count"] == 0
+    with pikepdf.open(io.BytesIO(second["pdf"])) as pdf:
+        assert len(_icc_streams(pdf)) == 1
+        assert len(pdf.Root.OutputIntents) == 1
+        assert pdf.Root.OutputIntents[0].DestOutputProfile.read_bytes() == icc_profile
+
+    third = q2zugferd_pdf(first["pdf"], xml, icc_profile=icc_profile, preflight=False)
+    assert third["preflight"] is None
+    with pikepdf.open(io.BytesIO(third["pdf"])) as pdf:
+        assert len(_icc_streams(pdf)) == 2
+
+
+def test_stream_outputs(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    import os
+    import threading
+
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    # Existing data before the PDF, position left at the end of the PDF
+    output = io.BytesIO(b"header")
+    output.seek(0, io.SEEK_END)
+    report = q2zugferd_pdf(sample_pdf, xml, output, icc_profile=icc_profile)
+    assert report["verification"]["count"] == 0
+    assert output.tell() == len(output.getvalue()) == 6 + report["size"]
+
+    # Write-only file
+    with open(tmp_path / "out.pdf", "wb") as f:
+        report = q2zugferd_pdf(sample_pdf, xml, f, icc_profile=icc_profile)
+    assert report["verification"]["count"] == 0
+    assert report["size"] == os.path.getsize(tmp_path / "out.pdf")
+
+    # Pipe, no tell()
+    read_fd, write_fd = os.pipe()
+    received = []
+    reader = threading.Thread(target=lambda: received.append(os.fdopen(read_fd, "rb").read()))
+    reader.start()
+    with os.fdopen(write_fd, "wb") as pipe:
+        for verify in ("after", None):
+            report = q2zugferd_pdf(sample_pdf, xml, pipe, icc_profile=icc_profile, verify=verify)
+            assert report["size"] > 0
+    reader.join()
+    assert len(received[0]) > report["size"]
@@ -0,0 +1,129 @@
+import io
+from decimal import Decimal
+
+from lxml import etree as ET
+
+from q2zugferd import q2zugferd_xml, q2zugferd_xml_stream
+
+
+def canonical(xml):
+    if isinstance(xml, bytes):
+        xml = xml.decode("utf-8")
+    return ET.canonicalize(xml_data=xml.split("?>", 1)[1], strip_text=True)
+
+
+def test_xml_stream_matches_tree(zugferd_data):
+    output = io.BytesIO()
+    q2zugferd_xml_stream(zugferd_data, output)
+    assert output.getvalue().startswith(b"<?xml")
+    assert canonical(output.getvalue()) == canonical(q2zugferd_xml(zugferd_data))
+
+
+def test_xml_stream_from_generator(tmp_path, zugferd_data):
+    line = zugferd_data["invoice_lines"][0]
+
+    def lines():
+        for i in range(1000):
+            yield dict(line, line_number=str(i + 1))
+
+    output = tmp_path / "large.xml"
+    q2zugferd_xml_stream(zugferd_data, str(output), invoice_lines=lines())
+    root = ET.parse(str(output)).getroot()
+    items = root.findall(".//{*}IncludedSupplyChainTradeLineItem")
+    assert len(items) == 1000
+    assert items[-1].findtext(".//{*}LineID") == "1000"
+
+
+def test_template_byte_identical(zugferd_data):
+    from q2zugferd import ZugferdTemplate
+
+    template = ZugferdTemplate.from_data(zugferd_data)
+    assert template.render(zugferd_data) == q2zugferd_xml(zugferd_data)
+
+    zugferd_data["invoice_lines"][1]["description"] = ""
+    zugferd_data["invoice_lines"][1]["unit_code"] = "HUR"
+    zugferd_data["invoice_header"]["invoice_number"] = "INV-2"
+    assert template.render(zugferd_data) == q2zugferd_xml(zugferd_data)
+
+
+def test_columnar_lines(zugferd_data):
+    rows = zugferd_data["invoice_lines"]
+    columns = {
+        "line_number": [row["line_number"] for row in rows],
+        "name": [row["name"] for row in rows],
+        "description": [row["description"] for row in rows],
+        "quantity": [333, 333.0],
+        "net_price": [55.0, "55"],
+        "vat_rate": [19, 7.0],
+        "net_total": [18315, 18315.0],
+        "unit_code": "MTR",
+    }
+    expected = q2zugferd_xml(zugferd_data)
+    zugferd_data["invoice_lines"] = columns
+    assert q2zugferd_xml(zugferd_data) == expected
+
+
+def test_columnar_rounding_is_decimal_exact(zugferd_data):
+    zugferd_data["invoice_lines"] = {
+        "name": ["a"],
+        "quantity": [1],
+        "net_price": [2.675],
+        "vat_rate": [19],
+        "net_total": [2.675],
+    }
+    root = ET.fromstring(q2zugferd_xml(zugferd_data).encode("utf-8"))
+    assert root.findtext(".//{*}ChargeAmount") == "2.6750"
+    assert root.findtext(".//{*}LineTotalAmount") == "2.68"
+    assert root.findtext(".//{*}LineID") == "1"
+
+
+def test_columnar_numpy(zugferd_data):
+    import pytest
+
+    np = pytest.importorskip("numpy")
+    expected = q2zugferd_xml(zugferd_data)
+    rows = zugferd_data["invoice_lines"]
+    zugferd_data["invoice_lines"] = {
+        "line_number": np.array([1, 2]),
+        "name": np.array([row["name"] for row in rows]),
+        "description": [row["description"] for row in rows],
+        "quantity": np.array([333.0, 333.0]),
+        "net_price": np.array([55.0, 55.0]),
+        "vat_rate": np.array([19.0, 7.0]),
+        "net_total": np.array([18315.0, 18315.0]),
+        "unit_code": "MTR",
+    }
+    assert q2zugferd_xml(zugferd_data) == expected
+
+
+def test_columnar_numpy_scalars(zugferd_data):
+    import pytest
+
+    np = pytest.importorskip("numpy")
+    expected = q2zugferd_xml(zugferd_data)
+    rows = zugferd_data["invoice_lines"]
+    zugferd_data["invoice_lines"] = {
+        "line_number": [np.int64(1), np.int64(2)],
+        "name": [row["name"] for row in rows],
+        "description": [row["description"] for row in rows],
+        "quantity": [np.float64(333.0), np.int64(333)],
+        "net_price": np.array([55.0, 55.0], dtype=np.float32),
+        "vat_rate": [np.float32(19.0), np.float64(7.0)],
+        "net_total": [np.float64(18315.0), np.float32(18315.0)],
+        "unit_code": "MTR",
+    }
+    assert q2zugferd_xml(zugferd_data) == expected
+
+
+def test_columnar_numpy_bulk_formatting():
+    import pytest
+
+    np = pytest.importorskip("numpy")
+    from q2zugferd.q2zugferd_xml import _format_column, _scalar
+
+    floats = np.array([2.675, 0.1 + 0.2, -0.125, -0.0, 1e-5, 1e15, 18315.0, -1.005, 3.0])
+    ints = np.array([0, -7, 2**62, 333])
+    for quantum in (Decimal("0.01"), Decimal("0.0001")):
+        for column in (floats, floats.astype(np.float32), ints):
+            expected = [str(Decimal(_scalar(value)).quantize(quantum)) for value in column]
+            assert _format_column(column, quantum) == expected
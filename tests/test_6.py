@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from q2zugferd import AsyncZugferd, q2zugferd_xml, q2zugferd_xml_async
+
+
+def test_xml_async(zugferd_data):
+    xml = asyncio.run(q2zugferd_xml_async(zugferd_data))
+    assert xml == q2zugferd_xml(zugferd_data)
+    xml = asyncio.run(q2zugferd_xml_async(zugferd_data, as_bytes=True, profile="MINIMUM"))
+    assert xml == q2zugferd_xml(zugferd_data, as_bytes=True, profile="MINIMUM")
+
+
+def test_pdf_async_in_memory(sample_pdf, zugferd_data, icc_profile):
+    with open(sample_pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    async def upload():
+        for i in range(0, len(pdf_bytes), 100):
+            yield pdf_bytes[i : i + 100]
+
+    async def xml_source():
+        return q2zugferd_xml(zugferd_data).encode("utf-8")
+
+    received = []
+
+    async def sink(data):
+        received.append(data)
+
+    async def main():
+        async with AsyncZugferd(max_workers=2, max_concurrency=2) as runner:
+            reports = await asyncio.gather(
+                runner.pdf(upload(), xml_source(), sink, icc_profile=icc_profile),
+                runner.xml_pdf(zugferd_data, pdf_bytes, icc_profile=icc_profile),
+            )
+        return reports
+
+    sink_report, bytes_report = asyncio.run(main())
+    assert "pdf" not in sink_report
+    assert received[0].startswith(b"%PDF")
+    assert bytes_report["pdf"].startswith(b"%PDF")
+
+
+def test_async_timeout(zugferd_data):
+    async def main():
+        async with AsyncZugferd(max_workers=1) as runner:
+            with pytest.raises(asyncio.TimeoutError):
+                await runner.xml(zugferd_data, timeout=0)
+            # the slot is given back, next call works
+            return await runner.xml(zugferd_data, timeout=10)
+
+    assert asyncio.run(main()).startswith("<?xml")
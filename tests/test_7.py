@@ -0,0 +1,59 @@
+import math
+
+from q2zugferd import (
+    StageCollector,
+    ZugferdTemplate,
+    q2zugferd_pdf,
+    q2zugferd_xml,
+    q2zugferd_xml_stream,
+    stage_hook,
+)
+from q2zugferd.q2zugferd_stats import _hooks, stage
+
+
+def test_stage_without_hook():
+    assert not _hooks
+    with stage("noop") as st:
+        assert not st
+        st.add("ignored")
+
+
+def test_pdf_stages(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data)
+    calls = []
+    with stage_hook(lambda name, duration, counters: calls.append((name, dict(counters)))):
+        report = q2zugferd_pdf(
+            sample_pdf, xml, str(tmp_path / "out.pdf"), icc_profile=icc_profile
+        )
+    assert not _hooks
+    stages = dict(calls)
+    assert [name for name, _ in calls] == [
+        "open", "preflight", "icc", "rewrite", "embed", "xmp", "save", "verify"
+    ]
+    # CS0 of both pages, the shared image and the group-less form resources
+    assert stages["rewrite"]["pages"] == 2
+    assert stages["rewrite"]["objects_rewritten"] == 3
+    assert stages["rewrite"]["objects_visited"] > 0
+    assert stages["save"]["bytes_written"] == report["size"]
+    assert stages["embed"]["xml_bytes"] == len(xml.encode("utf-8"))
+
+
+def test_collector(tmp_path, zugferd_data):
+    collector = StageCollector()
+    with stage_hook(collector):
+        for _ in range(3):
+            q2zugferd_xml(zugferd_data)
+        ZugferdTemplate.from_data(zugferd_data).render(zugferd_data)
+        q2zugferd_xml_stream(zugferd_data, str(tmp_path / "out.xml"))
+    data = collector.export()
+    assert data["xml_lines"]["count"] == 4
+    assert data["xml_lines"]["counters"]["lines"] == 8
+    assert data["xml_stream_lines"]["counters"]["lines"] == 2
+    serialize = data["xml_serialize"]
+    assert serialize["min"] <= serialize["mean"] <= serialize["max"]
+    bound, count = serialize["histogram"][-1]
+    assert bound == math.inf and count == 4
+    counts = [count for _, count in serialize["histogram"]]
+    assert counts == sorted(counts)
+    collector.reset()
+    assert collector.export() == {}
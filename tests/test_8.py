@@ -0,0 +1,103 @@
+import io
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name
+
+from q2zugferd import (
+    q2zugferd_extract,
+    q2zugferd_extract_batch,
+    q2zugferd_extract_dir,
+    q2zugferd_pdf,
+    q2zugferd_xml,
+)
+
+
+def test_extract(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    data = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile)["pdf"]
+    assert q2zugferd_extract(data) == xml
+    assert q2zugferd_extract(io.BytesIO(data)) == xml
+    assert q2zugferd_extract(sample_pdf) is None
+
+
+def test_extract_name_tree_kids(tmp_path):
+    # xrechnung.xml only reachable through /Kids of the name tree, no /AF
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    ef_stream = pdf.make_stream(b"<xrechnung/>", Type=Name.EmbeddedFile)
+    filespec = pdf.make_indirect(
+        Dictionary(Type=Name.Filespec, F="XRechnung.xml", EF=Dictionary(F=ef_stream))
+    )
+    kid = pdf.make_indirect(Dictionary(Names=Array(["XRechnung.xml", filespec])))
+    pdf.Root.Names = Dictionary(EmbeddedFiles=Dictionary(Kids=Array([kid])))
+    path = tmp_path / "xrechnung.pdf"
+    pdf.save(path)
+    assert q2zugferd_extract(str(path)) == b"<xrechnung/>"
+
+
+def test_extract_dir(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    inbox = tmp_path / "inbox"
+    (inbox / "sub").mkdir(parents=True)
+    q2zugferd_pdf(sample_pdf, xml, str(inbox / "a.pdf"), icc_profile=icc_profile)
+    q2zugferd_pdf(sample_pdf, xml, str(inbox / "sub" / "b.pdf"), icc_profile=icc_profile)
+    (inbox / "plain.pdf").write_bytes(open(sample_pdf, "rb").read())
+    (inbox / "broken.pdf").write_bytes(b"not a pdf")
+
+    results = {
+        r.input_pdf: r for r in q2zugferd_extract_dir(str(inbox), recursive=True, max_workers=2)
+    }
+    assert len(results) == 4
+    assert results[str(inbox / "a.pdf")].xml == xml
+    assert results[str(inbox / "a.pdf")].filename == "factur-x.xml"
+    assert results[str(inbox / "sub" / "b.pdf")].xml == xml
+    assert results[str(inbox / "plain.pdf")].ok
+    assert results[str(inbox / "plain.pdf")].filename is None
+    assert not results[str(inbox / "broken.pdf")].ok
+
+    output_dir = tmp_path / "xml"
+    results = list(
+        q2zugferd_extract_batch([str(inbox / "a.pdf")], output_dir=str(output_dir), max_workers=1)
+    )
+    assert results[0].output == str(output_dir / "a.xml")
+    assert (output_dir / "a.xml").read_bytes() == xml
+
+
+def test_extract_skips_page_tree(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    data = q2zugferd_pdf(sample_pdf, xml, icc_profile=icc_profile)["pdf"]
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        # Many pages and a loop in the page tree: walking it would fail
+        pages = pdf.Root.Pages
+        for _ in range(2000):
+            pages.Kids.append(pdf.make_indirect(Dictionary(Type=Name.Page, Parent=pages)))
+        pages.Kids.append(pages)
+        pages.Count = len(pages.Kids)
+        path = tmp_path / "pages.pdf"
+        pdf.save(path)
+    assert q2zugferd_extract(str(path)) == xml
+    result = next(q2zugferd_extract_batch([str(path)], max_workers=1))
+    assert result.ok and result.xml == xml
+
+
+def test_extract_dir_output_names(tmp_path, sample_pdf, zugferd_data, icc_profile):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    inbox = tmp_path / "inbox"
+    for sub in ("a", "b"):
+        (inbox / sub).mkdir(parents=True)
+        q2zugferd_pdf(sample_pdf, xml, str(inbox / sub / "x.pdf"), icc_profile=icc_profile)
+    output_dir = tmp_path / "xml"
+    results = list(
+        q2zugferd_extract_dir(str(inbox), str(output_dir), recursive=True, max_workers=1)
+    )
+    assert sorted(r.output for r in results) == [
+        str(output_dir / "a" / "x.xml"),
+        str(output_dir / "b" / "x.xml"),
+    ]
+    assert all(r.ok for r in results)
+    assert (output_dir / "b" / "x.xml").read_bytes() == xml
+
+    paths = [str(inbox / "a" / "x.pdf"), str(inbox / "b" / "x.pdf")]
+    first, second = q2zugferd_extract_batch(paths, str(tmp_path / "flat"), 1, ordered=True)
+    assert first.ok and not second.ok
+    assert "output of another PDF" in second.error
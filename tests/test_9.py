@@ -0,0 +1,63 @@
+import io
+import itertools
+
+from q2zugferd import (
+    iter_invoice_lines,
+    q2zugferd_parse,
+    q2zugferd_xml,
+    q2zugferd_xml_stream,
+)
+
+
+def test_parse_round_trip(zugferd_data):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    parsed = q2zugferd_parse(xml)
+    assert q2zugferd_xml(parsed, as_bytes=True) == xml
+    assert parsed["invoice_header"] == zugferd_data["invoice_header"]
+    assert parsed["seller"] == zugferd_data["seller"]
+    assert parsed["buyer"] == zugferd_data["buyer"]
+    assert parsed["invoice_lines"] == zugferd_data["invoice_lines"]
+    assert parsed["seller_bank_account"]["iban"] == "DE02120300000000202051"
+    # str content, file-like object and file name give the same result
+    assert q2zugferd_parse(xml.decode("utf-8")) == parsed
+    assert q2zugferd_parse(io.BytesIO(xml)) == parsed
+
+
+def test_parse_without_lines(tmp_path, zugferd_data):
+    path = tmp_path / "factur-x.xml"
+    path.write_bytes(q2zugferd_xml(zugferd_data, as_bytes=True))
+    parsed = q2zugferd_parse(path, invoice_lines=False)
+    assert parsed["invoice_lines"] == []
+    assert len(parsed["vat_breakdown"]) == 2
+
+
+def test_iter_invoice_lines_lazy(tmp_path, zugferd_data):
+    line = zugferd_data["invoice_lines"][0]
+    lines = ({**line, "line_number": str(i + 1)} for i in range(5000))
+    path = tmp_path / "big.xml"
+    q2zugferd_xml_stream(zugferd_data, str(path), invoice_lines=lines)
+
+    first = list(itertools.islice(iter_invoice_lines(str(path)), 3))
+    assert [line["line_number"] for line in first] == ["1", "2", "3"]
+    count = 0
+    for count, parsed in enumerate(iter_invoice_lines(str(path)), 1):
+        assert parsed["net_total"] == line["net_total"]
+    assert count == 5000
+    assert len(q2zugferd_parse(str(path))["invoice_lines"]) == 5000
+
+
+def test_parse_minimum_and_missing_quantity(zugferd_data):
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True, profile="MINIMUM")
+    minimum = q2zugferd_parse(xml)
+    assert minimum["invoice_lines"] == [] and minimum["vat_breakdown"] == []
+    assert minimum["invoice_header"]["net_amount"] == "36630.00"
+    assert minimum["invoice_header"]["tax_total"] == "4761.90"
+    assert minimum["invoice_header"]["grand_total"] == "41391.90"
+    assert q2zugferd_xml(minimum, as_bytes=True, profile="MINIMUM") == xml
+
+    xml = q2zugferd_xml(zugferd_data, as_bytes=True)
+    start = xml.index(b"<ram:BilledQuantity")
+    end = xml.index(b"</ram:BilledQuantity>", start) + len(b"</ram:BilledQuantity>")
+    line = q2zugferd_parse(xml[:start] + xml[end:])["invoice_lines"][0]
+    assert line["quantity"] is None and line["unit_code"] is None
+    assert line["net_price"] == "55.0000"